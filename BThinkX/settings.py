@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,11 +46,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dev.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dev.database.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,24 +70,154 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'dev.context_processors.notification_counts',
+                'dev.context_processors.live_updates',
             ],
         },
     },
 ]
 
+# TEMPLATE_PROFILE=production parses each template once per process (the
+# cached loader, never reloaded) and drops the per-node debug information.
+# The default development profile keeps Django's defaults, which reload
+# edited templates under runserver.
+TEMPLATE_PROFILE = os.environ.get('TEMPLATE_PROFILE', 'development' if DEBUG else 'production')
+if TEMPLATE_PROFILE == 'production':
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['debug'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'BThinkX.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Every SQLite connection is tuned with SQLITE_PRAGMAS (WAL, synchronous=NORMAL,
+# busy timeout, bigger page cache; see dev/database.py). Connections are kept
+# for DB_CONN_MAX_AGE seconds, and atomic blocks take the write lock up front.
+# SQLITE_READ_CONNECTION=1 adds a read-only "reader" connection for ORM reads.
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+# Reporting views (@replica_view) read from DB_REPLICA_NAME when set, a copy
+# of the primary replicated outside Django. Users who just wrote stay on the
+# primary for REPLICA_STICKY_SECONDS.
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPLICA_STICKY_SECONDS = 5
+
+DATABASE_ROUTERS = ['dev.database.ReplicaRouter']
+
+if os.environ.get('SQLITE_READ_CONNECTION'):
+    DATABASES['reader'] = {
+        **DATABASES['default'],
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_ROUTERS.append('dev.database.ReadConnectionRouter')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Dashboard contexts are cached per user/company and invalidated by model
+# signals (see dev/dashboard_cache.py). Local memory is per process; set
+# DASHBOARD_CACHE=file to share entries between gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bthinkx-default',
+    },
+    'dashboards': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bthinkx-dashboards',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bthinkx-pages',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bthinkx-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
+if os.environ.get('DASHBOARD_CACHE') == 'file':
+    CACHES['dashboards'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'dashboards'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+    CACHES['pages'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'pages'),
+    }
+    CACHES['fragments'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'fragments'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+DASHBOARD_CACHE_ALIAS = 'dashboards'
+# Safety net only; signal invalidation keeps entries fresh.
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Template fragments ({% fragment %}, see dev/fragment_cache.py) are keyed by
+# version stamps bumped from dev/signals.py; the timeout bounds how stale
+# relative dates inside them can get.
+FRAGMENT_CACHE_ALIAS = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 5 * 60
+
+# Full-page cache for the anonymous marketing pages (see app/page_cache.py).
+# Keys include the release, and `manage.py purge_page_cache` runs on deploy;
+# it touches PAGE_CACHE_PURGE_FILE, which every worker process checks. Only
+# requests for PAGE_CACHE_HOSTS are cached.
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_CACHE_VERSION = os.environ.get('RELEASE', '')
+PAGE_CACHE_HOSTS = ['bthinkx.com', 'www.bthinkx.com', 'localhost', '127.0.0.1']
+PAGE_CACHE_PURGE_FILE = os.path.join(BASE_DIR, 'cache', 'page_cache.purged')
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+PAGE_CACHE_MAX_AGE = 300
+
+# Idempotency-Key replay for the attendance APIs (see dev/idempotency.py).
+IDEMPOTENCY_CACHE_ALIAS = 'default'
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,6 +264,40 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'app', 'static'),
 ]
 
+# `manage.py build_assets` bundles, minifies, hashes and gzips the files into
+# STATIC_ROOT (see dev/assets.py); the app serves them unless
+# SERVE_STATIC_ASSETS is turned off for a web server or CDN.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'dev.assets.AssetStorage'},
+}
+STATIC_BUNDLES = {
+    'dev/js/profile.bundle.js': ['dev/js/main.js', 'dev/js/profile.js'],
+}
+# Only our own assets are minified; third-party files are hashed and gzipped as shipped.
+STATIC_MINIFY_PREFIXES = ['dev/', 'main/']
+SERVE_STATIC_ASSETS = True
+
+# Resized WebP/JPEG copies of uploaded and static images (see dev/images.py),
+# made by a background worker ('thread') or inline ('sync').
+IMAGE_DERIVATIVES = {
+    'avatar': [48, 96, 160, 320],
+    'logo': [128, 256, 512],
+    'cover': [640, 1280, 1920],
+    'static': [480, 960, 1600],
+}
+IMAGE_DERIVATIVE_FORMATS = ['webp', 'jpeg']
+IMAGE_DERIVATIVE_QUALITY = {'webp': 80, 'jpeg': 82}
+IMAGE_DERIVATIVE_WORKER = os.environ.get('IMAGE_DERIVATIVE_WORKER', 'thread')
+IMAGE_DERIVATIVE_STATIC_PREFIXES = ['main/images/']
+# How long a missing derivatives index is cached, and how long an image whose
+# job failed is left alone before it is queued again.
+IMAGE_INDEX_MISSING_TIMEOUT = 60
+IMAGE_DERIVATIVE_RETRY_AFTER = 3600
+
+# Rows fetched per database round trip by the streamed CSV/XLSX exports (see dev/exports.py).
+EXPORT_CHUNK_SIZE = 2000
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -147,3 +314,44 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # AUTH_USER_MODEL = 'dev.User'
  
 AUTH_USER_MODEL = 'dev.User'
+
+# Attendance
+# Logins after this local time are counted as late in the monthly summary.
+ATTENDANCE_LATE_AFTER = "09:30"
+
+# Notifications
+# "thread" queues inserts on a background worker; "sync" writes inline
+# (use it for tests and one-off scripts). See dev/notifications.py.
+NOTIFICATION_DISPATCHER = os.environ.get('NOTIFICATION_DISPATCHER', 'thread')
+NOTIFICATION_BATCH_SIZE = 500
+# Seconds between the thread dispatcher's checks for scheduled notifications
+# that have become due (manage.py deliver_notifications does the same).
+NOTIFICATION_DELIVERY_INTERVAL = 60
+
+# Website leads -> Google Sheet export (see app/sheets.py)
+LEAD_COMPANY_NAME = 'BThinkX'
+LEAD_EXPORT_SINK = 'app.sheets.GoogleSheetSink'
+# Seconds after which a batch claimed by an exporter that never finished is up for grabs again.
+LEAD_EXPORT_CLAIM_TIMEOUT = 600
+GOOGLE_SHEETS_KEYFILE = os.path.join(BASE_DIR, 'bthinkx-d17e6d002985.json')
+LEAD_SHEET_URL = 'https://docs.google.com/spreadsheets/d/1TbW3WBVmlhARWYdf6LN7_wpSq0ir1YYZ4oOQFV9-xsg/edit'
+
+# Query instrumentation (see dev/instrumentation.py)
+# Per-view query counts and latency, served to staff at /api/metrics/queries/.
+# QUERY_STATS_LOG appends every request as a JSON line; budgets declared with
+# @query_budget raise instead of warning when QUERY_BUDGET_STRICT is on.
+QUERY_INSTRUMENTATION = True
+QUERY_STATS_WINDOW = 500
+QUERY_STATS_LOG = os.environ.get('QUERY_STATS_LOG')
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '1' if sys.argv[1:2] == ['test'] else '0') == '1'
+
+# Live dashboard events (see dev/events.py)
+# InProcessBus serves a single ASGI worker; use 'dev.events.BrokerBus' with a
+# shared EVENT_BROKER when running several. Pages served over WSGI don't open
+# the stream; they refetch the notification counters every
+# EVENT_FALLBACK_POLL_SECONDS instead.
+EVENT_BUS = 'dev.events.InProcessBus'
+EVENT_BROKER = 'dev.events.MemoryBroker'
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_MAX_SECONDS = 300
+EVENT_FALLBACK_POLL_SECONDS = 60
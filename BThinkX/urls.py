@@ -22,6 +22,8 @@ from django.views.generic import TemplateView
 from django.contrib.sitemaps.views import sitemap
 from django.contrib.sitemaps import Sitemap
 
+from dev import assets
+
 # One-page static sitemap
 class StaticSitemap(Sitemap):
     changefreq = "monthly"
@@ -45,6 +47,6 @@ urlpatterns = [
     path('robots.txt', TemplateView.as_view(template_name="robots.txt", content_type="text/plain")),
 
 ]
+urlpatterns += assets.static_urlpatterns()
 if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.sheets import export_pending_leads
+
+
+class Command(BaseCommand):
+    help = "Copy website leads that are not yet in the Google Sheet (retry path for the background exporter)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-retries", type=int, default=4)
+
+    def handle(self, *args, **options):
+        try:
+            exported = export_pending_leads(
+                batch_size=options["batch_size"],
+                max_retries=options["max_retries"],
+            )
+        except Exception as exc:
+            raise CommandError(f"Lead export failed: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} lead(s)."))
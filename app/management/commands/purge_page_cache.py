@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app import page_cache
+
+
+class Command(BaseCommand):
+    help = "Drop every cached marketing page so the next visitor renders it afresh (run on deploy)."
+
+    def handle(self, *args, **options):
+        page_cache.purge()
+        self.stdout.write(self.style.SUCCESS("Page cache purged."))
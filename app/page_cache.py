@@ -0,0 +1,209 @@
+"""
+Full-page cache for the anonymous marketing pages.
+
+The landing pages are 40-80 KB templates that look the same for every
+visitor. Views decorated with ``@cache_page_for_anonymous`` are rendered
+once; the response body is stored together with its gzip (and, when the ``brotli``
+package is installed, brotli) encodings, an ETag and a Last-Modified date.
+Later anonymous GET/HEAD requests are answered from the cache in the
+encoding the client accepts, without rendering or compressing anything,
+and revalidations (If-None-Match / If-Modified-Since) get a 304.
+
+Only anonymous visitors are served from the cache; logged-in users always
+get a fresh render. Responses that are not plain 200s, or that set
+cookies (e.g. a CSRF token), are never stored. Decorated views must not
+depend on the query string, which is ignored so campaign parameters do not
+fragment the cache.
+
+Entries live in ``caches[PAGE_CACHE_ALIAS]``. Every key embeds
+PAGE_CACHE_VERSION (set it to the release id), a purge stamp and the
+request's host, but only hosts listed in PAGE_CACHE_HOSTS are cached: with
+``ALLOWED_HOSTS = ["*"]`` any client could otherwise mint keys with made-up
+Host headers and evict the real pages.
+
+``purge()`` (``manage.py purge_page_cache``, run on deploy) bumps the
+stamp so every page is rendered afresh. The command runs in its own
+process, so the stamp is the modification time of PAGE_CACHE_PURGE_FILE,
+which every worker sees; without that setting it is kept in the cache,
+and a purge only reaches other processes when the cache backend is shared
+(file, Redis, Memcached), not with LocMemCache.
+"""
+import functools
+import gzip
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.http.request import split_domain_port, validate_host
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+PURGE_KEY = "page_cache:purged"
+
+
+def _cache():
+    return caches[getattr(settings, "PAGE_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "PAGE_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def _purge_file():
+    return getattr(settings, "PAGE_CACHE_PURGE_FILE", None)
+
+
+def _purge_stamp(cache):
+    path = _purge_file()
+    if path:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    stamp = cache.get(PURGE_KEY)
+    if stamp is None:
+        stamp = time.time_ns()
+        if not cache.add(PURGE_KEY, stamp, None):
+            stamp = cache.get(PURGE_KEY)
+    return stamp
+
+
+def purge():
+    """Invalidate every cached page (e.g. after a deploy changed templates or static files)."""
+    path = _purge_file()
+    if not path:
+        _cache().set(PURGE_KEY, time.time_ns(), None)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a"):
+        pass
+    os.utime(path)
+
+
+def _cached_host(request):
+    """The request's host if its pages may be cached (PAGE_CACHE_HOSTS), else None."""
+    host, _ = split_domain_port(request.get_host())
+    if host and validate_host(host, getattr(settings, "PAGE_CACHE_HOSTS", [])):
+        return host
+    return None
+
+
+def _key(cache, request, host):
+    version = getattr(settings, "PAGE_CACHE_VERSION", "")
+    return f"page_cache:{version}:{_purge_stamp(cache)}:{host}:{request.path}"
+
+
+# -----------------------
+# Encodings
+# -----------------------
+def compress(body):
+    """{encoding: bytes} for ``body``: identity, gzip and, if available, br."""
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=11)
+    return bodies
+
+
+def _accepted(header):
+    """Encodings the Accept-Encoding header allows (ignoring those with q=0)."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def choose_encoding(request, bodies):
+    accepted = _accepted(request.headers.get("Accept-Encoding", ""))
+    for encoding in ("br", "gzip"):
+        if encoding in bodies and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+# -----------------------
+# Entries
+# -----------------------
+def _cacheable(request, response):
+    return (
+        response.status_code == 200
+        # The CSRF middleware adds its cookie after the view returns.
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header("Content-Encoding")
+        and "private" not in response.get("Cache-Control", "")
+        and "no-store" not in response.get("Cache-Control", "")
+    )
+
+
+def _build_entry(response):
+    body = response.content
+    return {
+        "bodies": compress(body),
+        "content_type": response["Content-Type"],
+        "etag": f'W/"{hashlib.sha256(body).hexdigest()[:32]}"',
+        "last_modified": int(time.time()),
+    }
+
+
+def _finish(response, entry):
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    patch_vary_headers(response, ("Accept-Encoding", "Cookie"))
+    patch_cache_control(response, public=True, max_age=getattr(settings, "PAGE_CACHE_MAX_AGE", 300))
+    return response
+
+
+def _serve(request, entry, state):
+    encoding = choose_encoding(request, entry["bodies"])
+    body = entry["bodies"][encoding]
+    response = HttpResponse(b"" if request.method == "HEAD" else body, content_type=entry["content_type"])
+    response["Content-Length"] = str(len(body))
+    if encoding != "identity":
+        response["Content-Encoding"] = encoding
+    response["X-Page-Cache"] = state
+    _finish(response, entry)
+    return get_conditional_response(
+        request, etag=entry["etag"], last_modified=entry["last_modified"], response=response
+    )
+
+
+def _anonymous(request):
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+def cache_page_for_anonymous(view_func):
+    """Serve the view's anonymous GET/HEAD responses from the page cache (see module docstring)."""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        host = _cached_host(request)
+        if request.method not in ("GET", "HEAD") or host is None or not _anonymous(request):
+            return view_func(request, *args, **kwargs)
+
+        cache = _cache()
+        key = _key(cache, request, host)
+        entry = cache.get(key)
+        if entry is not None:
+            return _serve(request, entry, "hit")
+
+        response = view_func(request, *args, **kwargs)
+        if not _cacheable(request, response):
+            return response
+        entry = _build_entry(response)
+        cache.set(key, entry, _timeout())
+        return _serve(request, entry, "miss")
+
+    return wrapper
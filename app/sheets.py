@@ -0,0 +1,206 @@
+"""
+Export of website leads to the enquiries Google Sheet.
+
+submit_contact_form only stores a Lead; this module copies unexported
+leads to the sheet in batches (one ``append_rows`` call per batch) from a
+background thread, retrying with exponential backoff. Each batch is
+claimed first (a conditional UPDATE stamping a token on still-unclaimed
+rows), so the exporters of several workers and ``manage.py export_leads``
+never append the same lead twice. The sink is
+pluggable via settings.LEAD_EXPORT_SINK so it can be replaced by
+MemorySink locally and in tests.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from dev.models import Company, Lead
+
+logger = logging.getLogger(__name__)
+
+# -----------------------
+# Sinks
+# -----------------------
+class GoogleSheetSink:
+    """Appends rows to the first worksheet, reusing one authorized client."""
+
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+    def __init__(self):
+        self._worksheet = None
+        self._lock = threading.Lock()
+
+    def _get_worksheet(self):
+        with self._lock:
+            if self._worksheet is None:
+                import gspread
+                from oauth2client.service_account import ServiceAccountCredentials
+
+                creds = ServiceAccountCredentials.from_json_keyfile_name(settings.GOOGLE_SHEETS_KEYFILE, self.scope)
+                client = gspread.authorize(creds)
+                self._worksheet = client.open_by_url(settings.LEAD_SHEET_URL).sheet1
+            return self._worksheet
+
+    def append_rows(self, rows):
+        try:
+            self._get_worksheet().append_rows(rows)
+        except Exception:
+            # Drop the cached client so the next attempt re-authorizes.
+            self._worksheet = None
+            raise
+
+
+class MemorySink:
+    """Local stand-in that keeps appended rows in memory; can fail the first N calls."""
+
+    def __init__(self, fail_times=0):
+        self.rows = []
+        self.calls = 0
+        self.fail_times = fail_times
+
+    def append_rows(self, rows):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise ConnectionError("simulated sink failure")
+        self.rows.extend(rows)
+
+
+_sink = None
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        _sink = import_string(getattr(settings, "LEAD_EXPORT_SINK", "app.sheets.GoogleSheetSink"))()
+    return _sink
+
+
+def set_sink(sink):
+    """Swap the sink (e.g. MemorySink() in tests). Returns the previous one."""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+# -----------------------
+# Export
+# -----------------------
+def lead_row(lead):
+    """Sheet columns: Name, Email, Phone, Education, Experience, Place, Reason."""
+    extra = lead.metadata or {}
+    return [
+        lead.name,
+        lead.email,
+        lead.phone,
+        extra.get("education", ""),
+        extra.get("experience", ""),
+        extra.get("place", ""),
+        lead.message,
+    ]
+
+
+def _append_with_retry(sink, rows, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            sink.append_rows(rows)
+            return
+        except Exception:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            logger.warning("Lead export failed (attempt %d), retrying in %.1fs", attempt + 1, delay)
+            time.sleep(delay)
+
+
+def _claim_batch(batch_size):
+    """Claim up to ``batch_size`` pending leads for this exporter; returns them, oldest first."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, "LEAD_EXPORT_CLAIM_TIMEOUT", 600))
+    claimable = Lead.objects.filter(
+        Q(export_claimed_at__isnull=True) | Q(export_claimed_at__lt=stale),
+        source="web",
+        exported_at__isnull=True,
+    )
+    while True:
+        pks = list(claimable.order_by("created_at").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return []
+        token = uuid.uuid4().hex
+        # Rows another exporter claimed since the SELECT no longer match and are skipped.
+        if claimable.filter(pk__in=pks).update(export_claim=token, export_claimed_at=now):
+            return list(Lead.objects.filter(export_claim=token).order_by("created_at"))
+
+
+def export_pending_leads(sink=None, batch_size=100, max_retries=4, backoff=1.0):
+    """
+    Copy unexported web leads to the sink, oldest first, one append per
+    batch. Returns the number of leads exported; stops at the first batch
+    that still fails after retries (those leads stay pending).
+    """
+    sink = sink or get_sink()
+    exported = 0
+    while True:
+        leads = _claim_batch(batch_size)
+        if not leads:
+            return exported
+        claimed = Lead.objects.filter(pk__in=[lead.pk for lead in leads], export_claim=leads[0].export_claim)
+        try:
+            _append_with_retry(sink, [lead_row(lead) for lead in leads], max_retries, backoff)
+        except Exception:
+            claimed.update(export_claim="", export_claimed_at=None)
+            raise
+        claimed.update(exported_at=timezone.now(), export_claim="", export_claimed_at=None)
+        exported += len(leads)
+
+
+class BackgroundExporter:
+    """
+    Runs export_pending_leads on a worker thread. Calls to schedule() while
+    an export is running are coalesced into one follow-up run.
+    """
+
+    def __init__(self, delay=2.0):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def schedule(self):
+        with self._lock:
+            self._wakeup.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="lead-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._wakeup.wait(timeout=60):
+                with self._lock:
+                    if not self._wakeup.is_set():
+                        self._thread = None
+                        return
+            # Give bursts of submissions a moment to land in the same batch.
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                export_pending_leads()
+            except Exception:
+                logger.exception("Lead export failed; leads stay pending for the next run")
+
+
+exporter = BackgroundExporter()
+
+
+def get_default_company():
+    """Company that website leads are filed under (settings.LEAD_COMPANY_NAME)."""
+    company, _ = Company.objects.get_or_create(name=getattr(settings, "LEAD_COMPANY_NAME", "BThinkX"))
+    return company
@@ -1,3 +1,130 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from dev.models import Lead, User
+
+from . import page_cache, sheets
+
+
+class LeadExportTests(TestCase):
+    def setUp(self):
+        company = sheets.get_default_company()
+        self.leads = [
+            Lead.objects.create(company=company, name=f"Lead {i}", email=f"lead{i}@example.com", source="web")
+            for i in range(3)
+        ]
+        Lead.objects.create(company=company, name="By phone", source="phone")
+
+    def pending(self):
+        return Lead.objects.filter(source="web", exported_at__isnull=True).count()
+
+    def test_exports_pending_web_leads_once(self):
+        sink = sheets.MemorySink()
+        self.assertEqual(sheets.export_pending_leads(sink, batch_size=2, backoff=0), 3)
+        self.assertEqual(sink.calls, 2)
+        self.assertEqual([row[0] for row in sink.rows], ["Lead 0", "Lead 1", "Lead 2"])
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(sheets.export_pending_leads(sink, backoff=0), 0)
+
+    def test_retries_then_succeeds(self):
+        sink = sheets.MemorySink(fail_times=2)
+        with self.assertLogs("app.sheets", "WARNING"):
+            self.assertEqual(sheets.export_pending_leads(sink, max_retries=2, backoff=0), 3)
+        self.assertEqual(sink.calls, 3)
+        self.assertEqual(len(sink.rows), 3)
+
+    def test_failed_batch_stays_pending(self):
+        sink = sheets.MemorySink(fail_times=3)
+        with self.assertLogs("app.sheets", "WARNING"), self.assertRaises(ConnectionError):
+            sheets.export_pending_leads(sink, max_retries=2, backoff=0)
+        self.assertEqual(sink.rows, [])
+        self.assertEqual(self.pending(), 3)
+        self.assertFalse(Lead.objects.exclude(export_claim="").exists())
+
+        self.assertEqual(sheets.export_pending_leads(sink, backoff=0), 3)
+        self.assertEqual(len(sink.rows), 3)
+
+    def test_leads_claimed_by_another_exporter_are_skipped(self):
+        Lead.objects.filter(pk=self.leads[0].pk).update(export_claim="other", export_claimed_at=timezone.now())
+        sink = sheets.MemorySink()
+        self.assertEqual(sheets.export_pending_leads(sink, backoff=0), 2)
+        self.assertNotIn("Lead 0", [row[0] for row in sink.rows])
+
+        # A claim older than LEAD_EXPORT_CLAIM_TIMEOUT was abandoned.
+        Lead.objects.filter(pk=self.leads[0].pk).update(export_claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(sheets.export_pending_leads(sink, backoff=0), 1)
+
+    def test_contact_form_schedules_the_export_on_commit(self):
+        with mock.patch.object(sheets.exporter, "schedule") as schedule:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post("/submit-contact-form/", {"name": "Asha", "email": "asha@example.com"})
+            schedule.assert_not_called()
+            for callback in callbacks:
+                callback()
+            schedule.assert_called_once()
+        self.assertEqual(self.pending(), 4)
+
+
+@override_settings(PAGE_CACHE_HOSTS=["testserver", ".bthinkx.com"])
+class PageCacheTests(TestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.purge_file = os.path.join(scratch.name, "cache", "page_cache.purged")
+        self.enterContext(override_settings(PAGE_CACHE_PURGE_FILE=self.purge_file))
+        caches["pages"].clear()
+
+    def test_hits_are_served_without_rendering(self):
+        fresh = self.client.get("/career/")
+        self.assertEqual(fresh["X-Page-Cache"], "miss")
+        with mock.patch("app.views.render", side_effect=AssertionError("a hit must not render")):
+            hit = self.client.get("/career/?utm_source=mail", HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+            self.assertEqual(hit["X-Page-Cache"], "hit")
+            self.assertEqual(hit["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(hit.content), fresh.content)
+            self.assertEqual(self.client.get("/career/", HTTP_IF_NONE_MATCH=fresh["ETag"]).status_code, 304)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get("/career/")
+        self.client.force_login(User.objects.create(username="visitor"))
+        for _ in range(2):
+            response = self.client.get("/career/")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Page-Cache", response)
+        # A leftover session cookie without a login is still anonymous.
+        self.client.logout()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "expired"
+        self.assertEqual(self.client.get("/career/")["X-Page-Cache"], "hit")
+
+    def test_only_listed_hosts_are_cached(self):
+        self.assertEqual(self.client.get("/career/", HTTP_HOST="www.bthinkx.com")["X-Page-Cache"], "miss")
+        self.assertEqual(self.client.get("/career/", HTTP_HOST="www.bthinkx.com")["X-Page-Cache"], "hit")
+        for _ in range(2):
+            response = self.client.get("/career/", HTTP_HOST="made-up.example")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Page-Cache", response)
+
+    def test_purge_is_seen_through_the_purge_file(self):
+        self.client.get("/career/")
+        self.assertEqual(self.client.get("/career/")["X-Page-Cache"], "hit")
+        # The purge command runs in another process, so it can't reach this one's LocMemCache.
+        with mock.patch.object(page_cache, "_cache", side_effect=AssertionError("purge must not need the cache")):
+            page_cache.purge()
+        self.assertTrue(os.path.exists(self.purge_file))
+        self.assertEqual(self.client.get("/career/")["X-Page-Cache"], "miss")
+
+    @override_settings(PAGE_CACHE_PURGE_FILE=None)
+    def test_purge_without_a_purge_file_bumps_the_cached_stamp(self):
+        self.client.get("/career/")
+        self.assertEqual(self.client.get("/career/")["X-Page-Cache"], "hit")
+        page_cache.purge()
+        self.assertFalse(os.path.exists(self.purge_file))
+        self.assertEqual(self.client.get("/career/")["X-Page-Cache"], "miss")
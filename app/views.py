@@ -1,8 +1,10 @@
 from django.shortcuts import render
 from django.shortcuts import redirect
 from django.views.decorators.csrf import csrf_exempt
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from django.db import transaction
+from dev.models import Lead
+from . import sheets
+from .page_cache import cache_page_for_anonymous
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
@@ -11,16 +13,20 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 
 
+@cache_page_for_anonymous
 def home(request):
     return render(request, 'index.html')
 
 
+@cache_page_for_anonymous
 def edtech(request):
     return render(request, 'bthinkxedtech.html')
 
 
+@cache_page_for_anonymous
 def dev(request):
     return render(request, 'bthinkxdev.html')
+@cache_page_for_anonymous
 def career(request):
     return render(request, 'career.html')
 
@@ -29,28 +35,25 @@ def dev_team_login(request):
 @csrf_exempt
 def submit_contact_form(request):
     if request.method == 'POST':
-        data = {
-            "Name": request.POST.get('name'),
-            "Email": request.POST.get('email'),
-            "Phone": request.POST.get('phone'),
-            "Education": request.POST.get('education'),
-            "Experience": request.POST.get('experience'),
-            "Place": request.POST.get('place'),
-            "Reason": request.POST.get('reason'),
-        }
-
-        # Connect to Google Sheets
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_name('bthinkx-d17e6d002985.json', scope)
-        client = gspread.authorize(creds)
-
-        # Open sheet and append data
-        sheet = client.open_by_url("https://docs.google.com/spreadsheets/d/1TbW3WBVmlhARWYdf6LN7_wpSq0ir1YYZ4oOQFV9-xsg/edit")
-        worksheet = sheet.sheet1
-        worksheet.append_row(list(data.values()))
+        # Store locally first; the sheet is updated in the background.
+        Lead.objects.create(
+            company=sheets.get_default_company(),
+            name=request.POST.get('name') or '',
+            email=request.POST.get('email') or '',
+            phone=request.POST.get('phone') or '',
+            message=request.POST.get('reason') or '',
+            source='web',
+            metadata={
+                "education": request.POST.get('education') or '',
+                "experience": request.POST.get('experience') or '',
+                "place": request.POST.get('place') or '',
+            },
+        )
+        transaction.on_commit(sheets.exporter.schedule)
 
         return redirect('/')  # Or success page
     
+@cache_page_for_anonymous
 def roadmap_view(request):
     return render(request, 'roadmap.html')
 
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from . import exports
+
 from .models import (
     User,
     Company,
@@ -9,12 +11,15 @@ from .models import (
     Designation,
     Employee,
     Attendance,
+    AttendanceMonthlySummary,
+    PunchDevice,
     LeaveRequest,
     Holiday,
     Task,
     Project,
     DailyReport,
     Notification,
+    NotificationCounter,
     CalendarEvent,
     Client,
     ProjectMembership,
@@ -64,6 +69,21 @@ class BaseAdmin(admin.ModelAdmin):
 
     actions = ["soft_delete"]
 
+
+class ExportAdmin(BaseAdmin):
+    """BaseAdmin with streamed CSV/XLSX exports of the selection (``export_dataset`` in dev.exports)"""
+    export_dataset = None
+
+    def export_csv(self, request, queryset):
+        return exports.response(self.export_dataset, queryset, "csv")
+    export_csv.short_description = "Export selected records as CSV"
+
+    def export_xlsx(self, request, queryset):
+        return exports.response(self.export_dataset, queryset, "xlsx")
+    export_xlsx.short_description = "Export selected records as XLSX"
+
+    actions = BaseAdmin.actions + ["export_csv", "export_xlsx"]
+
 # --------------------------------------------------------------------
 #  User & Company
 # --------------------------------------------------------------------
@@ -100,7 +120,8 @@ class DesignationAdmin(BaseAdmin):
     search_fields = ("title",)
 
 @admin.register(Employee)
-class EmployeeAdmin(BaseAdmin):
+class EmployeeAdmin(ExportAdmin):
+    export_dataset = "employees"
     list_display = ("user", "company", "department", "designation", "manager", "is_active_employee")
     list_filter = ("company", "department", "designation", "is_active_employee")
     search_fields = ("user__username", "user__email", "employee_code")
@@ -109,13 +130,33 @@ class EmployeeAdmin(BaseAdmin):
 #  Attendance, Leave & Holidays
 # --------------------------------------------------------------------
 @admin.register(Attendance)
-class AttendanceAdmin(BaseAdmin):
+class AttendanceAdmin(ExportAdmin):
+    export_dataset = "attendance"
     list_display = ("employee", "date", "login_time", "logout_time", "total_work_seconds")
     search_fields = ("employee__user__username",)
     list_filter = ("date", "employee__company")
 
+@admin.register(AttendanceMonthlySummary)
+class AttendanceMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = ("employee", "year", "month", "present_days", "total_work_seconds", "late_count")
+    list_filter = ("year", "month", "employee__company")
+    search_fields = ("employee__user__username",)
+    list_per_page = 25
+
+@admin.register(PunchDevice)
+class PunchDeviceAdmin(admin.ModelAdmin):
+    """Devices are registered with manage.py add_punch_device; here they can be renamed or deactivated."""
+    list_display = ("name", "company", "is_active", "last_seen_at", "created_at")
+    list_filter = ("company", "is_active")
+    readonly_fields = ("last_seen_at", "created_at", "updated_at")
+    list_per_page = 25
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(LeaveRequest)
-class LeaveRequestAdmin(BaseAdmin):
+class LeaveRequestAdmin(ExportAdmin):
+    export_dataset = "leaves"
     list_display = ("employee", "leave_type", "status", "start_date", "end_date", "days")
     list_filter = ("status", "leave_type__name", "employee__company")
     search_fields = ("employee__user__username", "reason")
@@ -217,10 +258,16 @@ class TicketCommentAdmin(BaseAdmin):
 # --------------------------------------------------------------------
 @admin.register(Notification)
 class NotificationAdmin(BaseAdmin):
-    list_display = ("title", "notif_type", "recipient", "is_read", "send_at")
+    list_display = ("title", "notif_type", "recipient", "is_read", "send_at", "delivered_at")
     list_filter = ("notif_type", "is_read")
     search_fields = ("title", "body")
 
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ("user", "total", "unread", "info", "warning", "alert", "updated_at")
+    search_fields = ("user__username",)
+    list_per_page = 25
+
 @admin.register(CalendarEvent)
 class CalendarEventAdmin(BaseAdmin):
     list_display = ("title", "organizer", "start", "end", "location")
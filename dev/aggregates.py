@@ -0,0 +1,88 @@
+"""
+Conditional-aggregation helpers shared by the dashboards.
+
+Each helper returns every counter for one domain (Task, LeaveRequest,
+Attendance, ...) from a single ``aggregate()`` query instead of one
+``.count()`` per number.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Max, Q
+
+from .models import Attendance, LeaveRequest, Task, Ticket
+
+
+def aggregate_counts(queryset, **conditions):
+    """
+    Count the rows of ``queryset`` matching each ``Q`` in ``conditions``.
+
+    aggregate_counts(qs, todo=Q(status="todo"), done=Q(status="done"))
+    -> {"todo": 3, "done": 7}
+    """
+    if not conditions:
+        return {}
+    result = queryset.aggregate(
+        **{name: Count("pk", filter=condition) for name, condition in conditions.items()}
+    )
+    return {name: value or 0 for name, value in result.items()}
+
+
+def task_stats(user, today):
+    """Task counters for the employee dashboard."""
+    return aggregate_counts(
+        Task.objects.filter(assignee=user),
+        todo=Q(status="todo"),
+        in_progress=Q(status="in_progress"),
+        completed_this_week=Q(status="done", updated_at__gte=today - timedelta(days=7)),
+        overdue=Q(due_date__lt=today, status__in=["todo", "in_progress"]),
+    )
+
+
+def leave_stats(employee, today):
+    """Leave counters for the employee dashboard."""
+    return aggregate_counts(
+        LeaveRequest.objects.filter(employee=employee),
+        pending=Q(status="pending"),
+        approved_this_month=Q(status="approved", start_date__year=today.year, start_date__month=today.month),
+    )
+
+
+def leave_status_stats(leaves):
+    """pending/approved/rejected counters over an already scoped leave queryset."""
+    return aggregate_counts(
+        leaves,
+        pending=Q(status="pending"),
+        approved=Q(status="approved"),
+        rejected=Q(status="rejected"),
+    )
+
+
+def attendance_stats(employee, today):
+    """
+    Monthly present days plus today's login/logout times in one query.
+
+    Today's row is folded into the same aggregate with filtered ``Max``
+    expressions, so no separate ``.first()`` lookup is needed.
+    """
+    month_start = today.replace(day=1)
+    result = Attendance.objects.filter(
+        employee=employee,
+        date__gte=month_start,
+        date__lte=today,
+    ).aggregate(
+        present_days=Count("pk", filter=Q(login_time__isnull=False)),
+        today_login_time=Max("login_time", filter=Q(date=today)),
+        today_logout_time=Max("logout_time", filter=Q(date=today)),
+    )
+    result["present_days"] = result["present_days"] or 0
+    return result
+
+
+def ticket_stats(user):
+    """open/in_progress/resolved counters for tickets reported by ``user``."""
+    return aggregate_counts(
+        Ticket.objects.filter(reporter=user),
+        open=Q(status="open"),
+        in_progress=Q(status="in_progress"),
+        resolved=Q(status="resolved"),
+    )
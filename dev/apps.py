@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class DevConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dev'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from . import database, employee_search, instrumentation, search, signals  # noqa: F401
+
+        connection_created.connect(database.configure_connection)
+        connection_created.connect(instrumentation.install)
+        post_migrate.connect(search.create_tables, sender=self)
+        post_migrate.connect(employee_search.create_tables, sender=self)
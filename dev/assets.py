@@ -0,0 +1,338 @@
+"""
+Static asset pipeline: bundled, minified, content-hashed, pre-compressed.
+
+``manage.py build_assets`` runs collectstatic with ``AssetStorage`` (the
+``staticfiles`` storage in settings.STORAGES). After copying the files
+into STATIC_ROOT the storage:
+
+1. concatenates each of settings.STATIC_BUNDLES into one file,
+2. minifies the project's CSS and JS (files under
+   STATIC_MINIFY_PREFIXES that are not ``.min.`` already) with ``rcssmin``
+   / ``rjsmin`` when installed, otherwise with the conservative minifiers
+   below, which only drop comments and whitespace,
+3. hashes the results like ManifestStaticFilesStorage (``main.<hash>.css``
+   plus ``staticfiles.json``, with url() references rewritten), so
+   ``{% static %}`` returns URLs that can be cached forever, and
+4. writes a ``.gz`` sibling next to every text asset it shrinks.
+
+Before hashing it also writes WebP/JPEG derivatives of the images under
+IMAGE_DERIVATIVE_STATIC_PREFIXES (see ``dev.images``).
+
+``storage.report`` records the source, built and gzipped size of each
+minified file, which the command prints.
+
+Templates load a bundle with ``{% bundle "dev/js/profile.bundle.js" %}``
+(``dev/templatetags/assets.py``). It renders the bundle's files one by
+one in DEBUG or before the first build.
+
+``serve`` hands out STATIC_ROOT from the app process (see
+``static_urlpatterns``). It picks the ``.gz`` sibling when the client
+accepts gzip, marks hashed names ``immutable`` for a year, and answers
+If-Modified-Since with a 304. Set SERVE_STATIC_ASSETS = False when a web
+server or CDN serves STATIC_ROOT.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import images
+
+try:
+    import rcssmin
+except ImportError:  # optional; minify_css falls back to the builtin minifier
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # optional; minify_js falls back to the builtin minifier
+    rjsmin = None
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".map", ".txt", ".xml", ".html")
+# ManifestStaticFilesStorage inserts the first 12 hex digits of the MD5.
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+UNHASHED_MAX_AGE = 60
+
+
+def bundles():
+    return getattr(settings, "STATIC_BUNDLES", {})
+
+
+def _minifiable(name):
+    prefixes = tuple(getattr(settings, "STATIC_MINIFY_PREFIXES", ("",)))
+    return os.path.splitext(name)[1] in MINIFIERS and name.startswith(prefixes) and ".min." not in name
+
+
+# -----------------------
+# Minifiers
+# -----------------------
+def _string_end(text, start):
+    """Index just past the string (or template literal) opening at ``start``."""
+    quote, i, n = text[start], start + 1, len(text)
+    while i < n:
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return n
+
+
+def _regex_end(text, start):
+    """Index just past the regex literal (and flags) opening at ``start``, or ``start + 1`` if it is none."""
+    i, n, in_class = start + 1, len(text), False
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "\n":
+            return start + 1
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            i += 1
+            while i < n and text[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return start + 1
+
+
+_CSS_TIGHT = set("{};,>")
+
+
+def minify_css(text):
+    """Drop comments and collapsible whitespace; strings, selectors and values are kept as written."""
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    out, i, n, space = [], 0, len(text), False
+    while i < n:
+        c = text[i]
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if c.isspace():
+            space, i = True, i + 1
+            continue
+        j = _string_end(text, i) if c in "\"'" else i + 1
+        # "a :hover" needs its space, "color: red" does not.
+        if space and out and out[-1][-1] not in _CSS_TIGHT | {":"} and c not in _CSS_TIGHT:
+            out.append(" ")
+        if c == "}" and out and out[-1] == ";":
+            out.pop()
+        out.append(text[i:j])
+        space, i = False, j
+    return "".join(out)
+
+
+_JS_TIGHT = set("{}();,=:[]<>!?&|")
+# A newline after these, or before those, never ends a statement.
+_JS_JOIN_AFTER = set("{;,([=:?&|!")
+_JS_JOIN_BEFORE = set(")]}.,;:?&|=")
+_JS_REGEX_AFTER = set("(,=:[!&|?{};")
+_JS_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "new", "delete", "throw", "yield", "await"}
+
+
+def _is_word(c):
+    return c.isalnum() or c in "_$"
+
+
+def minify_js(text):
+    """
+    Drop comments and whitespace, keeping a newline wherever automatic
+    semicolon insertion could depend on it. Strings, template literals and
+    regex literals are copied as they are.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    out, i, n = [], 0, len(text)
+    space, last, last_word = "", "", ""
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            if c == "\n":
+                space = "\n"
+            elif not space:
+                space = " "
+            i += 1
+            continue
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            space = space or " "
+            continue
+
+        if c in "'\"`":
+            j = _string_end(text, i)
+        elif c == "/" and (not last or last in _JS_REGEX_AFTER or last_word in _JS_REGEX_KEYWORDS):
+            j = _regex_end(text, i)
+        elif _is_word(c):
+            j = i + 1
+            while j < n and _is_word(text[j]):
+                j += 1
+        else:
+            j = i + 1
+        token = text[i:j]
+
+        if space and out:
+            if space == "\n" and not (last in _JS_JOIN_AFTER or c in _JS_JOIN_BEFORE):
+                out.append("\n")
+            elif space == " " and not (last in _JS_TIGHT or c in _JS_TIGHT):
+                out.append(" ")
+        out.append(token)
+        space, last = "", token[-1]
+        last_word = token if _is_word(c) else ""
+        i = j
+    return "".join(out)
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+BUNDLE_SEPARATORS = {".css": "\n", ".js": ";\n"}
+
+
+# -----------------------
+# Storage
+# -----------------------
+class AssetStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that bundles, minifies and gzips (see module docstring)."""
+
+    # Templates may reference files that are not collected; fall back to the plain URL.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def _replace(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content.encode()))
+
+    def _read(self, paths, name):
+        storage, path = paths[name]
+        with storage.open(path) as handle:
+            return handle.read().decode()
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run=dry_run, **options)
+            return
+
+        self.report = {}
+        image_prefixes = tuple(getattr(settings, "IMAGE_DERIVATIVE_STATIC_PREFIXES", ()))
+        for name in list(paths):
+            if image_prefixes and name.startswith(image_prefixes) and images.is_raster(name):
+                storage, path = paths[name]
+                entry = images.generate(name, "static", source=storage, source_name=path, target=self, prefix="", force=True)
+                for derived in [images.index_name(name, prefix="")] + [v["name"] for v in entry["variants"]]:
+                    paths[derived] = (self, derived)
+
+        sources = {}
+        for name, parts in bundles().items():
+            missing = [part for part in parts if part not in paths]
+            if missing:
+                yield name, None, ValueError(f"Bundle {name} lists files that were not collected: {', '.join(missing)}")
+                continue
+            separator = BUNDLE_SEPARATORS.get(os.path.splitext(name)[1], "\n")
+            sources[name] = separator.join(self._read(paths, part) for part in parts)
+
+        for name in paths:
+            if name not in sources and _minifiable(name):
+                sources[name] = self._read(paths, name)
+
+        for name, source in sources.items():
+            built = MINIFIERS.get(os.path.splitext(name)[1], str)(source)
+            self._replace(name, built)
+            # Hash (and rewrite url() references in) the built file, not the source.
+            paths[name] = (self, name)
+            self.report[name] = {"source": len(source.encode()), "built": len(built.encode())}
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                size = self._write_gzip(name)
+                if name in self.report:
+                    self.report[name]["gzip"] = size
+
+    def _write_gzip(self, name):
+        with self.open(name) as handle:
+            compressed = gzip.compress(handle.read(), compresslevel=9, mtime=0)
+        if len(compressed) >= self.size(name):
+            return None
+        if self.exists(name + ".gz"):
+            self.delete(name + ".gz")
+        self._save(name + ".gz", ContentFile(compressed))
+        return len(compressed)
+
+
+def built_bundle(name):
+    """True when ``name`` can be served as one file (not DEBUG and present in the manifest)."""
+    if settings.DEBUG:
+        return False
+    hashed_files = getattr(staticfiles_storage, "hashed_files", None)
+    return bool(hashed_files) and staticfiles_storage.hash_key(name) in hashed_files
+
+
+# -----------------------
+# Serving
+# -----------------------
+def serve(request, path):
+    """Serve ``path`` from STATIC_ROOT, gzipped when accepted, cached for a year when hashed."""
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except ValueError:
+        raise Http404(path)
+    if not path or path.endswith(".gz") or not fullpath.is_file():
+        raise Http404(path)
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    encoded = fullpath.with_name(fullpath.name + ".gz")
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "") and encoded.is_file()
+    target = encoded if use_gzip else fullpath
+    stat = target.stat()
+
+    if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(target.open("rb"), content_type=content_type or "application/octet-stream")
+        response["Content-Length"] = str(stat.st_size)
+        if use_gzip:
+            response["Content-Encoding"] = "gzip"
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Vary"] = "Accept-Encoding"
+    if HASHED_NAME.search(path):
+        response["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={UNHASHED_MAX_AGE}"
+    return response
+
+
+def static_urlpatterns():
+    """URL patterns that serve STATIC_URL with ``serve`` (none when SERVE_STATIC_ASSETS is off)."""
+    prefix = settings.STATIC_URL
+    if not getattr(settings, "SERVE_STATIC_ASSETS", True) or not prefix or "://" in prefix:
+        return []
+    return [re_path(r"^%s(?P<path>.*)$" % re.escape(prefix.lstrip("/")), serve)]
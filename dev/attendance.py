@@ -0,0 +1,363 @@
+"""
+Attendance rollups and working-day calendar.
+
+AttendanceMonthlySummary rows are kept in step with Attendance by the
+attendance APIs (record_login / record_work_seconds) and can be rebuilt in bulk
+with ``rebuild_summaries`` (``manage.py rebuild_attendance_summary``).
+
+The login/logout APIs go through ``apunch_in`` / ``apunch_out``. Each punch
+is claimed with a single statement that only succeeds if the punch has not
+happened yet (an INSERT guarded by the (employee, date) unique constraint,
+or an UPDATE ... WHERE login_time/logout_time IS NULL), so concurrent or
+repeated clicks record a punch exactly once without a read-then-write race.
+Only the request that won the claim updates the summary, dashboards and
+live events and queues the notification.
+"""
+import calendar
+from datetime import date, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from . import bulk, dashboard_cache, events, hierarchy, notifications as notifier
+from .models import Attendance, AttendanceMonthlySummary, Break, Holiday
+
+
+def late_after():
+    """Local time after which a login counts as late (settings.ATTENDANCE_LATE_AFTER)."""
+    value = getattr(settings, "ATTENDANCE_LATE_AFTER", "09:30")
+    return value if isinstance(value, time) else time.fromisoformat(value)
+
+
+def is_late(login_time, tz=None):
+    return login_time is not None and timezone.localtime(login_time, tz).time() > late_after()
+
+
+# -----------------------
+# Working-day calendar
+# -----------------------
+def month_bounds(year, month):
+    """First and last date of the month."""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def working_days(company_id, year, month):
+    """Mon-Fri days in the month minus the company's weekday holidays."""
+    first, last = month_bounds(year, month)
+    weekdays = sum(
+        1 for day in range(1, last.day + 1)
+        if date(year, month, day).weekday() < 5
+    )
+    holidays = Holiday.objects.filter(
+        company_id=company_id,
+        date__gte=first,
+        date__lte=last,
+    ).values_list("date", flat=True)
+    return weekdays - sum(1 for holiday in holidays if holiday.weekday() < 5)
+
+
+# -----------------------
+# Incremental maintenance
+# -----------------------
+def _apply_delta(employee_id, day, present_days=0, total_work_seconds=0, late_count=0):
+    """Add the deltas to the employee's summary row for ``day``'s month, creating it if needed."""
+    deltas = {
+        "present_days": present_days,
+        "total_work_seconds": total_work_seconds,
+        "late_count": late_count,
+    }
+    lookup = {"employee_id": employee_id, "year": day.year, "month": day.month}
+    updates = {field: F(field) + value for field, value in deltas.items() if value}
+    if not updates:
+        return
+    updates["updated_at"] = timezone.now()
+
+    if AttendanceMonthlySummary.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            AttendanceMonthlySummary.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Another request created the row first; apply on top of it.
+        AttendanceMonthlySummary.objects.filter(**lookup).update(**updates)
+
+
+def record_login(attendance):
+    """Count a first login of the day."""
+    _apply_delta(
+        attendance.employee_id,
+        attendance.date,
+        present_days=1,
+        late_count=int(is_late(attendance.login_time)),
+    )
+
+
+def record_work_seconds(attendance, seconds_delta):
+    """Add (or with a negative delta, remove) worked seconds for the attendance's month."""
+    _apply_delta(attendance.employee_id, attendance.date, total_work_seconds=seconds_delta)
+
+
+def apply_deltas(deltas, batch_size=1000):
+    """
+    Bulk counterpart of record_login/record_work_seconds.
+
+    ``deltas`` maps (employee_id, year, month) to
+    (present_days, total_work_seconds, late_count) increments. They are
+    added with one INSERT ... ON CONFLICT DO UPDATE per batch, so the
+    increment happens in the database and concurrent punches cannot
+    overwrite each other's counts.
+    """
+    deltas = [(key, value) for key, value in deltas.items() if any(value)]
+    if not deltas:
+        return
+
+    table = connection.ops.quote_name(AttendanceMonthlySummary._meta.db_table)
+    now = timezone.now()
+    bulk.insert_rows(
+        AttendanceMonthlySummary,
+        ["id", "employee", "year", "month", "present_days", "total_work_seconds", "late_count",
+         "created_at", "updated_at"],
+        [
+            (pk, employee_id, year, month, *delta, now, now)
+            for pk, ((employee_id, year, month), delta) in zip(bulk.new_ids(len(deltas)), deltas)
+        ],
+        suffix=(
+            " ON CONFLICT (employee_id, year, month) DO UPDATE SET"
+            f" present_days = {table}.present_days + excluded.present_days,"
+            f" total_work_seconds = {table}.total_work_seconds + excluded.total_work_seconds,"
+            f" late_count = {table}.late_count + excluded.late_count,"
+            " updated_at = excluded.updated_at"
+        ),
+        batch_size=batch_size,
+    )
+
+
+def get_summary(employee, year, month):
+    """The employee's summary row for the month, or None."""
+    return AttendanceMonthlySummary.objects.filter(
+        employee=employee, year=year, month=month
+    ).first()
+
+
+def attendance_rate(employee, year, month):
+    """Present days as a percentage of the company's working days."""
+    total_working_days = working_days(employee.company_id, year, month)
+    summary = get_summary(employee, year, month)
+    present_days = summary.present_days if summary else 0
+    return (present_days / total_working_days * 100) if total_working_days > 0 else 0
+
+
+# -----------------------
+# Work totals
+# -----------------------
+def merged_break_seconds(login_time, logout_time, breaks):
+    """
+    Seconds of ``breaks`` inside [login_time, logout_time], counting
+    overlapping breaks once.
+
+    ``breaks`` are (start_time, end_time, duration_seconds) tuples. A break
+    without an end lasts ``duration_seconds`` or, if that is 0, until logout.
+    """
+    intervals = []
+    for start, end, duration in breaks:
+        if end is None:
+            end = start + timedelta(seconds=duration) if duration else logout_time
+        start, end = max(start, login_time), min(end, logout_time)
+        if end > start:
+            intervals.append((start, end))
+
+    total = 0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += (current_end - current_start).total_seconds()
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += (current_end - current_start).total_seconds()
+    return int(total)
+
+
+def compute_totals(attendances, save=True, batch_size=1000):
+    """
+    Set ``total_work_seconds`` to (logout - login) minus merged break time
+    for every row, loading the breaks of all rows in one query.
+
+    With ``save`` only the rows whose total changed are written back with
+    ``bulk_update``. Returns the changed rows.
+    """
+    attendances = list(attendances)
+    breaks = {}
+    ids = [attendance.pk for attendance in attendances if attendance.pk]
+    for attendance_id, start, end, duration in Break.objects.filter(attendance_id__in=ids).values_list(
+        "attendance_id", "start_time", "end_time", "duration_seconds"
+    ).order_by():
+        breaks.setdefault(attendance_id, []).append((start, end, duration))
+
+    changed = []
+    for attendance in attendances:
+        if attendance.login_time and attendance.logout_time and attendance.logout_time > attendance.login_time:
+            worked = int((attendance.logout_time - attendance.login_time).total_seconds())
+            worked -= merged_break_seconds(
+                attendance.login_time, attendance.logout_time, breaks.get(attendance.pk, ())
+            )
+        else:
+            worked = 0
+        if worked != attendance.total_work_seconds:
+            attendance.total_work_seconds = worked
+            changed.append(attendance)
+
+    if save and changed:
+        Attendance.all_objects.bulk_update(changed, ["total_work_seconds"], batch_size=batch_size)
+    return changed
+
+
+# -----------------------
+# Single punches
+# -----------------------
+def event_payload(attendance):
+    """Data of the live "attendance" event for ``attendance``."""
+    return {
+        "employee_id": attendance.employee_id,
+        "date": attendance.date,
+        "login_time": attendance.login_time,
+        "logout_time": attendance.logout_time,
+        "total_work_seconds": attendance.total_work_seconds,
+    }
+
+
+def _punched(employee, attendance, title, body):
+    """Side effects of a recorded punch: dashboards, live event and the (deferred) notification."""
+    audience = {employee.user_id} | hierarchy.ancestor_ids({employee.user_id})
+    dashboard_cache.invalidate_users(audience)
+    events.publish(audience, "attendance", event_payload(attendance))
+    notifier.notify(employee.user_id, title=title, body=body, notif_type="info")
+
+
+def _logged_in(employee, attendance):
+    record_login(attendance)
+    _punched(
+        employee,
+        attendance,
+        "Attendance Logged",
+        f"You have successfully logged in at {timezone.localtime(attendance.login_time).strftime('%I:%M %p')}",
+    )
+
+
+def _logged_out(employee, attendance):
+    previous_seconds = attendance.total_work_seconds
+    compute_totals([attendance])
+    record_work_seconds(attendance, attendance.total_work_seconds - previous_seconds)
+    _punched(
+        employee,
+        attendance,
+        "Attendance Logged Out",
+        f"You have logged out at {timezone.localtime(attendance.logout_time).strftime('%I:%M %p')}. "
+        f"Total work time: {attendance.total_work_seconds / 3600:.2f} hours",
+    )
+
+
+async def apunch_in(employee, at=None, created_by=None):
+    """
+    Log ``employee`` in for the day of ``at`` (default: now).
+
+    Returns ``(attendance, recorded)``; ``recorded`` is False when the
+    employee had already logged in that day, and ``attendance`` is then
+    the existing row. The first punch of the day is one INSERT. If a row
+    already exists (created without a login, or soft-deleted) it is
+    claimed by a conditional UPDATE instead, so of two concurrent punches
+    exactly one is recorded.
+    """
+    at = at or timezone.now()
+    attendance = Attendance(employee_id=employee.pk, date=at.date(), login_time=at, created_by=created_by)
+    try:
+        await Attendance.objects.abulk_create([attendance])
+        recorded = True
+    except IntegrityError:
+        recorded = bool(await Attendance.all_objects.filter(
+            Q(login_time__isnull=True) | Q(is_deleted=True),
+            employee_id=employee.pk,
+            date=attendance.date,
+        ).aupdate(
+            login_time=at, logout_time=None, total_work_seconds=0, is_deleted=False, deleted_at=None, updated_at=at
+        ))
+        attendance = await Attendance.objects.aget(employee_id=employee.pk, date=attendance.date)
+    if recorded:
+        await sync_to_async(_logged_in)(employee, attendance)
+    return attendance, recorded
+
+
+async def apunch_out(employee, at=None):
+    """
+    Log ``employee`` out for the day of ``at`` (default: now).
+
+    Returns ``(attendance, recorded)``: the day's row (None without one)
+    and whether this call logged out. The logout is claimed with one
+    conditional UPDATE (logged in, not yet out); only the winner computes
+    the work total, so a double click cannot count the day twice.
+    """
+    at = at or timezone.now()
+    rows = Attendance.objects.filter(employee_id=employee.pk, date=at.date())
+    recorded = bool(await rows.filter(
+        login_time__isnull=False, logout_time__isnull=True
+    ).aupdate(logout_time=at, updated_at=at))
+    attendance = await rows.afirst()
+    if recorded:
+        await sync_to_async(_logged_out)(employee, attendance)
+    return attendance, recorded
+
+
+# -----------------------
+# Bulk rebuild
+# -----------------------
+def rebuild_summaries(employee_ids=None, year=None, month=None, batch_size=1000):
+    """
+    Recompute summary rows from Attendance with one grouped query and
+    replace the existing rows in the selected scope. Returns the number of
+    rows written.
+    """
+    attendances = Attendance.objects.all()
+    summaries = AttendanceMonthlySummary.objects.all()
+    if employee_ids is not None:
+        attendances = attendances.filter(employee_id__in=employee_ids)
+        summaries = summaries.filter(employee_id__in=employee_ids)
+    if year is not None:
+        attendances = attendances.filter(date__year=year)
+        summaries = summaries.filter(year=year)
+    if month is not None:
+        attendances = attendances.filter(date__month=month)
+        summaries = summaries.filter(month=month)
+
+    rows = (
+        attendances
+        .annotate(year_=ExtractYear("date"), month_=ExtractMonth("date"))
+        .values("employee_id", "year_", "month_")
+        .annotate(
+            present=Count("pk", filter=Q(login_time__isnull=False)),
+            seconds=Sum("total_work_seconds"),
+            late=Count("pk", filter=Q(login_time__time__gt=late_after())),
+        )
+        .order_by()
+    )
+    objs = [
+        AttendanceMonthlySummary(
+            employee_id=row["employee_id"],
+            year=row["year_"],
+            month=row["month_"],
+            present_days=row["present"],
+            total_work_seconds=row["seconds"] or 0,
+            late_count=row["late"],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        summaries.delete()
+        AttendanceMonthlySummary.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
@@ -0,0 +1,621 @@
+"""
+Synthetic data and view benchmarks for the HR portal.
+
+``seed`` fills the database with a realistic company at a chosen scale:
+departments, a manager layer, employees, working-day Attendance going back
+``years``, Tasks, Notifications, LeaveRequests and KB articles, all written
+with ``bulk_create`` in batches (signals are bypassed, so the derived
+tables - monthly summaries, notification counters, search indexes, the
+reporting hierarchy - are rebuilt afterwards). The data is deterministic for a given ``seed``.
+
+``run`` times the key views through the test client as fixed bench users
+and reports p50/p95 latency and query count per view; ``compare`` checks a
+run against a saved baseline so regressions show up before deploy. Both
+are driven by ``manage.py seed_bench`` and ``manage.py run_bench``.
+
+``punch_load`` (``manage.py bench_punches``) is a concurrency test for the
+async attendance APIs: many employees punching at once, each several
+times, and a check that every punch was recorded exactly once. It resets
+today's attendance of the employees it uses, so it only picks the ones
+``seed`` created unless told otherwise.
+
+``sqlite_contention`` (``manage.py bench_sqlite``) compares SQLite's
+default journal settings with the tuned pragmas of ``dev.database`` under
+concurrent writers and readers, on scratch database files.
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, time as dtime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import AsyncClient, Client as TestClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import attendance, dashboard_cache, database, employee_search, hierarchy, notifications, search
+from .models import (
+    Attendance,
+    AttendanceMonthlySummary,
+    Company,
+    Department,
+    Designation,
+    Employee,
+    KBArticle,
+    LeaveRequest,
+    LeaveType,
+    Notification,
+    Project,
+    Task,
+    User,
+)
+
+BENCH_PASSWORD = "bench"
+# Every user seed() creates has an address at this domain; punch_load only touches those.
+BENCH_EMAIL_DOMAIN = "bench.example"
+
+FIRST_NAMES = [
+    "Aarav", "Aisha", "Amit", "Ana", "Ananya", "Carlos", "Chen", "Daniel", "Divya", "Elena",
+    "Fatima", "Hiro", "Ivan", "James", "Jennifer", "Kavya", "Lars", "Linda", "Maria", "Michael",
+    "Mohammed", "Nikhil", "Olga", "Priya", "Rahul", "Sara", "Sofia", "Thomas", "Wei", "Yuki",
+]
+LAST_NAMES = [
+    "Brown", "Chen", "Das", "Fernandes", "Garcia", "Gonzalez", "Gupta", "Ivanova", "Iyer", "Jones",
+    "Khan", "Kim", "Kumar", "Lee", "Menon", "Miller", "Nair", "Nguyen", "Patel", "Rao",
+    "Reddy", "Sharma", "Singh", "Smith", "Suzuki", "Thomas", "Wang", "Williams", "Wilson", "Yadav",
+]
+DEPARTMENTS = ["Engineering", "Sales", "Marketing", "Finance", "Human Resources", "Operations", "Support", "Design"]
+DESIGNATIONS = [("Intern", 0), ("Associate", 1), ("Senior Associate", 2), ("Lead", 3), ("Manager", 4), ("Director", 5)]
+LEAVE_TYPES = [("Casual", 12), ("Sick", 10), ("Earned", 15)]
+WORDS = (
+    "payroll leave policy onboarding laptop expense travel reimbursement benefits insurance holiday "
+    "attendance shift remote access password vpn email calendar meeting review appraisal training "
+    "invoice client project deadline report security compliance badge parking wellness referral"
+).split()
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _bulk(model, rows, batch_size):
+    created = 0
+    for batch in _batched(rows, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+# -----------------------
+# Synthetic data
+# -----------------------
+def seed(companies=1, employees=10000, years=1, tasks_per_employee=8, notifications_per_employee=30,
+         leaves_per_employee=6, articles=2000, seed=0, batch_size=5000, log=print):
+    """
+    Create ``companies`` bench companies of ``employees`` employees each.
+    Returns the number of rows created per model. The first company gets
+    the bench users (see BENCH_USERS) that ``run`` logs in as.
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCH_PASSWORD)
+    today = timezone.localdate()
+    created = {}
+
+    def count(model, n):
+        created[model.__name__] = created.get(model.__name__, 0) + n
+
+    for number in range(companies):
+        company = Company.objects.create(name=f"Bench Co {number + 1}" if number else "Bench Co")
+        prefix = "bench_" if number == 0 else f"bench{number + 1}_"
+        log(f"{company.name}: structure")
+
+        departments = Department.objects.bulk_create([
+            Department(company=company, name=name, code=name[:3].upper()) for name in DEPARTMENTS
+        ])
+        designations = Designation.objects.bulk_create([
+            Designation(company=company, title=title, level=level) for title, level in DESIGNATIONS
+        ])
+        leave_types = LeaveType.objects.bulk_create([
+            LeaveType(company=company, name=name, default_days_per_year=days) for name, days in LEAVE_TYPES
+        ])
+        projects = Project.objects.bulk_create([
+            Project(company=company, name=f"{rng.choice(WORDS).title()} {i + 1}", code=f"P{i + 1:03d}", status="active")
+            for i in range(max(5, employees // 200))
+        ])
+
+        # Users: admin, hr, one manager per ~10 employees, then everyone else.
+        manager_count = max(1, employees // 10)
+        users = []
+        for i in range(employees):
+            if i == 0:
+                username, role = f"{prefix}admin", "admin"
+            elif i == 1:
+                username, role = f"{prefix}hr", "hr"
+            elif i < 2 + manager_count:
+                username, role = (f"{prefix}manager" if i == 2 else f"{prefix}manager{i}"), "manager"
+            else:
+                username, role = (f"{prefix}employee" if i == 2 + manager_count else f"{prefix}employee{i}"), "employee"
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            users.append(User(
+                username=username,
+                first_name=first,
+                last_name=last,
+                email=f"{username}@{BENCH_EMAIL_DOMAIN}",
+                password=password,
+                role=role,
+                is_staff=role in ("admin", "hr"),
+            ))
+        log(f"{company.name}: {employees} users and employees")
+        for batch in _batched(users, batch_size):
+            User.objects.bulk_create(batch)
+        count(User, len(users))
+
+        admin, managers = users[0], users[2:2 + manager_count]
+        staff = []
+        for i, user in enumerate(users):
+            if i < 2:
+                manager = None
+            elif user.role == "manager":
+                manager = admin
+            else:
+                # Round-robin, so every manager (bench_manager included) has ~9 reportees.
+                manager = managers[(i - 2 - manager_count) % len(managers)]
+            staff.append(Employee(
+                user=user,
+                company=company,
+                department=rng.choice(departments),
+                designation=designations[4] if user.role == "manager" else rng.choice(designations[:4]),
+                employee_code=f"EMP{i + 1:06d}",
+                date_of_joining=today - timedelta(days=rng.randint(30, 365 * (years + 3))),
+                manager=manager,
+            ))
+        count(Employee, _bulk(Employee, staff, batch_size))
+
+        log(f"{company.name}: attendance, {years} year(s)")
+        days = [
+            today - timedelta(days=offset)
+            for offset in range(365 * years)
+            if (today - timedelta(days=offset)).weekday() < 5
+        ]
+
+        def attendance_rows():
+            for day in days:
+                midnight = timezone.make_aware(datetime.combine(day, dtime()))
+                for employee in staff:
+                    if rng.random() < 0.08:
+                        continue
+                    login_time = midnight + timedelta(minutes=rng.randint(8 * 60 + 15, 10 * 60 + 30))
+                    if day == today:
+                        yield Attendance(employee=employee, date=day, login_time=login_time)
+                        continue
+                    worked = rng.randint(6 * 3600, 10 * 3600)
+                    yield Attendance(
+                        employee=employee,
+                        date=day,
+                        login_time=login_time,
+                        logout_time=login_time + timedelta(seconds=worked),
+                        total_work_seconds=worked,
+                    )
+
+        count(Attendance, _bulk(Attendance, attendance_rows(), batch_size))
+
+        log(f"{company.name}: tasks, leave requests, notifications")
+
+        def task_rows():
+            for employee in staff:
+                for _ in range(tasks_per_employee):
+                    created_at = timezone.now() - timedelta(days=rng.randint(0, 365 * years))
+                    status = rng.choices(["todo", "in_progress", "done"], [3, 2, 5])[0]
+                    yield Task(
+                        project=rng.choice(projects),
+                        title=_sentence(rng, 4),
+                        description=_sentence(rng, 20),
+                        reporter=employee.manager or admin,
+                        assignee=employee.user,
+                        priority=rng.choice(["low", "medium", "high"]),
+                        status=status,
+                        due_date=created_at.date() + timedelta(days=rng.randint(1, 30)),
+                        created_at=created_at,
+                    )
+
+        def leave_rows():
+            for employee in staff:
+                for _ in range(leaves_per_employee):
+                    start = today + timedelta(days=rng.randint(-365 * years, 60))
+                    length = rng.randint(1, 5)
+                    status = "pending" if start > today else rng.choices(["approved", "rejected"], [9, 1])[0]
+                    yield LeaveRequest(
+                        employee=employee,
+                        leave_type=rng.choice(leave_types),
+                        start_date=start,
+                        end_date=start + timedelta(days=length - 1),
+                        days=Decimal(length),
+                        reason=_sentence(rng, 8),
+                        status=status,
+                        approver=None if status == "pending" else employee.manager,
+                    )
+
+        def notification_rows():
+            for user in users:
+                for _ in range(notifications_per_employee):
+                    created_at = timezone.now() - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+                    yield Notification(
+                        title=_sentence(rng, 5),
+                        body=_sentence(rng, 15),
+                        recipient=user,
+                        notif_type=rng.choices(["info", "warning", "alert"], [8, 2, 1])[0],
+                        is_read=rng.random() < 0.7,
+                        created_at=created_at,
+                    )
+
+        count(Task, _bulk(Task, task_rows(), batch_size))
+        count(LeaveRequest, _bulk(LeaveRequest, leave_rows(), batch_size))
+        count(Notification, _bulk(Notification, notification_rows(), batch_size))
+
+        def article_rows():
+            for i in range(articles):
+                title = _sentence(rng, rng.randint(3, 7))
+                yield KBArticle(
+                    company=company,
+                    title=title,
+                    slug=f"article-{i + 1}",
+                    body="\n\n".join(_sentence(rng, rng.randint(20, 60)) for _ in range(rng.randint(2, 6))),
+                    is_public=rng.random() < 0.8,
+                )
+
+        count(KBArticle, _bulk(KBArticle, article_rows(), batch_size))
+
+    log("Rebuilding derived tables")
+    hierarchy.rebuild(batch_size=batch_size)
+    attendance.rebuild_summaries(batch_size=batch_size)
+    notifications.reconcile_counters(batch_size=batch_size)
+    search.rebuild(KBArticle, batch_size=batch_size)
+    employee_search.rebuild(batch_size=batch_size)
+    return created
+
+
+# -----------------------
+# Benchmarks
+# -----------------------
+# name -> (bench user, url)
+BENCHMARKS = {
+    "employee_dashboard": ("bench_employee", "/dev/dashboard/"),
+    "team_attendance": ("bench_manager", "/dev/manager/team-attendance/"),
+    "approve_leaves": ("bench_manager", "/dev/manager/approve-leaves/"),
+    "all_employees": ("bench_hr", "/dev/hr/employees/"),
+    "all_employees_search": ("bench_hr", "/dev/hr/employees/?search=priya+nair"),
+    "knowledgebase": ("bench_employee", "/dev/knowledgebase/"),
+    "knowledgebase_search": ("bench_employee", "/dev/knowledgebase/?search=leave+policy"),
+}
+BENCH_USERS = sorted({username for username, _ in BENCHMARKS.values()})
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(names=None, iterations=20, warmup=2, cold=False):
+    """
+    Time each benchmark ``iterations`` times after ``warmup`` untimed
+    requests. With ``cold`` the bench user's dashboard cache is invalidated
+    before every request. Returns {name: result}.
+    """
+    results = {}
+    clients = {}
+    for name in names or BENCHMARKS:
+        username, url = BENCHMARKS[name]
+        user = User.objects.select_related("employee_profile").get(username=username)
+        if username not in clients:
+            clients[username] = TestClient()
+            clients[username].force_login(user)
+        client = clients[username]
+
+        timings, queries, status = [], [], None
+        try:
+            for i in range(warmup + iterations):
+                if cold:
+                    dashboard_cache.invalidate_users([user.pk])
+                    dashboard_cache.invalidate_companies([user.employee_profile.company_id])
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    elapsed = time.perf_counter() - start
+                status = response.status_code
+                if i >= warmup:
+                    timings.append(elapsed * 1000)
+                    queries.append(len(captured.captured_queries))
+        except Exception as exc:
+            results[name] = {"url": url, "error": f"{type(exc).__name__}: {exc}"}
+            continue
+        if status != 200:
+            results[name] = {"url": url, "error": f"HTTP {status}"}
+            continue
+        results[name] = {
+            "url": url,
+            "status": status,
+            "p50_ms": round(_percentile(timings, 0.5), 2),
+            "p95_ms": round(_percentile(timings, 0.95), 2),
+            "queries": max(queries),
+        }
+    return results
+
+
+def errors(results):
+    """Messages for the benchmarks in ``results`` that raised or did not answer 200."""
+    return [f"{name}: {result['error']}" for name, result in results.items() if "error" in result]
+
+
+def compare(results, baseline, tolerance=0.25, min_delta_ms=2.0):
+    """
+    Regressions of ``results`` against ``baseline``: p95 slower by more
+    than ``tolerance`` (and by at least ``min_delta_ms``), more queries, or
+    a benchmark that errors (with or without a baseline). Returns a list of
+    messages.
+    """
+    regressions = errors(results)
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or "error" in before or "error" in result:
+            continue
+        limit = before["p95_ms"] * (1 + tolerance)
+        if result["p95_ms"] > limit and result["p95_ms"] - before["p95_ms"] >= min_delta_ms:
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > {before['p95_ms']} ms baseline")
+        if result["queries"] > before["queries"]:
+            regressions.append(f"{name}: {result['queries']} queries > {before['queries']} baseline")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)["results"]
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"created_at": timezone.now().isoformat(), "results": results}, fh, indent=2, sort_keys=True)
+
+
+# -----------------------
+# Punch load test
+# -----------------------
+async def _punch_storm(clients, url, repeats, concurrency, same_key):
+    """POST ``url`` ``repeats`` times per client, all interleaved. Returns [(client index, status, body, ms)]."""
+    gate = asyncio.Semaphore(concurrency)
+    keys = [f"bench-{index}-{url}" for index in range(len(clients))]
+
+    async def punch(index):
+        headers = {"Idempotency-Key": keys[index]} if same_key else {}
+        async with gate:
+            start = time.perf_counter()
+            response = await clients[index].post(url, headers=headers)
+            elapsed = (time.perf_counter() - start) * 1000
+        body = json.loads(response.content) if response["Content-Type"] == "application/json" else {}
+        if response.get("Idempotent-Replayed"):
+            body = {**body, "replayed": True}
+        return index, response.status_code, body, elapsed
+
+    order = [index for _ in range(repeats) for index in range(len(clients))]
+    random.Random(len(clients)).shuffle(order)
+    return await asyncio.gather(*(punch(index) for index in order))
+
+
+def _summary_totals(employee_ids, day):
+    return AttendanceMonthlySummary.objects.filter(
+        employee_id__in=employee_ids, year=day.year, month=day.month
+    ).aggregate(present=Sum("present_days"), seconds=Sum("total_work_seconds"))
+
+
+def punch_load(employees=1000, repeats=3, concurrency=200, same_key=False, logout=True, any_employees=False):
+    """
+    Log ``employees`` bench employees in (and then out) through the async
+    attendance APIs, sending every punch ``repeats`` times with at most
+    ``concurrency`` requests in flight, like a crowd of double-clicking
+    users at 9am. With ``same_key`` the repeats of a punch share an
+    Idempotency-Key, as client retries would.
+
+    Today's attendance of those employees is hard-deleted first and their
+    monthly summaries rebuilt, so only employees created by ``seed`` are
+    used; ``any_employees`` lifts that restriction (scratch copies of real
+    data only). Raises ValueError when there is nobody to punch. Returns
+    per-phase latency and throughput and a list of ``problems``: punches
+    recorded other than exactly once, server errors, or summaries that
+    drifted from the attendance rows.
+    """
+    members = Employee.objects.filter(is_active_employee=True)
+    if not any_employees:
+        members = members.filter(user__email__endswith=f"@{BENCH_EMAIL_DOMAIN}")
+    members = list(members.select_related("user").order_by("employee_code")[:employees])
+    if not members:
+        raise ValueError(
+            "No employees created by seed_bench to punch with."
+            if not any_employees else "No active employees to punch with."
+        )
+    employee_ids = [member.pk for member in members]
+    today = timezone.now().date()
+    Attendance.all_objects.filter(employee_id__in=employee_ids, date=today).delete()
+    attendance.rebuild_summaries(employee_ids, today.year, today.month)
+    before = _summary_totals(employee_ids, today)
+
+    async def storm():
+        clients = []
+        for member in members:
+            client = AsyncClient()
+            await client.aforce_login(member.user)
+            clients.append(client)
+        phases = [("login", "/dev/api/attendance/login/")]
+        if logout:
+            phases.append(("logout", "/dev/api/attendance/logout/"))
+        results = {}
+        for phase, url in phases:
+            start = time.perf_counter()
+            responses = await _punch_storm(clients, url, repeats, concurrency, same_key)
+            results[phase] = (responses, time.perf_counter() - start)
+        return results
+
+    results, problems = {}, []
+    for phase, (responses, wall) in asyncio.run(storm()).items():
+        recorded = [0] * len(members)
+        errors = 0
+        for index, status, body, _ in responses:
+            if status >= 500:
+                errors += 1
+            elif body.get("success") and not body.get("replayed"):
+                recorded[index] += 1
+        wrong = sum(1 for count in recorded if count != 1)
+        if errors:
+            problems.append(f"{phase}: {errors} server errors")
+        if wrong:
+            problems.append(f"{phase}: {wrong} employees recorded other than exactly once")
+        timings = [elapsed for _, _, _, elapsed in responses]
+        results[phase] = {
+            "requests": len(responses),
+            "recorded": sum(recorded),
+            "statuses": dict(sorted(Counter(status for _, status, _, _ in responses).items())),
+            "p50_ms": round(_percentile(timings, 0.5), 2),
+            "p95_ms": round(_percentile(timings, 0.95), 2),
+            "max_ms": round(max(timings), 2),
+            "per_second": round(len(responses) / wall, 1),
+        }
+
+    rows = Attendance.objects.filter(employee_id__in=employee_ids, date=today)
+    logged_in = rows.filter(login_time__isnull=False).count()
+    if logged_in != len(members):
+        problems.append(f"{logged_in} attendance rows with a login, expected {len(members)}")
+    after = _summary_totals(employee_ids, today)
+    present = (after["present"] or 0) - (before["present"] or 0)
+    if present != len(members):
+        problems.append(f"summary present_days grew by {present}, expected {len(members)}")
+    seconds = (after["seconds"] or 0) - (before["seconds"] or 0)
+    worked = rows.aggregate(seconds=Sum("total_work_seconds"))["seconds"] or 0
+    if seconds != worked:
+        problems.append(f"summary work seconds grew by {seconds}, attendance rows hold {worked}")
+    results["problems"] = problems
+    return results
+
+
+# -----------------------
+# SQLite contention
+# -----------------------
+CONTENTION_SCHEMA = """
+CREATE TABLE punch (id INTEGER PRIMARY KEY, employee INTEGER NOT NULL, day INTEGER NOT NULL, at REAL NOT NULL);
+CREATE INDEX punch_employee_day ON punch (employee, day);
+CREATE TABLE summary (employee INTEGER PRIMARY KEY, punches INTEGER NOT NULL DEFAULT 0);
+"""
+
+
+def _connect(path, values):
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    database.apply_pragmas(conn.cursor(), values)
+    return conn
+
+
+def _run_profile(path, values, writers, readers, seconds, employees, begin):
+    setup = _connect(path, values)
+    setup.executescript(CONTENTION_SCHEMA)
+    setup.executemany("INSERT INTO summary (employee) VALUES (?)", [(e,) for e in range(employees)])
+    setup.close()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    write_ms, read_ms = [], []
+
+    def writer(seed):
+        conn, n = _connect(path, values), seed
+        while not stop.is_set():
+            employee, n = n % employees, n + writers
+            start = time.perf_counter()
+            try:
+                conn.execute(begin)
+                conn.execute("INSERT INTO punch (employee, day, at) VALUES (?, 1, ?)", (employee, time.time()))
+                conn.execute("UPDATE summary SET punches = punches + 1 WHERE employee = ?", (employee,))
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                with lock:
+                    counts["errors"] += 1
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                counts["writes"] += 1
+                write_ms.append(elapsed)
+        conn.close()
+
+    def reader(seed):
+        conn = _connect(path, values)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                conn.execute(
+                    "SELECT employee, COUNT(*) FROM punch WHERE day = 1 AND employee < ? GROUP BY employee",
+                    (seed * 50 % employees + 50,),
+                ).fetchall()
+                conn.execute("SELECT SUM(punches) FROM summary").fetchone()
+            except sqlite3.OperationalError:
+                with lock:
+                    counts["errors"] += 1
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                counts["reads"] += 1
+                read_ms.append(elapsed)
+        conn.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "writes_per_s": round(counts["writes"] / seconds, 1),
+        "reads_per_s": round(counts["reads"] / seconds, 1),
+        "errors": counts["errors"],
+        "write_p95_ms": round(_percentile(write_ms, 0.95), 2) if write_ms else None,
+        "read_p95_ms": round(_percentile(read_ms, 0.95), 2) if read_ms else None,
+    }
+
+
+def sqlite_contention(writers=8, readers=4, seconds=5.0, employees=2000, directory=None):
+    """
+    Run ``writers`` punch-like write transactions and ``readers`` dashboard
+    aggregates against a scratch database for ``seconds``, once with
+    SQLite's defaults and once with the tuned pragmas. Returns
+    {"default": stats, "tuned": stats}.
+    """
+    profiles = {
+        "default": ({"journal_mode": "DELETE", "synchronous": "FULL"}, "BEGIN"),
+        "tuned": (database.pragmas(), "BEGIN IMMEDIATE"),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        for name, (values, begin) in profiles.items():
+            path = os.path.join(scratch, f"{name}.sqlite3")
+            results[name] = _run_profile(path, values, writers, readers, seconds, employees, begin)
+    return results
+
@@ -0,0 +1,65 @@
+"""
+Multi-row INSERTs for the hot write paths (punch ingestion, notification
+fan-out, monthly summary increments).
+
+``bulk_create`` builds a model instance per row and prepares every value
+through its field, which is most of the cost of writing tens of thousands
+of rows. ``insert_rows`` takes plain tuples instead, converts each column
+with one adapter picked from the field type up front, and runs a single
+``executemany``. No signals, defaults or ``save()`` hooks run: callers
+pass every NOT NULL column themselves (``new_ids`` for UUID keys).
+"""
+import functools
+import os
+import uuid
+
+from django.db import connection
+
+
+def new_ids(n):
+    """``n`` version-4 UUIDs from one urandom() call (uuid4() makes a system call per id)."""
+    data = os.urandom(16 * n)
+    return [uuid.UUID(bytes=data[i:i + 16], version=4) for i in range(0, 16 * n, 16)]
+
+
+def _adapter(field):
+    field = getattr(field, "target_field", field) if field.is_relation else field
+    kind = field.get_internal_type()
+    if kind == "UUIDField" and not connection.features.has_native_uuid_field:
+        return lambda value: value.hex if value is not None else None
+    # Rows often share timestamps (created_at/updated_at, a shift's dates): convert each value once.
+    if kind == "DateTimeField":
+        return functools.lru_cache(maxsize=4096)(connection.ops.adapt_datetimefield_value)
+    if kind == "DateField":
+        return functools.lru_cache(maxsize=4096)(connection.ops.adapt_datefield_value)
+    if kind == "DecimalField":
+        return connection.ops.adapt_decimalfield_value
+    return None
+
+
+def insert_rows(model, fields, rows, suffix="", batch_size=1000):
+    """
+    INSERT ``rows`` (tuples of values for ``fields``, in that order) into
+    ``model``'s table. ``suffix`` is appended to the statement, e.g. an
+    ``ON CONFLICT ... DO UPDATE`` clause. Returns the number of rows.
+    """
+    meta = model._meta
+    columns = [meta.get_field(name) for name in fields]
+    adapters = [(i, adapter) for i, adapter in enumerate(map(_adapter, columns)) if adapter]
+    quote = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {quote(meta.db_table)} ({', '.join(quote(field.column) for field in columns)})"
+        f" VALUES ({', '.join(['%s'] * len(columns))}){suffix}"
+    )
+
+    def adapt(row):
+        row = list(row)
+        for i, adapter in adapters:
+            row[i] = adapter(row[i])
+        return row
+
+    rows = list(rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, [adapt(row) for row in rows[start:start + batch_size]])
+    return len(rows)
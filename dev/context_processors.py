@@ -0,0 +1,36 @@
+"""
+Template context processors.
+"""
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.functional import SimpleLazyObject
+
+from . import notifications as notifier
+
+
+def notification_counts(request):
+    """
+    ``notification_counts`` for the navbar badge. Lazy, and read from the
+    counter cache, so rendering the badge normally costs no query.
+    """
+    def load():
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return dict.fromkeys(notifier.COUNTER_FIELDS, 0)
+        return notifier.counts(user.pk)
+
+    return {"notification_counts": SimpleLazyObject(load)}
+
+
+def live_updates(request):
+    """
+    How ``live_events.js`` keeps the page current: the event stream when
+    served over ASGI, otherwise a periodic fetch of the notification
+    counters (under WSGI a stream would hold a worker thread).
+    """
+    return {
+        "live_updates": {
+            "stream": isinstance(request, ASGIRequest),
+            "poll_seconds": getattr(settings, "EVENT_FALLBACK_POLL_SECONDS", 60),
+        }
+    }
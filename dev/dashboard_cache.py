@@ -0,0 +1,115 @@
+"""
+Per-user / per-company cache for the dashboard contexts.
+
+Entries are never deleted directly. Every key embeds a version stamp for
+the user and for the company; the signal handlers in ``dev.signals`` bump
+those stamps when the underlying rows change, so the next read misses and
+rebuilds. Stamps are ``time.time_ns()`` values rather than counters, so an
+evicted stamp can never collide with an older cached entry.
+
+Backend selection lives in ``settings.CACHES[DASHBOARD_CACHE_ALIAS]``
+(local memory by default, file-based when shared between workers).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import database
+
+
+def _cache():
+    return caches[getattr(settings, "DASHBOARD_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "DASHBOARD_CACHE_TIMEOUT", None)
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters, per dashboard kind."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, kind, hit):
+        with self._lock:
+            counts = self._counts.setdefault(kind, {"hits": 0, "misses": 0})
+            counts["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def _version_key(scope, ident):
+    return f"dashboard:v:{scope}:{ident}"
+
+
+def _get_version(scope, ident):
+    cache = _cache()
+    key = _version_key(scope, ident)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_users(user_ids):
+    """Bump the version stamp of every user in ``user_ids``."""
+    user_ids = {str(uid) for uid in user_ids if uid}
+    if user_ids:
+        _cache().set_many({_version_key("user", uid): time.time_ns() for uid in user_ids}, None)
+
+
+def invalidate_companies(company_ids):
+    """Bump the version stamp of every company in ``company_ids``."""
+    company_ids = {str(cid) for cid in company_ids if cid}
+    if company_ids:
+        _cache().set_many({_version_key("company", cid): time.time_ns() for cid in company_ids}, None)
+
+
+def make_key(kind, user_id, company_id, *extra):
+    parts = [
+        "dashboard",
+        kind,
+        str(user_id),
+        str(_get_version("user", user_id)),
+        str(company_id),
+        str(_get_version("company", company_id)),
+    ]
+    parts.extend(str(part) for part in extra)
+    return ":".join(parts)
+
+
+def get_or_build(kind, user_id, company_id, builder, *extra):
+    """
+    Return the cached context for ``kind``, calling ``builder()`` on a miss.
+
+    Querysets in the built context are evaluated when the entry is pickled,
+    so a hit renders without touching the database for those values. Misses
+    are built from the primary even in replica-reading views: a stale
+    replica read would otherwise be cached under the fresh version stamp.
+    """
+    cache = _cache()
+    key = make_key(kind, user_id, company_id, *extra)
+    context = cache.get(key)
+    if context is not None:
+        stats.record(kind, hit=True)
+        return context
+
+    stats.record(kind, hit=False)
+    with database.primary_reads():
+        context = builder()
+        cache.set(key, context, _timeout())
+    return context
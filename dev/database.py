@@ -0,0 +1,282 @@
+"""
+SQLite tuning for production.
+
+Out of the box SQLite runs with a rollback journal, so a writer locks
+every reader out of the file until it commits, and with synchronous=FULL
+and a 2 MB page cache. During a punch storm that serialises the whole
+portal behind the attendance writes.
+
+``configure_connection`` is hooked to ``connection_created`` (see
+``DevConfig.ready``) and applies settings.SQLITE_PRAGMAS to every new
+SQLite connection:
+
+* ``journal_mode=WAL`` - readers see the last committed state while a
+  writer appends to the write-ahead log; only writers queue for the lock.
+* ``synchronous=NORMAL`` - with WAL, commits no longer fsync; a power cut
+  can lose the last transactions but never corrupts the file.
+* ``busy_timeout`` - wait for the write lock instead of failing with
+  "database is locked".
+* ``cache_size`` / ``mmap_size`` / ``temp_store`` - keep hot pages in
+  memory and read the file through the page cache of the OS.
+
+Settings pair this with ``CONN_MAX_AGE`` (connections and their page cache
+survive between requests under WSGI) and ``transaction_mode=IMMEDIATE``
+(an atomic block takes the write lock at BEGIN, where busy_timeout applies,
+instead of failing when a read transaction tries to upgrade).
+
+With SQLITE_READ_CONNECTION set, settings add a ``reader`` alias that
+opens the same file read-only, and ``ReadConnectionRouter`` sends ORM
+reads there while no transaction is open on the default connection, so
+reads never queue behind the writer's connection.
+
+Reporting views can read from a replica instead (``replica`` alias, a
+copy of the primary kept up to date outside Django). Views opt in with
+``@replica_view`` (GET/HEAD only), other code with ``with
+replica_reads():``; ``ReplicaRouter`` sends everything else to the
+primary. A user who has just written is pinned to the primary
+for REPLICA_STICKY_SECONDS (a timestamp in their session, set by
+``ReplicaStickinessMiddleware``), so they always read their own writes
+even while the replica lags. A request that writes reads from the primary
+for the rest of the request too.
+
+``bench.sqlite_contention`` (``manage.py bench_sqlite``) measures
+concurrent writers and readers with the default and tuned pragmas.
+"""
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ALIAS = "reader"
+REPLICA_ALIAS = "replica"
+STICKY_SESSION_KEY = "_db_primary_until"
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,  # KiB, i.e. ~64 MB per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Pragmas that change the database file rather than the connection.
+FILE_PRAGMAS = ("journal_mode",)
+
+
+def pragmas():
+    return getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+
+
+def apply_pragmas(cursor, values, read_only=False):
+    """Run ``PRAGMA name=value`` for each of ``values`` on a DB-API cursor."""
+    for name, value in values.items():
+        if read_only and name in FILE_PRAGMAS:
+            continue
+        cursor.execute(f"PRAGMA {name}={value}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created handler: tune every new SQLite connection."""
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return
+    read_only = "mode=ro" in str(connection.settings_dict["NAME"])
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas(), read_only=read_only)
+
+
+# -----------------------
+# Read connection
+# -----------------------
+class ReadConnectionRouter:
+    """
+    Reads go to the read-only ``reader`` alias, writes to ``default``.
+
+    Inside a transaction on ``default`` reads stay there, so code always
+    sees its own uncommitted writes; committed writes are visible to the
+    reader at once, as both aliases open the same file.
+    """
+
+    def db_for_read(self, model, **hints):
+        if READ_ALIAS not in connections.settings or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READ_ALIAS
+
+
+# -----------------------
+# Read replica
+# -----------------------
+class _RequestState:
+    """Per-request routing state; mutated in place so sync_to_async threads share it."""
+
+    def __init__(self):
+        self.wrote = False
+        self.primary_until = 0.0
+
+
+_request_state = contextvars.ContextVar("db_request_state", default=None)
+_replica_scope = contextvars.ContextVar("db_replica_scope", default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in connections.settings
+
+
+def _sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def _reading_from_replica():
+    if not _replica_scope.get() or not replica_configured():
+        return False
+    state = _request_state.get()
+    if state is not None and (state.wrote or state.primary_until > time.time()):
+        return False
+    return not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def replica_reads():
+    """Let ORM reads inside the block go to the replica (where one is configured)."""
+    token = _replica_scope.set(True)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Undo ``replica_reads`` for the block (e.g. data that is cached or written back)."""
+    token = _replica_scope.set(False)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+def _replica_safe(request):
+    return request.method in ("GET", "HEAD")
+
+
+def replica_view(view_func):
+    """
+    View decorator: GET/HEAD requests read from the replica unless the user
+    wrote within REPLICA_STICKY_SECONDS. The session and user are loaded
+    from the primary first.
+    """
+    if iscoroutinefunction(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if not _replica_safe(request) or not replica_configured():
+                return await view_func(request, *args, **kwargs)
+            await request.auser()
+            _pin_from_session(request, await request.session.aget(STICKY_SESSION_KEY, 0))
+            with replica_reads():
+                return await view_func(request, *args, **kwargs)
+    else:
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _replica_safe(request) or not replica_configured():
+                return view_func(request, *args, **kwargs)
+            request.user.pk  # resolve the lazy user before reads are rerouted
+            _pin_from_session(request, request.session.get(STICKY_SESSION_KEY, 0))
+            with replica_reads():
+                return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _pin_from_session(request, primary_until):
+    state = _request_state.get()
+    if state is not None:
+        state.primary_until = primary_until
+
+
+class ReplicaRouter:
+    """Sends reads inside ``replica_reads`` to the replica; every write, and all else, to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "sessions" or not _reading_from_replica():
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        # Explicit, so instances loaded from the replica are saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Tracks whether a request wrote to the database and, if so, pins the
+    user to the primary for REPLICA_STICKY_SECONDS. Place it after the
+    session and authentication middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote and hasattr(request, "session"):
+            request.session[STICKY_SESSION_KEY] = time.time() + _sticky_seconds()
+        return response
+
+    async def __acall__(self, request):
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote and hasattr(request, "session"):
+            await request.session.aset(STICKY_SESSION_KEY, time.time() + _sticky_seconds())
+        return response
+
+
+def sync_replica(source=DEFAULT_DB_ALIAS, target=REPLICA_ALIAS):
+    """
+    Copy the ``source`` SQLite database into ``target`` with the online
+    backup API, standing in for replication in local setups and tests.
+    Goes through the open connections, so an in-memory test database can
+    be the source.
+    """
+    for alias in (source, target):
+        connections[alias].ensure_connection()
+    connections[source].connection.backup(connections[target].connection)
@@ -0,0 +1,409 @@
+"""
+Fuzzy employee directory search.
+
+Every employee's name, email, employee code, department and designation
+are indexed as padded trigrams (``"ann"`` -> ``__a _an ann nn_``), so
+misspelt and partial input still shares most trigrams with the target:
+
+* SQLite: an FTS5 table of trigram tokens, candidates ranked by bm25.
+  Only the query's rarer trigrams are used to find candidates (``emp``
+  in every employee code would otherwise make bm25 rank the whole
+  directory); document frequencies come from an fts5vocab table.
+* PostgreSQL: the normalized text with a pg_trgm GIN index, candidates
+  ranked by word_similarity().
+
+Candidates are then re-scored in Python by the share of the query's
+trigrams they contain (like pg_trgm's word similarity) and anything below
+MIN_SCORE is dropped. Rows are kept current by the Employee/User/
+Department/Designation signals in ``dev.signals``; bulk loads need
+``manage.py rebuild_employee_search``.
+"""
+import re
+import time
+import unicodedata
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import Employee
+from .search_backends import BackendRegistry
+
+MIN_SCORE = 0.3
+
+# Shorter queries match nearly everyone and are not searched.
+MIN_QUERY_LENGTH = 2
+
+# SQLite candidate lookup: trigrams in more entries than this are skipped
+# (unless too few rarer ones remain), at most MAX_QUERY_GRAMS are used.
+COMMON_GRAM_ENTRIES = 2000
+MIN_QUERY_GRAMS = 3
+MAX_QUERY_GRAMS = 8
+FREQUENCY_TTL = 300
+
+# Fields whose change alters a user's indexed text.
+USER_FIELDS = {"first_name", "last_name", "email", "username"}
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def normalize(text):
+    """Lower-cased, accent-free words of ``text``."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text.lower())
+
+
+def trigrams(text, prefix=False):
+    """
+    Padded trigrams of the words of ``text``. With ``prefix`` the last word
+    is not closed off, so a partly typed word matches longer ones.
+    """
+    grams = set()
+    words = normalize(text)
+    for position, word in enumerate(words):
+        padded = f"__{word}" if prefix and position == len(words) - 1 else f"__{word}_"
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def entry_text(employee):
+    user = employee.user
+    parts = [
+        user.get_full_name(),
+        user.email,
+        employee.employee_code,
+        employee.department.name if employee.department else "",
+        employee.designation.title if employee.designation else "",
+    ]
+    return " ".join(part for part in parts if part)
+
+
+def score(query_grams, text):
+    """Share of the query's trigrams present in ``text`` (0..1)."""
+    if not query_grams:
+        return 0.0
+    return len(query_grams & trigrams(text)) / len(query_grams)
+
+
+# -----------------------
+# Backends
+# -----------------------
+class SQLiteBackend:
+    vendor = "sqlite"
+
+    def create_tables(self, cursor):
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS employee_search_entry ("
+            " id INTEGER PRIMARY KEY,"
+            " employee_id TEXT NOT NULL UNIQUE,"
+            " company_id TEXT NOT NULL)"
+        )
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS employee_search_index USING fts5("
+            " grams, tokenize = \"unicode61 remove_diacritics 0 tokenchars '_'\")"
+        )
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS employee_search_vocab"
+            " USING fts5vocab(employee_search_index, 'row')"
+        )
+
+    def drop_tables(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS employee_search_vocab")
+        cursor.execute("DROP TABLE IF EXISTS employee_search_index")
+        cursor.execute("DROP TABLE IF EXISTS employee_search_entry")
+
+    @staticmethod
+    def key(pk):
+        return pk.hex
+
+    @staticmethod
+    def _rowids(cursor, employee_ids):
+        rowids = {}
+        employee_ids = list(employee_ids)
+        for start in range(0, len(employee_ids), 500):
+            chunk = employee_ids[start:start + 500]
+            cursor.execute(
+                "SELECT employee_id, id FROM employee_search_entry WHERE employee_id IN ({})".format(
+                    ", ".join(["%s"] * len(chunk))
+                ),
+                chunk,
+            )
+            rowids.update(cursor.fetchall())
+        return rowids
+
+    def upsert(self, cursor, rows):
+        """rows: (employee_id, company_id, text) tuples."""
+        if not rows:
+            return
+        cursor.executemany(
+            "INSERT INTO employee_search_entry (employee_id, company_id) VALUES (%s, %s)"
+            " ON CONFLICT (employee_id) DO UPDATE SET company_id = excluded.company_id",
+            [(employee_id, company_id) for employee_id, company_id, _ in rows],
+        )
+        rowids = self._rowids(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            "DELETE FROM employee_search_index WHERE rowid = %s", [(rowid,) for rowid in rowids.values()]
+        )
+        cursor.executemany(
+            "INSERT INTO employee_search_index (rowid, grams) VALUES (%s, %s)",
+            [(rowids[employee_id], " ".join(sorted(trigrams(text)))) for employee_id, _, text in rows],
+        )
+
+    def delete(self, cursor, employee_ids):
+        rowids = [(rowid,) for rowid in self._rowids(cursor, employee_ids).values()]
+        cursor.executemany("DELETE FROM employee_search_index WHERE rowid = %s", rowids)
+        cursor.executemany("DELETE FROM employee_search_entry WHERE id = %s", rowids)
+
+    def clear(self, cursor, company_id):
+        if company_id is None:
+            cursor.execute("DELETE FROM employee_search_index")
+            cursor.execute("DELETE FROM employee_search_entry")
+            return
+        cursor.execute(
+            "DELETE FROM employee_search_index WHERE rowid IN"
+            " (SELECT id FROM employee_search_entry WHERE company_id = %s)",
+            [self.key(company_id)],
+        )
+        cursor.execute("DELETE FROM employee_search_entry WHERE company_id = %s", [self.key(company_id)])
+
+    def analyze(self, cursor):
+        cursor.execute(f"ANALYZE {Employee._meta.db_table}")
+        cursor.execute("ANALYZE employee_search_entry")
+
+    def __init__(self):
+        self._frequencies = {}
+
+    def _entries_with(self, cursor, grams):
+        """Number of entries containing each gram, cached for FREQUENCY_TTL seconds."""
+        now = time.monotonic()
+        cached = {gram: self._frequencies.get(gram) for gram in grams}
+        stale = [gram for gram, hit in cached.items() if hit is None or hit[1] < now]
+        if stale:
+            cursor.execute(
+                "SELECT term, doc FROM employee_search_vocab WHERE term IN ({})".format(", ".join(["%s"] * len(stale))),
+                stale,
+            )
+            found = dict(cursor.fetchall())
+            for gram in stale:
+                cached[gram] = self._frequencies[gram] = (found.get(gram, 0), now + FREQUENCY_TTL)
+        return {gram: hit[0] for gram, hit in cached.items()}
+
+    def _match(self, cursor, expression, company_id, limit, ranked, within=None):
+        sql = (
+            "SELECT e.employee_id FROM employee_search_index"
+            " JOIN employee_search_entry e ON e.id = employee_search_index.rowid"
+            " WHERE employee_search_index MATCH %s AND e.company_id = %s"
+        )
+        params = [expression, self.key(company_id)]
+        if within is not None:
+            sql += f" AND e.employee_id IN ({within[0]})"
+            params.extend(within[1])
+        sql += (" ORDER BY bm25(employee_search_index)" if ranked else "") + " LIMIT %s"
+        cursor.execute(sql, params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+    def candidates(self, cursor, words, query_grams, company_id, limit, within=None):
+        """
+        Entries containing all of the query's trigrams (cheap, unranked);
+        if those are too few, add bm25-ranked entries sharing some of the
+        rarer trigrams, which is what catches typos.
+        """
+        frequencies = self._entries_with(cursor, query_grams)
+        present = sorted((gram for gram in query_grams if frequencies[gram]), key=frequencies.get)
+        if not present:
+            return []
+        ids = []
+        if len(present) == len(query_grams):
+            ids = self._match(cursor, " AND ".join(f'"{gram}"' for gram in present[:MAX_QUERY_GRAMS]), company_id, limit, False, within)
+        if len(ids) < limit:
+            rare = [gram for gram in present if frequencies[gram] <= COMMON_GRAM_ENTRIES]
+            grams = (rare if len(rare) >= MIN_QUERY_GRAMS else present[:MIN_QUERY_GRAMS])[:MAX_QUERY_GRAMS]
+            seen = set(ids)
+            ids.extend(
+                pk for pk in self._match(cursor, " OR ".join(f'"{gram}"' for gram in grams), company_id, limit, True, within)
+                if pk not in seen
+            )
+        return ids[:limit]
+
+
+class PostgresBackend:
+    vendor = "postgresql"
+
+    def create_tables(self, cursor):
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS employee_search ("
+            " employee_id uuid PRIMARY KEY,"
+            " company_id uuid NOT NULL,"
+            " body text NOT NULL)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS employee_search_body ON employee_search USING gin (body gin_trgm_ops)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS employee_search_company ON employee_search (company_id)")
+
+    def drop_tables(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS employee_search")
+
+    @staticmethod
+    def key(pk):
+        return str(pk)
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            "INSERT INTO employee_search (employee_id, company_id, body) VALUES (%s, %s, %s)"
+            " ON CONFLICT (employee_id) DO UPDATE SET company_id = excluded.company_id, body = excluded.body",
+            [(employee_id, company_id, " ".join(normalize(text))) for employee_id, company_id, text in rows],
+        )
+
+    def delete(self, cursor, employee_ids):
+        cursor.execute("DELETE FROM employee_search WHERE employee_id = ANY(%s::uuid[])", [list(employee_ids)])
+
+    def clear(self, cursor, company_id):
+        if company_id is None:
+            cursor.execute("DELETE FROM employee_search")
+        else:
+            cursor.execute("DELETE FROM employee_search WHERE company_id = %s", [self.key(company_id)])
+
+    def analyze(self, cursor):
+        cursor.execute(f"ANALYZE {Employee._meta.db_table}")
+        cursor.execute("ANALYZE employee_search")
+
+    def candidates(self, cursor, words, query_grams, company_id, limit, within=None):
+        text = " ".join(words)
+        sql = "SELECT employee_id FROM employee_search WHERE company_id = %s AND %s <%% body"
+        params = [self.key(company_id), text]
+        if within is not None:
+            sql += f" AND employee_id IN ({within[0]})"
+            params.extend(within[1])
+        cursor.execute(sql + " ORDER BY word_similarity(%s, body) DESC LIMIT %s", params + [text, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+backends = BackendRegistry(SQLiteBackend(), PostgresBackend())
+get_backend = backends.get_backend
+create_tables = backends.create_tables  # post_migrate hook
+recreate_tables = backends.recreate_tables
+
+
+def _connection():
+    return connections[router.db_for_write(Employee)]
+
+
+# -----------------------
+# Indexing
+# -----------------------
+def _indexable():
+    return Employee.all_objects.select_related("user", "department", "designation")
+
+
+def index_employees(employees):
+    """Add or refresh the entries of ``employees``; deleted ones are removed."""
+    employees = list(employees)
+    connection = _connection()
+    backend = get_backend(connection)
+    if backend is None or not employees:
+        return
+    rows = [
+        (backend.key(employee.pk), backend.key(employee.company_id), entry_text(employee))
+        for employee in employees
+        if not employee.is_deleted
+    ]
+    gone = [backend.key(employee.pk) for employee in employees if employee.is_deleted]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        backend.upsert(cursor, rows)
+        if gone:
+            backend.delete(cursor, gone)
+
+
+def reindex(employee_ids):
+    """Re-index employees by id (loading them with their user/department/designation)."""
+    employee_ids = list(employee_ids)
+    if employee_ids:
+        index_employees(_indexable().filter(pk__in=employee_ids))
+
+
+def remove_employees(employee_ids):
+    connection = _connection()
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        backend.delete(cursor, [backend.key(pk) for pk in employee_ids])
+
+
+def rebuild(company_id=None, batch_size=1000):
+    """Re-index all live employees (of one company, or all). Returns the number indexed."""
+    connection = _connection()
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+    employees = _indexable().filter(is_deleted=False).order_by()
+    if company_id is not None:
+        employees = employees.filter(company_id=company_id)
+    indexed, batch = 0, []
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            backend.clear(cursor, company_id)
+        for employee in employees.iterator(chunk_size=batch_size):
+            batch.append(employee)
+            if len(batch) >= batch_size:
+                index_employees(batch)
+                indexed += len(batch)
+                batch = []
+        index_employees(batch)
+        indexed += len(batch)
+    with connection.cursor() as cursor:
+        backend.analyze(cursor)
+    return indexed
+
+
+# -----------------------
+# Querying
+# -----------------------
+def search(queryset, query, company_id, limit=10, candidates=50):
+    """
+    Employees of ``queryset`` best matching ``query``, best first, each
+    with a ``search_score`` attribute (0..1).
+    """
+    words = normalize(query)
+    if sum(len(word) for word in words) < MIN_QUERY_LENGTH:
+        return []
+    query_grams = trigrams(query, prefix=True)
+    connection = _connection()
+    backend = get_backend(connection)
+    if backend is None:
+        employees = list(queryset.filter(_fallback_q(words))[:candidates])
+    else:
+        # Candidates are taken from ``queryset`` only, so its filters don't drop matches after the limit.
+        try:
+            within = queryset.order_by().values("pk").query.get_compiler(connection=connection).as_sql()
+        except EmptyResultSet:
+            return []
+        with connection.cursor() as cursor:
+            ids = backend.candidates(cursor, words, query_grams, company_id, max(candidates, limit), within)
+        ids = [Employee._meta.pk.to_python(pk) for pk in ids]
+        # Keep the backend's order for equal scores.
+        found = queryset.order_by().in_bulk(ids) if ids else {}
+        employees = [found[pk] for pk in ids if pk in found]
+
+    results = []
+    for employee in employees:
+        employee.search_score = score(query_grams, entry_text(employee))
+        if employee.search_score >= MIN_SCORE:
+            results.append(employee)
+    results.sort(key=lambda employee: -employee.search_score)
+    return results[:limit]
+
+
+def _fallback_q(words):
+    condition = Q()
+    for word in words:
+        condition |= (
+            Q(user__first_name__icontains=word)
+            | Q(user__last_name__icontains=word)
+            | Q(user__email__icontains=word)
+            | Q(employee_code__icontains=word)
+        )
+    return condition
@@ -0,0 +1,230 @@
+"""
+Real-time events for connected dashboards.
+
+Publishers call ``publish(user_ids, event, data)``. Once the current
+transaction commits, the event bus fans the event out to every open
+subscription of those users, and ``views.event_stream`` writes it to the
+browser as a server-sent event. Dashboards update in place, or reload
+only when something they show actually changed, instead of polling by
+full page reload.
+
+Under ASGI a stream is a long-lived async generator fed from an asyncio
+queue (events published from worker threads are handed over with
+``call_soon_threadsafe``), with a comment line every ``heartbeat``
+seconds to keep proxies from closing it. Streams are ASGI-only: under
+WSGI an open stream would pin a worker thread, so pages served over WSGI
+never open one (``context_processors.live_updates``) and instead refetch
+``notification_counts`` every ``EVENT_FALLBACK_POLL_SECONDS``.
+
+The bus is pluggable via settings.EVENT_BUS, like the notification
+dispatcher. InProcessBus only reaches clients of the same process (one
+ASGI worker). BrokerBus relays every event through a broker so several
+workers see it; MemoryBroker is the local stand-in for a real broker
+(e.g. Redis PUBLISH/SUBSCRIBE).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    event: str
+    data: dict
+
+    def sse(self):
+        data = json.dumps(self.data, separators=(",", ":"), default=str)
+        return f"id: {self.id}\nevent: {self.event}\ndata: {data}\n\n"
+
+
+# -----------------------
+# Subscriptions
+# -----------------------
+class AsyncSubscription:
+    """One connected client on an event loop; ``deliver`` may be called from any thread."""
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _put(self, event):
+        if self.queue.full():
+            # A slow client loses its oldest events rather than blocking publishers.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # loop already closed; the stream is being torn down
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+# -----------------------
+# Buses
+# -----------------------
+class InProcessBus:
+    """Fans events out to the subscriptions held by this process."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id):
+        subscription = AsyncSubscription(self.queue_size)
+        with self._lock:
+            self._subscriptions[str(user_id)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(str(user_id))
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[str(user_id)]
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, user_ids, event, data):
+        self._deliver(user_ids, event, data)
+
+    def _deliver(self, user_ids, event, data):
+        with self._lock:
+            targets = [s for uid in user_ids for s in self._subscriptions.get(str(uid), ())]
+        if targets:
+            message = Event(next(self._ids), event, data)
+            for subscription in targets:
+                subscription.deliver(message)
+
+
+class MemoryBroker:
+    """Local stand-in for a pub/sub broker: JSON messages go to every listener, synchronously."""
+
+    def __init__(self):
+        self._listeners = []
+        self.published = 0
+
+    def publish(self, channel, message):
+        self.published += 1
+        for listener in list(self._listeners):
+            listener(channel, message)
+
+    def listen(self, callback):
+        self._listeners.append(callback)
+
+
+class BrokerBus(InProcessBus):
+    """Publishes through a broker and delivers whatever the broker relays back to local subscribers."""
+
+    channel = "dev.events"
+
+    def __init__(self, broker=None, queue_size=100):
+        super().__init__(queue_size)
+        self.broker = broker or import_string(getattr(settings, "EVENT_BROKER", "dev.events.MemoryBroker"))()
+        self.broker.listen(self._on_message)
+
+    def publish(self, user_ids, event, data):
+        message = json.dumps({"users": [str(uid) for uid in user_ids], "event": event, "data": data}, default=str)
+        self.broker.publish(self.channel, message)
+
+    def _on_message(self, channel, message):
+        if channel != self.channel:
+            return
+        try:
+            payload = json.loads(message)
+            self._deliver(payload["users"], payload["event"], payload["data"])
+        except (ValueError, KeyError):
+            logger.exception("Dropping malformed event message")
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = import_string(getattr(settings, "EVENT_BUS", "dev.events.InProcessBus"))()
+        return _bus
+
+
+def set_bus(bus):
+    """Swap the bus (e.g. BrokerBus(MemoryBroker()) in tests). Returns the previous one."""
+    global _bus
+    with _bus_lock:
+        previous, _bus = _bus, bus
+    return previous
+
+
+def publish(user_ids, event, data):
+    """Send ``event`` to ``user_ids`` once the current transaction commits."""
+    publish_many([(user_ids, event, data)])
+
+
+def publish_many(messages):
+    """``publish`` for a batch of (user_ids, event, data) messages, with one on-commit hook."""
+    messages = [({str(uid) for uid in user_ids if uid}, event, data) for user_ids, event, data in messages]
+    messages = [message for message in messages if message[0]]
+    if not messages:
+        return
+
+    def send():
+        bus = get_bus()
+        for user_ids, event, data in messages:
+            bus.publish(user_ids, event, data)
+
+    transaction.on_commit(send)
+
+
+# -----------------------
+# Streams
+# -----------------------
+RETRY = "retry: 3000\n\n"
+
+
+async def stream(user_id, hello=None, heartbeat=None, max_seconds=None):
+    """
+    Server-sent events for ``user_id`` (ASGI). ``hello`` is sent first so
+    a reconnecting client resyncs its state; the stream ends after
+    ``max_seconds`` (EVENT_STREAM_MAX_SECONDS) and the browser reconnects.
+    """
+    heartbeat = heartbeat or getattr(settings, "EVENT_STREAM_HEARTBEAT", 15)
+    max_seconds = max_seconds or getattr(settings, "EVENT_STREAM_MAX_SECONDS", 300)
+    bus = get_bus()
+    subscription = bus.subscribe(user_id)
+    try:
+        yield RETRY
+        if hello is not None:
+            yield Event(0, "hello", hello).sse()
+        deadline = time.monotonic() + max_seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            event = await subscription.get(min(heartbeat, remaining))
+            yield event.sse() if event else ": ping\n\n"
+    finally:
+        bus.unsubscribe(user_id, subscription)
@@ -0,0 +1,420 @@
+"""
+Streaming CSV/XLSX exports of employees, attendance and leave requests.
+
+Exports are read with ``values_list(...).iterator(chunk_size=...)``: rows
+arrive from the database cursor in chunks of EXPORT_CHUNK_SIZE tuples, are
+written out, and are dropped. No model instances are built and nothing is
+accumulated, so memory stays flat whether a file has a hundred rows or
+millions. Related columns (company, department, manager, ...) are joined
+in the same query.
+
+* ``csv_chunks`` writes UTF-8 CSV (with a BOM so Excel picks the encoding).
+  Text that a spreadsheet would run as a formula (``=``, ``+``, ``-``,
+  ``@``, tab, CR) is prefixed with ``'``; XLSX cells are typed, so they
+  need no escaping.
+* ``xlsx_chunks`` writes an Office Open XML workbook as it goes. Parts are
+  streamed into a zip written to a non-seekable sink, strings are inline
+  (no shared-strings table to hold in memory), and a new sheet starts
+  every XLSX_MAX_ROWS rows (Excel's limit).
+
+``response()`` wraps either in a StreamingHttpResponse. It is used by the
+HR export view and by the "Export" admin actions. Under ASGI the chunks
+are pulled through ``sync_to_async`` one at a time, because Django would
+otherwise buffer a synchronous iterator whole.
+"""
+import codecs
+import csv
+import functools
+import re
+import zipfile
+from collections import namedtuple
+from datetime import date, datetime, time
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Attendance, Employee, LeaveRequest
+
+Column = namedtuple("Column", ["header", "lookup", "convert"], defaults=[None])
+Dataset = namedtuple("Dataset", ["title", "model", "columns", "company_field", "date_field", "ordering"])
+
+CHUNK_BYTES = 64 * 1024
+XLSX_MAX_ROWS = 1048576  # including the header row
+
+
+def _local(value, tz=None):
+    """Aware datetimes as naive local time, to the second (spreadsheets have no time zones)."""
+    if value is None:
+        return None
+    return value.astimezone(tz or timezone.get_current_timezone()).replace(tzinfo=None, microsecond=0)
+
+
+def _hours(seconds):
+    return round(seconds / 3600, 2) if seconds is not None else None
+
+
+DATASETS = {
+    "employees": Dataset(
+        "Employees",
+        Employee,
+        [
+            Column("Employee code", "employee_code"),
+            Column("Username", "user__username"),
+            Column("First name", "user__first_name"),
+            Column("Last name", "user__last_name"),
+            Column("Email", "user__email"),
+            Column("Company", "company__name"),
+            Column("Department", "department__name"),
+            Column("Designation", "designation__title"),
+            Column("Manager", "manager__username"),
+            Column("Joined", "date_of_joining"),
+            Column("Left", "date_of_leaving"),
+            Column("Active", "is_active_employee"),
+            Column("ID", "id", str),
+        ],
+        company_field="company_id",
+        date_field="date_of_joining",
+        ordering=("employee_code",),
+    ),
+    "attendance": Dataset(
+        "Attendance",
+        Attendance,
+        [
+            Column("Date", "date"),
+            Column("Employee code", "employee__employee_code"),
+            Column("Username", "employee__user__username"),
+            Column("First name", "employee__user__first_name"),
+            Column("Last name", "employee__user__last_name"),
+            Column("Company", "employee__company__name"),
+            Column("Login", "login_time", _local),
+            Column("Logout", "logout_time", _local),
+            Column("Hours", "total_work_seconds", _hours),
+            Column("Notes", "notes"),
+        ],
+        company_field="employee__company_id",
+        date_field="date",
+        ordering=("date",),
+    ),
+    "leaves": Dataset(
+        "Leave requests",
+        LeaveRequest,
+        [
+            Column("Employee code", "employee__employee_code"),
+            Column("Username", "employee__user__username"),
+            Column("First name", "employee__user__first_name"),
+            Column("Last name", "employee__user__last_name"),
+            Column("Leave type", "leave_type__name"),
+            Column("From", "start_date"),
+            Column("To", "end_date"),
+            Column("Days", "days"),
+            Column("Status", "status"),
+            Column("Approver", "approver__username"),
+            Column("Reason", "reason"),
+            Column("Requested", "created_at", _local),
+        ],
+        company_field="employee__company_id",
+        date_field="start_date",
+        ordering=("start_date",),
+    ),
+}
+
+
+def _chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+# -----------------------
+# Rows
+# -----------------------
+def queryset(name, company_id=None, start=None, end=None):
+    """Live rows of dataset ``name``, optionally for one company and a date range (inclusive)."""
+    dataset = DATASETS[name]
+    rows = dataset.model.objects.order_by(*dataset.ordering)
+    if company_id is not None:
+        rows = rows.filter(**{dataset.company_field: company_id})
+    if start is not None:
+        rows = rows.filter(**{f"{dataset.date_field}__gte": start})
+    if end is not None:
+        rows = rows.filter(**{f"{dataset.date_field}__lte": end})
+    return rows
+
+
+def rows(name, queryset):
+    """Converted value tuples for ``queryset``, fetched in chunks without building model instances."""
+    columns = DATASETS[name].columns
+    # Looking the time zone up per value costs as much as the query itself.
+    tz = timezone.get_current_timezone()
+    converters = [
+        (i, functools.partial(_local, tz=tz) if column.convert is _local else column.convert)
+        for i, column in enumerate(columns)
+        if column.convert
+    ]
+    values = queryset.values_list(*(column.lookup for column in columns)).iterator(chunk_size=_chunk_size())
+    if not converters:
+        yield from values
+        return
+    for row in values:
+        row = list(row)
+        for i, convert in converters:
+            row[i] = convert(row[i])
+        yield row
+
+
+# -----------------------
+# CSV
+# -----------------------
+class _Buffer:
+    """Write-only file object; ``drain()`` returns (and forgets) what was written so far."""
+
+    def __init__(self, empty=b""):
+        self._empty = empty
+        self._parts = []
+        self.size = 0
+
+    def write(self, data):
+        self._parts.append(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self._empty.join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        return data
+
+
+# Text starting with one of these is evaluated as a formula by Excel/Sheets/LibreOffice.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_text(value):
+    """Neutralise formula injection: text a spreadsheet would evaluate is prefixed with ``'``."""
+    if value.__class__ is str and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(name, values):
+    buffer = _Buffer(empty="")
+    writer = csv.writer(buffer)
+    buffer.write(codecs.BOM_UTF8.decode())
+    writer.writerow([column.header for column in DATASETS[name].columns])
+    for row in values:
+        writer.writerow(map(_csv_text, row))
+        if buffer.size >= CHUNK_BYTES:
+            yield buffer.drain().encode()
+    yield buffer.drain().encode()
+
+
+# -----------------------
+# XLSX
+# -----------------------
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_CT_SHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+# Style ids in _STYLES' cellXfs.
+_DATE, _DATETIME, _HEADER = 1, 2, 3
+_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><styleSheet {_NS}>'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+_SHEET_HEAD = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet {_NS}>'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    "</sheetView></sheetViews><sheetData>"
+)
+_SHEET_TAIL = "</sheetData></worksheet>"
+_EPOCH = datetime(1899, 12, 30)
+_EPOCH_DATE = _EPOCH.date()
+# Characters XML 1.0 cannot carry at all.
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f￾￿]")
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _text_cell(ref, value, style=""):
+    return f'<c r="{ref}" t="inlineStr"{style}><is><t xml:space="preserve">{escape(_ILLEGAL_XML.sub("", value))}</t></is></c>'
+
+
+def _number_cell(ref, value):
+    return f'<c r="{ref}"><v>{value}</v></c>'
+
+
+def _bool_cell(ref, value):
+    return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+
+
+def _date_cell(ref, value):
+    return f'<c r="{ref}" s="{_DATE}"><v>{(value - _EPOCH_DATE).days}</v></c>'
+
+
+def _datetime_cell(ref, value):
+    serial = (value - _EPOCH).total_seconds() / 86400
+    return f'<c r="{ref}" s="{_DATETIME}"><v>{serial:.6f}</v></c>'
+
+
+# Looked up by exact type: an isinstance() chain per cell is the bulk of the cost on large sheets.
+_CELL_WRITERS = {
+    str: _text_cell,
+    int: _number_cell,
+    float: _number_cell,
+    Decimal: _number_cell,
+    bool: _bool_cell,
+    date: _date_cell,
+    datetime: _datetime_cell,
+}
+
+
+def _cell(ref, value):
+    if value is None:
+        return ""
+    writer = _CELL_WRITERS.get(type(value))
+    if writer is None:
+        if isinstance(value, datetime):
+            return _datetime_cell(ref, timezone.make_naive(value) if timezone.is_aware(value) else value)
+        elif isinstance(value, date):
+            writer = _date_cell
+        else:
+            return _text_cell(ref, value.isoformat() if isinstance(value, time) else str(value))
+    return writer(ref, value)
+
+
+def _row(number, letters, values):
+    cells = "".join([_cell(f"{letter}{number}", value) for letter, value in zip(letters, values)])
+    return f'<row r="{number}">{cells}</row>'
+
+
+def _header_row(letters, headers):
+    cells = "".join([_text_cell(f"{letter}1", header, f' s="{_HEADER}"') for letter, header in zip(letters, headers)])
+    return f'<row r="1">{cells}</row>'
+
+
+def _workbook_parts(title, sheets):
+    names = [title[:31]] if sheets == 1 else [f"{title[:24]} ({i})" for i in range(1, sheets + 1)]
+    sheet_entries = "".join(
+        f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(names, 1)
+    )
+    sheet_rels = "".join(
+        f'<Relationship Id="rId{i}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, sheets + 1)
+    )
+    sheet_types = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{_CT_SHEET}"/>' for i in range(1, sheets + 1)
+    )
+    header = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    return {
+        "xl/workbook.xml": f'{header}<workbook {_NS} xmlns:r="{_REL_NS}"><sheets>{sheet_entries}</sheets></workbook>',
+        "xl/_rels/workbook.xml.rels": (
+            f'{header}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}<Relationship Id="rId{sheets + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/styles.xml": _STYLES,
+        "_rels/.rels": (
+            f'{header}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>"
+        ),
+        "[Content_Types].xml": (
+            f'{header}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f"{sheet_types}</Types>"
+        ),
+    }
+
+
+def xlsx_chunks(name, values, max_rows=XLSX_MAX_ROWS):
+    dataset = DATASETS[name]
+    headers = [column.header for column in dataset.columns]
+    letters = [_column_letter(i) for i in range(len(headers))]
+    values = iter(values)
+    end = object()
+    pending = next(values, end)
+
+    sink = _Buffer()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        sheets = 0
+        while sheets == 0 or pending is not end:
+            sheets += 1
+            with archive.open(f"xl/worksheets/sheet{sheets}.xml", "w", force_zip64=True) as part:
+                batch = [_SHEET_HEAD, _header_row(letters, headers)]
+                for number in range(2, max_rows + 1):
+                    if pending is end:
+                        break
+                    batch.append(_row(number, letters, pending))
+                    pending = next(values, end)
+                    if len(batch) >= 500:
+                        part.write("".join(batch).encode())
+                        batch.clear()
+                        if sink.size >= CHUNK_BYTES:
+                            yield sink.drain()
+                batch.append(_SHEET_TAIL)
+                part.write("".join(batch).encode())
+            yield sink.drain()
+        for part_name, content in _workbook_parts(dataset.title, sheets).items():
+            archive.writestr(part_name, content)
+    yield sink.drain()
+
+
+# -----------------------
+# Responses
+# -----------------------
+FORMATS = {
+    "csv": (csv_chunks, "text/csv; charset=utf-8"),
+    "xlsx": (xlsx_chunks, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+async def _aiterate(chunks):
+    """Async view of ``chunks``; each one is produced in the thread that owns the DB connection."""
+    end = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await pull(chunks, end)) is not end:
+        yield chunk
+
+
+def response(name, queryset, fmt, asynchronous=False):
+    """A streaming download of ``queryset`` (of dataset ``name``) as ``fmt`` ("csv" or "xlsx")."""
+    writer, content_type = FORMATS[fmt]
+    # The body is read after the view returns, outside @replica_view's scope: pin the database now.
+    queryset = queryset.using(queryset.db)
+    chunks = writer(name, rows(name, queryset))
+    response = StreamingHttpResponse(_aiterate(chunks) if asynchronous else chunks, content_type=content_type)
+    filename = f"{name}-{timezone.localdate().isoformat()}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
@@ -0,0 +1,102 @@
+"""
+Versioned cache for template fragments (``{% fragment %}`` in
+``dev/templatetags/fragment_cache.py``).
+
+Blocks such as the sidebar, the user menu and the dashboard's announcement
+card render the same HTML for every request of a user, a role or a
+company. Wrapping them in ``{% fragment %}`` renders them once and stores
+the HTML under a key made of:
+
+* the fragment name and that fragment's own version stamp,
+* the version stamps of the user and/or company the fragment is scoped to
+  (``user=...`` / ``company=...`` in the tag),
+* a hash of the remaining tag arguments (role, path, badge values, ...).
+
+As in ``dashboard_cache``, entries are never deleted: the handlers in
+``dev.signals`` bump the stamps when the rows a fragment shows are saved,
+so the next render misses. Entries also expire after
+FRAGMENT_CACHE_TIMEOUT, which bounds how stale relative times
+("5 minutes ago") can get.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[getattr(settings, "FRAGMENT_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 300)
+
+
+def _version_key(scope, ident):
+    return f"fragment:v:{scope}:{ident}"
+
+
+def _versions(keys):
+    """Current stamps for ``keys``, creating missing ones (one round trip when all exist)."""
+    cache = _cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_fragment(name):
+    """Bump the stamp of fragment ``name`` for every user and company."""
+    _cache().set(_version_key("name", name), time.time_ns(), None)
+
+
+def invalidate_users(user_ids):
+    """Bump the stamp of every user in ``user_ids`` (all of their user-scoped fragments)."""
+    user_ids = {str(uid) for uid in user_ids if uid}
+    if user_ids:
+        _cache().set_many({_version_key("user", uid): time.time_ns() for uid in user_ids}, None)
+
+
+def invalidate_companies(company_ids):
+    """Bump the stamp of every company in ``company_ids`` (all of their company-scoped fragments)."""
+    company_ids = {str(cid) for cid in company_ids if cid}
+    if company_ids:
+        _cache().set_many({_version_key("company", cid): time.time_ns() for cid in company_ids}, None)
+
+
+def invalidator(name, user=None, company=None):
+    """A callable making the next render of this fragment miss (e.g. an ``images.ensure`` on_done)."""
+    if user is not None:
+        return functools.partial(invalidate_users, {user})
+    if company is not None:
+        return functools.partial(invalidate_companies, {company})
+    return functools.partial(invalidate_fragment, name)
+
+
+def make_key(name, vary_on=(), user=None, company=None):
+    version_keys = [_version_key("name", name)]
+    if user is not None:
+        version_keys.append(_version_key("user", user))
+    if company is not None:
+        version_keys.append(_version_key("company", company))
+    versions = _versions(version_keys)
+
+    vary = hashlib.md5(usedforsecurity=False)
+    for value in (user, company, *vary_on):
+        vary.update(str(value).encode())
+        vary.update(b":")
+    return f"fragment:{name}:{':'.join(str(v) for v in versions)}:{vary.hexdigest()}"
+
+
+def get_or_render(key, render):
+    """The cached HTML for ``key``, calling ``render()`` and storing its result on a miss."""
+    cache = _cache()
+    html = cache.get(key)
+    if html is None:
+        html = str(render())
+        cache.set(key, html, _timeout())
+    return html
@@ -0,0 +1,167 @@
+"""
+Materialised reporting hierarchy.
+
+Employee.manager only links each person to their direct manager, so
+finding everyone under a director means one query per level. The
+ReportingLine closure table stores every (ancestor, descendant, depth)
+pair instead, with a depth-0 row per person, so "all transitive reports",
+"reports down to depth N" and per-manager headcounts are single indexed
+queries.
+
+Nodes are users, as Employee.manager points at a User. The signal
+handlers in ``dev.signals`` keep the table in step: a changed manager
+moves the employee's whole subtree (``move``), and deleting an employee
+or user detaches the affected subtrees. Changes that would make someone
+report to themselves are rejected with ``would_cycle``. Bulk loads bypass
+signals; run ``manage.py rebuild_org_hierarchy`` (``rebuild``) after them.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Employee, ReportingLine
+
+
+def _batched(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+# -----------------------
+# Maintenance
+# -----------------------
+def ensure_nodes(user_ids):
+    """Create the depth-0 row of each user that does not have one yet."""
+    user_ids = {uid for uid in user_ids if uid}
+    if user_ids:
+        ReportingLine.objects.bulk_create(
+            [ReportingLine(ancestor_id=uid, descendant_id=uid, depth=0) for uid in user_ids],
+            ignore_conflicts=True,
+        )
+
+
+def would_cycle(user_id, manager_id):
+    """True if making ``manager_id`` the manager of ``user_id`` would create a loop."""
+    if not manager_id:
+        return False
+    return manager_id == user_id or ReportingLine.objects.filter(
+        ancestor_id=user_id, descendant_id=manager_id
+    ).exists()
+
+
+def move(user_id, manager_id, batch_size=1000):
+    """
+    Re-parent ``user_id`` (and everyone under them) below ``manager_id``,
+    or make them a root when it is None. Returns the ids of the users
+    whose set of reports changed.
+    """
+    with transaction.atomic():
+        if manager_id:
+            # Only when linking: a detach may run while the user is being deleted.
+            ensure_nodes([user_id, manager_id])
+        subtree = ReportingLine.objects.filter(ancestor_id=user_id).values("descendant_id")
+        old_ancestors = set(
+            ReportingLine.objects.filter(descendant_id=user_id, depth__gt=0).values_list("ancestor_id", flat=True)
+        )
+        ReportingLine.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+
+        new_ancestors = []
+        if manager_id:
+            below = list(ReportingLine.objects.filter(ancestor_id=user_id).values_list("descendant_id", "depth"))
+            new_ancestors = list(ReportingLine.objects.filter(descendant_id=manager_id).values_list("ancestor_id", "depth"))
+            rows = [
+                ReportingLine(ancestor_id=ancestor, descendant_id=descendant, depth=up + down + 1)
+                for ancestor, up in new_ancestors
+                for descendant, down in below
+            ]
+            for batch in _batched(rows, batch_size):
+                ReportingLine.objects.bulk_create(batch)
+    return old_ancestors | {ancestor for ancestor, _ in new_ancestors}
+
+
+def rebuild(batch_size=5000):
+    """Recompute the whole table from Employee.manager. Returns the number of rows written."""
+    parents = dict(Employee.all_objects.values_list("user_id", "manager_id"))
+    nodes = set(parents) | {manager for manager in parents.values() if manager}
+
+    chains = {}
+
+    def chain(user_id):
+        """[(ancestor, depth), ...] from user_id upwards, stopping at roots and loops."""
+        if user_id in chains:
+            return chains[user_id]
+        path, seen, node = [], set(), user_id
+        while node and node not in seen and node not in chains:
+            seen.add(node)
+            path.append(node)
+            node = parents.get(node)
+        tail = chains.get(node, [])
+        # Walk back down, so each node's chain is its own id then its parent's chain.
+        for current in reversed(path):
+            tail = [(current, 0)] + [(ancestor, depth + 1) for ancestor, depth in tail]
+            chains[current] = tail
+        return chains[user_id]
+
+    rows = [
+        ReportingLine(ancestor_id=ancestor, descendant_id=user_id, depth=depth)
+        for user_id in nodes
+        for ancestor, depth in chain(user_id)
+    ]
+    with transaction.atomic():
+        ReportingLine.objects.all().delete()
+        for batch in _batched(rows, batch_size):
+            ReportingLine.objects.bulk_create(batch)
+    return len(rows)
+
+
+# -----------------------
+# Queries
+# -----------------------
+def report_lines(user, max_depth=None, include_self=False):
+    """ReportingLine rows below ``user``, down to ``max_depth`` levels if given."""
+    lines = ReportingLine.objects.filter(ancestor=user, depth__gte=0 if include_self else 1)
+    if max_depth is not None:
+        lines = lines.filter(depth__lte=max_depth)
+    return lines
+
+
+def reports(user, max_depth=None, include_self=False):
+    """Employees reporting to ``user`` directly or indirectly (one query, via the closure table)."""
+    return Employee.objects.filter(
+        user__in=report_lines(user, max_depth, include_self).values("descendant_id")
+    )
+
+
+def ancestor_ids(user_ids):
+    """Ids of every manager above any of ``user_ids``."""
+    user_ids = {uid for uid in user_ids if uid}
+    if not user_ids:
+        return set()
+    return set(
+        ReportingLine.objects.filter(descendant_id__in=user_ids, depth__gt=0).values_list("ancestor_id", flat=True)
+    )
+
+
+def subtree_counts(user_ids, max_depth=None):
+    """{user_id: number of active employees below them} for ``user_ids`` (ids or a values() subquery)."""
+    lines = ReportingLine.objects.filter(
+        ancestor_id__in=user_ids,
+        depth__gt=0,
+        descendant__employee_profile__is_active_employee=True,
+        descendant__employee_profile__is_deleted=False,
+    )
+    if max_depth is not None:
+        lines = lines.filter(depth__lte=max_depth)
+    rows = lines.values("ancestor_id").annotate(n=Count("pk")).order_by()
+    return {row["ancestor_id"]: row["n"] for row in rows}
+
+
+def level_counts(user, max_depth=None):
+    """{depth: number of active employees at that depth below ``user``}."""
+    rows = (
+        report_lines(user, max_depth)
+        .filter(descendant__employee_profile__is_active_employee=True, descendant__employee_profile__is_deleted=False)
+        .values("depth")
+        .annotate(n=Count("pk"))
+        .order_by("depth")
+    )
+    return {row["depth"]: row["n"] for row in rows}
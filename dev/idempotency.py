@@ -0,0 +1,77 @@
+"""
+Idempotency keys for the JSON write APIs.
+
+A client that may retry a POST (flaky network, impatient double click)
+sends an ``Idempotency-Key`` header. The first response for a given
+(user, view, key) is stored in the cache for IDEMPOTENCY_TTL seconds and
+returned as-is for every repeat, marked with ``Idempotent-Replayed: true``.
+A repeat that arrives while the first request is still running gets 409
+instead of running twice. Requests without the header are unaffected.
+
+Keys live in ``caches[IDEMPOTENCY_CACHE_ALIAS]``. The local-memory default
+only covers one worker; point it at a shared backend when running several,
+as for the dashboard cache.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+IN_FLIGHT = "in-flight"
+# How long a crashed request can block its key.
+IN_FLIGHT_TTL = 60
+
+
+def _cache():
+    return caches[getattr(settings, "IDEMPOTENCY_CACHE_ALIAS", "default")]
+
+
+def _ttl():
+    return getattr(settings, "IDEMPOTENCY_TTL", 24 * 60 * 60)
+
+
+def _cache_key(user_id, view_name, key):
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return f"idempotency:{view_name}:{user_id}:{digest}"
+
+
+def idempotent(view_func):
+    """Replay the stored response of an async view for repeated Idempotency-Key values."""
+    view_name = f"{view_func.__module__}.{view_func.__qualname__}"
+
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return await view_func(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({"success": False, "error": f"{HEADER} is too long"}, status=400)
+
+        user = await request.auser()
+        cache, cache_key = _cache(), _cache_key(user.pk, view_name, key)
+        if not await cache.aadd(cache_key, IN_FLIGHT, IN_FLIGHT_TTL):
+            stored = await cache.aget(cache_key)
+            if stored is None or stored == IN_FLIGHT:
+                return JsonResponse({"success": False, "error": "A request with this key is in progress"}, status=409)
+            status, content_type, content = stored
+            response = HttpResponse(content, status=status, content_type=content_type)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = await view_func(request, *args, **kwargs)
+        except BaseException:
+            await cache.adelete(cache_key)
+            raise
+        if response.status_code >= 500 or response.streaming:
+            # Not a final answer; let the client retry for real.
+            await cache.adelete(cache_key)
+        else:
+            await cache.aset(cache_key, (response.status_code, response["Content-Type"], response.content), _ttl())
+        return response
+
+    return wrapper
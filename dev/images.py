@@ -0,0 +1,304 @@
+"""
+Responsive image derivatives.
+
+Uploaded avatars, logos and covers are shown at a fraction of their upload
+size. For every uploaded image a background worker writes WebP and JPEG
+copies at the widths configured for its kind (settings.IMAGE_DERIVATIVES).
+They go to ``derivatives/`` in the media storage, with a
+``<name>.variants.json`` index next to them. That directory is the disk
+cache: a source that already has an index is never decoded again, and
+new uploads get new file names.
+
+* The ``dev.signals`` handlers call ``ensure()`` when a User or Company is
+  saved with an image. The job is queued once the transaction commits.
+* The ``{% picture %}`` / ``{% srcset %}`` tags (``dev/templatetags/images.py``)
+  read the index (cached in ``caches[IMAGE_CACHE_ALIAS]``). They render a
+  ``<picture>`` with WebP and JPEG srcsets, or the original image while the
+  derivatives are still being made.
+* A missing index is cached too, for IMAGE_INDEX_MISSING_TIMEOUT, so pages
+  showing an image without derivatives don't hit the storage every time.
+  An image whose job failed is recorded as such for
+  IMAGE_DERIVATIVE_RETRY_AFTER and not queued again until then.
+* ``manage.py build_image_derivatives`` backfills existing uploads and
+  reports the bytes saved.
+* ``AssetStorage`` (``dev.assets``) runs the same pipeline at build time
+  for static images under IMAGE_DERIVATIVE_STATIC_PREFIXES. Their
+  derivatives are hashed like every other static file.
+
+Workers (settings.IMAGE_DERIVATIVE_WORKER), as for notifications: ``"thread"``
+resizes in a background thread, ``"sync"`` in the calling thread.
+"""
+import atexit
+import io
+import json
+import logging
+import os
+import queue
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "derivatives/"
+RASTER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff")
+FORMATS = {"webp": ("WEBP", "webp", "image/webp"), "jpeg": ("JPEG", "jpg", "image/jpeg")}
+
+DEFAULT_WIDTHS = {
+    "avatar": [48, 96, 160, 320],
+    "logo": [128, 256, 512],
+    "cover": [640, 1280, 1920],
+    "static": [480, 960, 1600],
+}
+
+Job = namedtuple("Job", ["name", "kind", "on_done"])
+
+
+def widths(kind):
+    return getattr(settings, "IMAGE_DERIVATIVES", DEFAULT_WIDTHS)[kind]
+
+
+def formats():
+    return getattr(settings, "IMAGE_DERIVATIVE_FORMATS", ["webp", "jpeg"])
+
+
+def _quality(fmt):
+    return getattr(settings, "IMAGE_DERIVATIVE_QUALITY", {}).get(fmt, 80)
+
+
+def _cache():
+    return caches[getattr(settings, "IMAGE_CACHE_ALIAS", "default")]
+
+
+def is_raster(name):
+    return bool(name) and name.lower().endswith(RASTER_EXTENSIONS)
+
+
+def variant_name(name, width, fmt, prefix=MEDIA_PREFIX):
+    return f"{prefix}{os.path.splitext(name)[0]}-{width}w.{FORMATS[fmt][1]}"
+
+
+def index_name(name, prefix=MEDIA_PREFIX):
+    return f"{prefix}{os.path.splitext(name)[0]}.variants.json"
+
+
+def content_type(fmt):
+    return FORMATS[fmt][2]
+
+
+# -----------------------
+# Generating
+# -----------------------
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+
+def encode(image, width, fmt):
+    """``image`` (RGB or RGBA) scaled to ``width`` pixels wide, encoded as ``fmt``."""
+    if width != image.width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    if fmt == "jpeg" and image.mode != "RGB":
+        flattened = Image.new("RGB", image.size, (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel("A"))
+        image = flattened
+    options = {"quality": _quality(fmt)}
+    if fmt == "jpeg":
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=6)
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[fmt][0], **options)
+    return buffer.getvalue()
+
+
+def _replace(storage, name, data):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def generate(name, kind, source=None, target=None, prefix=MEDIA_PREFIX, force=False, source_name=None):
+    """
+    Write the derivatives of image ``name`` (read from ``source``, as
+    ``source_name`` if it is stored under another name there) and their
+    index to ``target``. Both storages default to the media storage.
+    Returns the index entry. An existing index is returned as is unless
+    ``force``.
+    """
+    source = source or default_storage
+    target = target or source
+    index = index_name(name, prefix)
+    if not force and target.exists(index):
+        return _load_index(target, index)
+
+    with source.open(source_name or name) as handle:
+        image = Image.open(handle)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+
+    # Never upscale: widths past the source collapse into one full-width copy.
+    sizes = sorted({min(width, image.width) for width in widths(kind)})
+    variants = [
+        {"width": width, "format": fmt, "name": None, "bytes": 0}
+        for fmt in formats()
+        for width in sizes
+    ]
+    for variant in variants:
+        data = encode(image, variant["width"], variant["format"])
+        variant["name"] = _replace(target, variant_name(name, variant["width"], variant["format"], prefix), data)
+        variant["bytes"] = len(data)
+
+    entry = {"source": name, "width": image.width, "height": image.height, "variants": variants}
+    _replace(target, index, json.dumps(entry).encode())
+    _cache().set(_index_key(target, index), entry, None)
+    return entry
+
+
+# -----------------------
+# Lookup
+# -----------------------
+def _index_key(storage, index):
+    return f"images:variants:{getattr(storage, 'location', '')}:{index}"
+
+
+def _load_index(storage, index):
+    with storage.open(index) as handle:
+        return json.load(handle)
+
+
+# Cached in place of an index entry: no index yet, or the last job failed.
+MISSING = "missing"
+FAILED = "failed"
+
+
+def _cached_entry(name, storage=None, prefix=MEDIA_PREFIX):
+    """The index entry for image ``name``, or MISSING / FAILED."""
+    storage = storage or default_storage
+    index = index_name(name, prefix)
+    cache = _cache()
+    key = _index_key(storage, index)
+    entry = cache.get(key)
+    if entry is None:
+        try:
+            entry = _load_index(storage, index)
+        except (OSError, ValueError):
+            # add(), not set(): a job finishing meanwhile has already cached the real entry.
+            cache.add(key, MISSING, getattr(settings, "IMAGE_INDEX_MISSING_TIMEOUT", 60))
+            return MISSING
+        cache.set(key, entry, None)
+    return entry
+
+
+def variants(name, storage=None, prefix=MEDIA_PREFIX):
+    """The index entry for image ``name`` (see ``generate``), or None while it has no derivatives."""
+    entry = _cached_entry(name, storage, prefix)
+    return None if entry in (MISSING, FAILED) else entry
+
+
+def ensure(name, kind, on_done=None):
+    """Queue derivatives for uploaded image ``name`` unless it has them already or its last job failed."""
+    if is_raster(name) and _cached_entry(name) == MISSING:
+        transaction.on_commit(lambda: get_worker().submit(Job(name, kind, on_done)))
+
+
+def process(job):
+    try:
+        generate(job.name, job.kind)
+    except Exception:
+        logger.exception("Failed to build derivatives of %s", job.name)
+        _cache().set(
+            _index_key(default_storage, index_name(job.name)),
+            FAILED,
+            getattr(settings, "IMAGE_DERIVATIVE_RETRY_AFTER", 3600),
+        )
+        return
+    if job.on_done is not None:
+        job.on_done()
+
+
+# -----------------------
+# Workers
+# -----------------------
+class SyncWorker:
+    """Resizes in the calling thread."""
+
+    def submit(self, job):
+        process(job)
+
+    def flush(self, timeout=None):
+        return True
+
+
+class ThreadedWorker:
+    """Background thread that resizes queued images one at a time, skipping duplicates."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._thread = None
+
+    def submit(self, job):
+        with self._lock:
+            if job.name in self._pending:
+                return
+            self._pending.add(job.name)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="image-derivatives", daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is processed (or ``timeout`` passes)."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            try:
+                process(item)
+            finally:
+                with self._lock:
+                    self._pending.discard(item.name)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            if getattr(settings, "IMAGE_DERIVATIVE_WORKER", "thread") == "sync":
+                _worker = SyncWorker()
+            else:
+                _worker = ThreadedWorker()
+        return _worker
+
+
+def set_worker(worker):
+    """Swap the worker (e.g. SyncWorker() in tests). Returns the previous one."""
+    global _worker
+    with _worker_lock:
+        previous, _worker = _worker, worker
+    return previous
+
+
+@atexit.register
+def _flush_on_exit():
+    if _worker is not None:
+        _worker.flush(timeout=10)
@@ -0,0 +1,288 @@
+"""
+Per-view SQL query and latency instrumentation.
+
+Every connection gets an ``execute_wrapper`` when it is created
+(``install``, hooked to ``connection_created`` in ``DevConfig.ready``);
+QueryInstrumentationMiddleware points it at a collector for the duration
+of each request. The collector lives in a context variable, so the ORM
+calls async views make in ``sync_to_async`` threads are counted too. It
+counts queries, adds up SQL time and spots repeated statements (the same SQL run again and again with
+different parameters is the usual N+1 signature). Each request becomes
+one sample filed under its URL name in a rolling in-memory window
+(``QUERY_STATS_WINDOW`` samples per view), summarised as percentiles and
+a latency histogram by ``stats.snapshot()`` and served to staff at
+``api/metrics/queries/``. Set ``QUERY_STATS_LOG`` to a path to also
+append every sample there as one JSON line.
+
+Views can declare a budget with ``@query_budget(queries=..., ...)``, for
+GET and HEAD requests unless ``methods`` says otherwise. A request over
+budget logs a warning, or raises QueryBudgetExceeded when
+``QUERY_BUDGET_STRICT`` is on (the default under ``manage.py test``), so
+the test suite fails on a regression.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# -----------------------
+# Collection
+# -----------------------
+class QueryCollector:
+    """``execute_wrapper`` callable recording every statement run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+            if not many:
+                self.executions[(sql, repr(params))] += 1
+
+    @property
+    def repeated(self):
+        """Queries beyond the first run of each distinct SQL statement (N+1 candidates)."""
+        return self.count - len(self.statements)
+
+    @property
+    def duplicates(self):
+        """Queries that exactly repeat an earlier statement and its parameters."""
+        return sum(n - 1 for n in self.executions.values())
+
+    def worst_statement(self):
+        if not self.statements:
+            return None, 0
+        sql, n = self.statements.most_common(1)[0]
+        return sql[:300], n
+
+
+_collector = contextvars.ContextVar("query_collector", default=None)
+
+
+def _collect(execute, sql, params, many, context):
+    collector = _collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector(execute, sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created handler: route the connection's queries to the current request's collector."""
+    if _collect not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_collect)
+
+
+def query_budget(queries=None, repeated=None, duplicates=None, sql_ms=None, methods=("GET", "HEAD")):
+    """Declare per-request limits for a view's ``methods``; checked by the middleware."""
+    budget = {
+        name: limit
+        for name, limit in (("queries", queries), ("repeated", repeated), ("duplicates", duplicates), ("sql_ms", sql_ms))
+        if limit is not None
+    }
+
+    def decorator(view_func):
+        view_func.query_budget = budget
+        view_func.query_budget_methods = frozenset(methods)
+        return view_func
+
+    return decorator
+
+
+# -----------------------
+# Rolling statistics
+# -----------------------
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ViewStats:
+    """Thread-safe rolling window of request samples, per URL name."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._requests = Counter()
+        self._over_budget = Counter()
+
+    def record(self, sample):
+        name = sample["view"]
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(sample)
+            self._requests[name] += 1
+            if sample.get("over_budget"):
+                self._over_budget[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            views = {name: list(samples) for name, samples in self._samples.items()}
+            requests, over_budget = dict(self._requests), dict(self._over_budget)
+
+        summary = {}
+        for name, samples in views.items():
+            durations = [s["duration_ms"] for s in samples]
+            sql_times = [s["sql_ms"] for s in samples]
+            queries = [s["queries"] for s in samples]
+            histogram = Counter()
+            for duration in durations:
+                bucket = next((f"<={bound}" for bound in LATENCY_BUCKETS if duration <= bound), f">{LATENCY_BUCKETS[-1]}")
+                histogram[bucket] += 1
+            worst = max(samples, key=lambda s: s["repeated"])
+            summary[name] = {
+                "requests": requests[name],
+                "over_budget": over_budget.get(name, 0),
+                "window": len(samples),
+                "duration_ms": {
+                    "p50": _percentile(durations, 0.5),
+                    "p95": _percentile(durations, 0.95),
+                    "max": max(durations),
+                },
+                "sql_ms": {"p50": _percentile(sql_times, 0.5), "p95": _percentile(sql_times, 0.95)},
+                "queries": {
+                    "mean": round(sum(queries) / len(queries), 1),
+                    "p95": _percentile(queries, 0.95),
+                    "max": max(queries),
+                },
+                "repeated_max": worst["repeated"],
+                "duplicates_max": max(s["duplicates"] for s in samples),
+                "worst_statement": worst["worst_statement"],
+                "histogram": {bucket: histogram[bucket] for bucket in
+                              [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]},
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._requests.clear()
+            self._over_budget.clear()
+
+
+stats = ViewStats(window=getattr(settings, "QUERY_STATS_WINDOW", 500))
+
+_log_lock = threading.Lock()
+
+
+def _write_log(sample):
+    path = getattr(settings, "QUERY_STATS_LOG", None)
+    if not path:
+        return
+    line = json.dumps(sample, separators=(",", ":"), default=str) + "\n"
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+    except OSError:
+        logger.exception("Could not append query stats to %s", path)
+
+
+# -----------------------
+# Middleware
+# -----------------------
+class QueryInstrumentationMiddleware:
+    """Records query count, SQL time, repeated queries and latency per URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        collector = QueryCollector()
+        start = time.perf_counter()
+        token = _collector.set(collector)
+        try:
+            response = self.get_response(request)
+        finally:
+            _collector.reset(token)
+        return self._record(request, response, collector, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so queries from its threads reach this collector.
+        collector = QueryCollector()
+        start = time.perf_counter()
+        token = _collector.set(collector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _collector.reset(token)
+        return self._record(request, response, collector, time.perf_counter() - start)
+
+    def _record(self, request, response, collector, duration):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return response
+        statement, statement_runs = collector.worst_statement()
+        sample = {
+            "view": match.view_name,
+            "method": request.method,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "sql_ms": round(collector.sql_time * 1000, 2),
+            "queries": collector.count,
+            "repeated": collector.repeated,
+            "duplicates": collector.duplicates,
+            "worst_statement": {"sql": statement, "runs": statement_runs} if statement_runs > 1 else None,
+            "timestamp": time.time(),
+        }
+        budget = None
+        if request.method in getattr(match.func, "query_budget_methods", ()):
+            budget = match.func.query_budget
+        exceeded = self._over_budget(budget, sample)
+        sample["over_budget"] = exceeded
+        stats.record(sample)
+        _write_log(sample)
+
+        if exceeded:
+            message = f"{sample['view']} exceeded its query budget: " + ", ".join(exceeded)
+            if sample["worst_statement"]:
+                message += f" (most repeated, {statement_runs}x: {statement})"
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    @staticmethod
+    def _over_budget(budget, sample):
+        if not budget:
+            return []
+        return [
+            f"{name} {sample[name]} > {limit}"
+            for name, limit in budget.items()
+            if sample[name] > limit
+        ]
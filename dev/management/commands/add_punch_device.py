@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dev.punches import DEVICE_SCHEME, find_company, issue_device_token
+
+
+class Command(BaseCommand):
+    help = "Register a biometric gateway and print the token it must send with its punches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="A name for the device, e.g. 'Gate 2'.")
+        parser.add_argument("--company", required=True, help="Company id or name.")
+
+    def handle(self, *args, **options):
+        company = find_company(options["company"])
+        if company is None:
+            raise CommandError(f"Company {options['company']!r} not found.")
+
+        device, token = issue_device_token(company, options["name"])
+        self.stdout.write(f"Authorization: {DEVICE_SCHEME} {token}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Registered {device.name} for {company.name}. The token is not stored; keep it now."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from dev.tags import backfill
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DocumentTag index from Document.tags."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", help="Only documents of this company id.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processed = backfill(company_id=options["company"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Synced tags of {processed} document(s)."))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dev import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the attendance login/logout APIs with many concurrent, repeated punches as the seed_bench "
+        "employees. Their attendance for today is deleted first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employees", type=int, default=1000, help="Employees punching at once.")
+        parser.add_argument("--repeats", type=int, default=3, help="Times each punch is sent.")
+        parser.add_argument("--concurrency", type=int, default=200, help="Requests in flight at most.")
+        parser.add_argument("--same-key", action="store_true", help="Send the repeats of a punch with one Idempotency-Key.")
+        parser.add_argument("--no-logout", action="store_true", help="Only run the login phase.")
+        parser.add_argument(
+            "--i-know-this-deletes-data",
+            action="store_true",
+            dest="any_employees",
+            help="Punch as any active employees, not only seed_bench ones, deleting their attendance for today.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = bench.punch_load(
+                employees=options["employees"],
+                repeats=options["repeats"],
+                concurrency=options["concurrency"],
+                same_key=options["same_key"],
+                logout=not options["no_logout"],
+                any_employees=options["any_employees"],
+            )
+        except ValueError as exc:
+            if options["any_employees"]:
+                raise CommandError(str(exc))
+            raise CommandError(
+                f"{exc} Run seed_bench first, or pass --i-know-this-deletes-data to use real employees "
+                "(their attendance for today is deleted)."
+            )
+        problems = results.pop("problems")
+
+        self.stdout.write(f"{'phase':8} {'requests':>9} {'recorded':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}  statuses")
+        for phase, result in results.items():
+            self.stdout.write(
+                f"{phase:8} {result['requests']:>9} {result['recorded']:>9} {result['per_second']:>8} "
+                f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['max_ms']:>9}  {result['statuses']}"
+            )
+
+        if problems:
+            raise CommandError("Punches were not recorded exactly once:\n  " + "\n  ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Every punch recorded exactly once."))
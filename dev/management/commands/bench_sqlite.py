@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from dev import bench
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite's default journal settings with the tuned pragmas under concurrent writers and readers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run.")
+        parser.add_argument("--directory", help="Where to create the scratch databases (default: system temp dir).")
+
+    def handle(self, *args, **options):
+        results = bench.sqlite_contention(
+            writers=options["writers"],
+            readers=options["readers"],
+            seconds=options["seconds"],
+            directory=options["directory"],
+        )
+
+        self.stdout.write(f"{'profile':8} {'writes/s':>9} {'reads/s':>9} {'errors':>7} {'write p95':>10} {'read p95':>9}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:8} {result['writes_per_s']:>9} {result['reads_per_s']:>9} {result['errors']:>7} "
+                f"{result['write_p95_ms']!s:>10} {result['read_p95_ms']!s:>9}"
+            )
+
+        default, tuned = results["default"], results["tuned"]
+        if default["writes_per_s"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"Tuned: {tuned['writes_per_s'] / default['writes_per_s']:.1f}x write throughput, "
+                f"{tuned['errors']} lock errors (default: {default['errors']})."
+            ))
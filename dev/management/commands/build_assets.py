@@ -0,0 +1,38 @@
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from dev.assets import AssetStorage
+
+
+def _kb(size):
+    return f"{size / 1024:.1f}" if size is not None else "-"
+
+
+class Command(BaseCommand):
+    help = "Bundle, minify, hash and gzip the static assets into STATIC_ROOT and report the bytes saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clear", action="store_true", help="Empty STATIC_ROOT first.")
+
+    def handle(self, *args, **options):
+        if not isinstance(staticfiles_storage, AssetStorage):
+            raise CommandError("STORAGES['staticfiles'] must be dev.assets.AssetStorage.")
+
+        call_command("collectstatic", interactive=False, clear=options["clear"], verbosity=0)
+        report = staticfiles_storage.report
+
+        self.stdout.write(f"{'file':40} {'source KB':>10} {'built KB':>9} {'gzip KB':>8}")
+        totals = {"source": 0, "built": 0, "gzip": 0}
+        for name, sizes in sorted(report.items()):
+            self.stdout.write(f"{name:40} {_kb(sizes['source']):>10} {_kb(sizes['built']):>9} {_kb(sizes.get('gzip')):>8}")
+            totals["source"] += sizes["source"]
+            totals["built"] += sizes["built"]
+            totals["gzip"] += sizes.get("gzip") or sizes["built"]
+
+        if totals["source"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(report)} file(s): {_kb(totals['source'])} KB -> {_kb(totals['built'])} KB minified "
+                f"({1 - totals['built'] / totals['source']:.0%} saved), {_kb(totals['gzip'])} KB gzipped "
+                f"({1 - totals['gzip'] / totals['source']:.0%} saved)."
+            ))
@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from dev import images
+from dev.models import Company, User
+
+
+class Command(BaseCommand):
+    help = "Write the WebP/JPEG derivatives of every uploaded avatar, logo and cover and report the bytes saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        sources = [(name, "avatar") for name in User.all_objects.exclude(avatar="").values_list("avatar", flat=True)]
+        for logo, cover in Company.all_objects.values_list("logo", "cover_image"):
+            sources += [(name, kind) for name, kind in ((logo, "logo"), (cover, "cover")) if name]
+
+        totals, failures = {}, []
+        for name, kind in sources:
+            if not images.is_raster(name):
+                continue
+            try:
+                entry = images.generate(name, kind, force=options["force"])
+                original = default_storage.size(name)
+            except Exception as exc:
+                failures.append(f"{name}: {exc}")
+                continue
+            largest = max((v for v in entry["variants"] if v["format"] == "webp"), key=lambda v: v["width"], default=None)
+            total = totals.setdefault(kind, {"images": 0, "original": 0, "largest": 0})
+            total["images"] += 1
+            total["original"] += original
+            total["largest"] += largest["bytes"] if largest else original
+
+        self.stdout.write(f"{'kind':8} {'images':>7} {'original KB':>12} {'largest WebP KB':>16} {'saved':>6}")
+        for kind, total in totals.items():
+            saved = 1 - total["largest"] / total["original"] if total["original"] else 0
+            self.stdout.write(
+                f"{kind:8} {total['images']:>7} {total['original'] / 1024:>12.1f} {total['largest'] / 1024:>16.1f} {saved:>6.0%}"
+            )
+
+        if failures:
+            raise CommandError("Some images could not be processed:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"Derivatives ready for {sum(t['images'] for t in totals.values())} image(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dev.notifications import deliver_due
+
+
+class Command(BaseCommand):
+    help = "Deliver scheduled notifications whose send_at has passed (run every minute, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        delivered = deliver_due(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} scheduled notification(s)."))
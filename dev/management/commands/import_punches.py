@@ -0,0 +1,47 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dev.notifications import get_dispatcher
+from dev.punches import find_company, ingest_punches, parse_punches
+
+
+class Command(BaseCommand):
+    help = "Import biometric punches from an NDJSON or CSV file (or '-' for stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or '-' to read stdin.")
+        parser.add_argument("--company", required=True, help="Company id or name.")
+        parser.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--no-notify", action="store_true", help="Do not create notifications.")
+
+    def handle(self, *args, **options):
+        company = find_company(options["company"])
+        if company is None:
+            raise CommandError(f"Company {options['company']!r} not found.")
+
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+
+        started = time.perf_counter()
+        if path == "-":
+            stats = self._ingest(company, sys.stdin, fmt, options)
+        else:
+            with open(path, encoding="utf-8", newline="") as handle:
+                stats = self._ingest(company, handle, fmt, options)
+        get_dispatcher().flush()
+        elapsed = time.perf_counter() - started
+
+        rate = stats["received"] / elapsed if elapsed else 0
+        self.stdout.write(", ".join(f"{key}={value}" for key, value in stats.items()))
+        self.stdout.write(self.style.SUCCESS(f"Processed {stats['received']} punch(es) in {elapsed:.2f}s ({rate:,.0f}/s)."))
+
+    def _ingest(self, company, handle, fmt, options):
+        return ingest_punches(
+            company,
+            parse_punches(handle, fmt),
+            notify=not options["no_notify"],
+            batch_size=options["batch_size"],
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from dev.attendance import rebuild_summaries
+from dev.models import Employee
+
+
+class Command(BaseCommand):
+    help = "Rebuild AttendanceMonthlySummary rows from Attendance."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, help="Only rebuild this year.")
+        parser.add_argument("--month", type=int, help="Only rebuild this month (1-12).")
+        parser.add_argument("--company", help="Only rebuild employees of this company id.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        employee_ids = None
+        if options["company"]:
+            employee_ids = list(
+                Employee.all_objects.filter(company_id=options["company"]).values_list("pk", flat=True)
+            )
+
+        written = rebuild_summaries(
+            employee_ids=employee_ids,
+            year=options["year"],
+            month=options["month"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} attendance summary row(s)."))
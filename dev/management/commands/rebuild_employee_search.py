@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from dev import employee_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the fuzzy employee directory search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", help="Only re-index employees of this company id.")
+        parser.add_argument("--recreate", action="store_true", help="Drop and recreate the index tables first.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        company_id = options["company"]
+        if options["recreate"]:
+            employee_search.recreate_tables()
+            company_id = None
+
+        indexed = employee_search.rebuild(company_id=company_id, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} employee(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dev.hierarchy import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ReportingLine closure table from Employee.manager."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} reporting line(s)."))
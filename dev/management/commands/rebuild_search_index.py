@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dev import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for KBArticle and Document."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="Only rebuild this model (kbarticle or document; repeatable).",
+        )
+        parser.add_argument("--recreate", action="store_true", help="Drop and recreate the index tables first.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        models = {search.kind_of(model): model for model in search.INDEXED}
+        selected = options["models"] or list(models)
+        unknown = set(selected) - set(models)
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(sorted(unknown))}")
+
+        if options["recreate"]:
+            search.recreate_tables()
+            selected = list(models)
+
+        for kind in selected:
+            indexed = search.rebuild(models[kind], batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} {kind} row(s)."))
@@ -0,0 +1,53 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from dev.attendance import compute_totals, rebuild_summaries
+from dev.models import Attendance
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Attendance.total_work_seconds (logout - login minus merged breaks) "
+        "and refresh the affected monthly summaries. Meant to run nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Last day to recompute (YYYY-MM-DD). Defaults to yesterday.")
+        parser.add_argument("--days", type=int, default=1, help="Number of days ending at --date.")
+        parser.add_argument("--all", action="store_true", help="Recompute every attendance row.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        attendances = Attendance.all_objects.filter(login_time__isnull=False, logout_time__isnull=False)
+        if not options["all"]:
+            last_day = parse_date(options["date"]) if options["date"] else timezone.localdate() - timedelta(days=1)
+            if last_day is None:
+                raise CommandError(f"Invalid --date {options['date']!r}.")
+            first_day = last_day - timedelta(days=max(options["days"], 1) - 1)
+            attendances = attendances.filter(date__gte=first_day, date__lte=last_day)
+
+        rows = attendances.only(
+            "id", "employee_id", "date", "login_time", "logout_time", "total_work_seconds"
+        ).order_by("pk").iterator(chunk_size=options["batch_size"])
+
+        scanned = 0
+        affected = {}
+        while True:
+            chunk = list(islice(rows, options["batch_size"]))
+            if not chunk:
+                break
+            scanned += len(chunk)
+            for attendance in compute_totals(chunk, batch_size=options["batch_size"]):
+                affected.setdefault((attendance.date.year, attendance.date.month), set()).add(attendance.employee_id)
+
+        for (year, month), employee_ids in affected.items():
+            rebuild_summaries(employee_ids=employee_ids, year=year, month=month)
+
+        changed = sum(len(ids) for ids in affected.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} attendance row(s); corrected totals for {changed} employee-month(s)."
+        ))
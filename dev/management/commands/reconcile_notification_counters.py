@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from dev.models import Employee
+from dev.notifications import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute NotificationCounter rows from Notification and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", dest="users", help="Only this user id (repeatable).")
+        parser.add_argument("--company", help="Only users employed by this company id.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["users"]:
+            user_ids = set(options["users"])
+        if options["company"]:
+            company_users = {
+                str(user_id)
+                for user_id in Employee.all_objects.filter(company_id=options["company"]).values_list("user_id", flat=True)
+            }
+            user_ids = company_users if user_ids is None else user_ids & company_users
+
+        fixed = reconcile_counters(user_ids=user_ids, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled notification counters; {fixed} row(s) corrected."))
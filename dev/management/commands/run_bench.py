@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dev import bench
+
+
+class Command(BaseCommand):
+    help = "Time the key views as the bench users (see seed_bench) and compare against a saved baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", action="append", choices=sorted(bench.BENCHMARKS), help="Run only this benchmark (repeatable).")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--cold", action="store_true", help="Invalidate the dashboard cache before every request.")
+        parser.add_argument("--baseline", default="bench_baseline.json", help="Baseline file to compare against / save to.")
+        parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline.")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown as a fraction.")
+
+    def handle(self, *args, **options):
+        results = bench.run(
+            names=options["only"],
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            cold=options["cold"],
+        )
+
+        baseline = {}
+        if not options["save_baseline"]:
+            try:
+                baseline = bench.load_baseline(options["baseline"])
+            except FileNotFoundError:
+                self.stdout.write(f"No baseline at {options['baseline']}; run with --save-baseline to create one.")
+
+        self.stdout.write(f"{'benchmark':24} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'base p95':>9}")
+        for name, result in results.items():
+            if "error" in result:
+                self.stdout.write(self.style.ERROR(f"{name:24} {result['error']}"))
+                continue
+            before = baseline.get(name, {}).get("p95_ms", "")
+            self.stdout.write(f"{name:24} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['queries']:>8} {before:>9}")
+
+        if options["save_baseline"]:
+            failed = bench.errors(results)
+            if failed:
+                raise CommandError("Not saving a baseline with failing benchmarks:\n  " + "\n  ".join(failed))
+            bench.save_baseline(options["baseline"], results)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}."))
+            return
+
+        regressions = bench.compare(results, baseline, tolerance=options["tolerance"])
+        if regressions:
+            raise CommandError("Failing or regressed benchmarks:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} benchmark(s), no regressions."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from dev.bench import BENCH_PASSWORD, BENCH_USERS, seed
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic companies, employees and history for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--companies", type=int, default=1)
+        parser.add_argument("--employees", type=int, default=10000, help="Employees per company.")
+        parser.add_argument("--years", type=int, default=1, help="Years of attendance and task history.")
+        parser.add_argument("--tasks", type=int, default=8, help="Tasks per employee.")
+        parser.add_argument("--notifications", type=int, default=30, help="Notifications per employee.")
+        parser.add_argument("--leaves", type=int, default=6, help="Leave requests per employee.")
+        parser.add_argument("--articles", type=int, default=2000, help="KB articles per company.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        created = seed(
+            companies=options["companies"],
+            employees=options["employees"],
+            years=options["years"],
+            tasks_per_employee=options["tasks"],
+            notifications_per_employee=options["notifications"],
+            leaves_per_employee=options["leaves"],
+            articles=options["articles"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        for model, n in created.items():
+            self.stdout.write(f"  {model}: {n}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded. Bench users {', '.join(BENCH_USERS)} have password {BENCH_PASSWORD!r}."
+        ))
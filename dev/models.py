@@ -231,6 +231,22 @@ class Employee(AuditModel):
     class Meta:
         indexes = [models.Index(fields=["company", "employee_code"]), models.Index(fields=["manager"])]
 
+
+class ReportingLine(models.Model):
+    """
+    Closure table of the reporting hierarchy (Employee.manager): one row per
+    (manager, report) pair at any distance, plus a depth-0 row per person.
+    Maintained by dev.hierarchy; rebuild with `manage.py rebuild_org_hierarchy`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ancestor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reporting_descendants")
+    descendant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reporting_ancestors")
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+        indexes = [models.Index(fields=["ancestor", "depth"]), models.Index(fields=["descendant", "depth"])]
+
 # -----------------------
 # Attendance & Breaks app
 # -----------------------
@@ -248,8 +264,11 @@ class Attendance(AuditModel):
         indexes = [models.Index(fields=["employee", "date"])]
 
     def compute_total(self):
-        # implement logic to compute total_work_seconds minus breaks
-        pass
+        """Set total_work_seconds to logout - login minus (merged) breaks; not saved."""
+        from .attendance import compute_totals
+
+        compute_totals([self], save=False)
+        return self.total_work_seconds
 
 class Break(AuditModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -261,6 +280,40 @@ class Break(AuditModel):
     class Meta:
         ordering = ["-start_time"]
 
+class AttendanceMonthlySummary(TimeStampedModel):
+    """
+    Per-employee monthly rollup of Attendance.
+    Maintained incrementally by the attendance APIs; rebuild with
+    `manage.py rebuild_attendance_summary`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="monthly_summaries")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    present_days = models.PositiveIntegerField(default=0)
+    total_work_seconds = models.BigIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("employee", "year", "month")
+        verbose_name_plural = "Attendance monthly summaries"
+
+class PunchDevice(TimeStampedModel):
+    """
+    A biometric gateway allowed to post punches for its company.
+    Authenticates with ``Authorization: Device <token>``; only the SHA-256
+    of the token is stored (see dev.punches.issue_device_token).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="punch_devices")
+    name = models.CharField(max_length=255)
+    token_hash = models.CharField(max_length=64, unique=True, editable=False)
+    is_active = models.BooleanField(default=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.company})"
+
 # -----------------------
 # Leave & Holiday Management
 # -----------------------
@@ -404,6 +457,10 @@ class Lead(AuditModel):
     status = models.CharField(max_length=64, choices=STATUS_CHOICES, default="new", db_index=True)
     assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="assigned_leads")
     metadata = JSONField(null=True, blank=True)
+    exported_at = models.DateTimeField(null=True, blank=True, db_index=True)  # set once copied to the Google Sheet
+    # An exporter's claim on the lead while it copies it (see app/sheets.py).
+    export_claim = models.CharField(max_length=32, blank=True)
+    export_claimed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [models.Index(fields=["company", "status", "source"])]
@@ -510,6 +567,19 @@ class Notification(AuditModel):
     notif_type = models.CharField(max_length=32, choices=TYPE_CHOICES, default="info")
     is_read = models.BooleanField(default=False)
     send_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True, db_index=True)  # set once a scheduled notification's send_at has passed
+
+    class Meta:
+        indexes = [models.Index(fields=["recipient", "-created_at"])]
+
+class NotificationCounter(TimeStampedModel):
+    """Denormalized per-recipient notification counts (maintained by dev.notifications)."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, on_delete=models.CASCADE, related_name="notification_counter")
+    total = models.IntegerField(default=0)
+    unread = models.IntegerField(default=0)
+    info = models.IntegerField(default=0)
+    warning = models.IntegerField(default=0)
+    alert = models.IntegerField(default=0)
 
 # -----------------------
 # Scheduling & Calendar
@@ -556,6 +626,20 @@ class Document(AuditModel):
     file = models.FileField(upload_to="documents/")
     tags = JSONField(null=True, blank=True)
 
+class DocumentTag(models.Model):
+    """
+    One row per (live document, tag): the indexed copy of Document.tags.
+    Maintained by dev.tags; backfill with `manage.py backfill_document_tags`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="tag_index")
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="document_tags")
+    tag = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ("document", "tag")
+        indexes = [models.Index(fields=["company", "tag"])]
+
 class KBArticle(AuditModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="kb_articles")
@@ -0,0 +1,434 @@
+"""
+Notification dispatch.
+
+Views do not insert Notification rows themselves; they queue *intents*
+with ``notify()``. An intent is handed to the dispatcher only after the
+surrounding transaction commits, and the dispatcher turns batches of
+intents into one multi-row insert (``bulk.insert_rows``; one row per
+recipient, so fan-out to a whole team is a single write).
+
+Dispatchers (settings.NOTIFICATION_DISPATCHER):
+
+* ``"thread"`` - a background worker thread drains an in-process queue in
+  batches; the request returns without waiting for the insert.
+* ``"sync"`` - writes immediately in the calling thread (tests, scripts,
+  management commands).
+
+Scheduled delivery: intents may carry ``send_at``. Rows are written right
+away but ``visible()`` hides them until ``send_at`` has passed. Once due,
+``deliver_due()`` stamps ``delivered_at``, counts them, refreshes the
+recipients' dashboards and publishes the live event; the thread
+dispatcher runs it every NOTIFICATION_DELIVERY_INTERVAL seconds, and
+``manage.py deliver_notifications`` covers the "sync" dispatcher and
+processes that never start a worker.
+
+Counters: NotificationCounter holds each recipient's total/unread/per-type
+counts so pages and the navbar badge need no COUNT queries. ``write()``,
+``mark_read()`` and the Notification signal handlers keep them exact;
+``reconcile_counters()`` (``manage.py reconcile_notification_counters``)
+repairs drift from raw queryset updates. Only delivered notifications are
+counted (``DELIVERED``): a scheduled row is added to its recipient's
+counters by ``deliver_due()``, not when it is written.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import bulk, dashboard_cache, events
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+NotificationIntent = namedtuple(
+    "NotificationIntent", ["recipient_ids", "title", "body", "notif_type", "send_at"]
+)
+
+
+def _recipient_id(recipient):
+    return getattr(recipient, "pk", recipient)
+
+
+def build_intent(recipients, title, body="", notif_type="info", send_at=None):
+    if not isinstance(recipients, (list, tuple, set, frozenset)):
+        recipients = [recipients]
+    recipient_ids = tuple(dict.fromkeys(_recipient_id(r) for r in recipients if r is not None))
+    return NotificationIntent(recipient_ids, title, body, notif_type, send_at)
+
+
+def notify(recipients, title, body="", notif_type="info", send_at=None):
+    """Queue one notification for each of ``recipients`` (users or user ids)."""
+    enqueue([build_intent(recipients, title, body, notif_type, send_at)])
+
+
+def enqueue(intents):
+    """Hand ``intents`` to the dispatcher once the current transaction commits."""
+    intents = [intent for intent in intents if intent.recipient_ids]
+    if intents:
+        transaction.on_commit(lambda: get_dispatcher().submit(intents))
+
+
+def write(intents):
+    """Insert the notifications for ``intents`` with one bulk write. Returns the row count."""
+    pairs = [(intent, recipient_id) for intent in intents for recipient_id in intent.recipient_ids]
+    if not pairs:
+        return 0
+    now = timezone.now()
+    deltas = {}
+    for intent, recipient_id in pairs:
+        delta = deltas.setdefault(recipient_id, {})
+        for field, value in contribution(False, intent.notif_type, delivered=_due(intent, now)).items():
+            delta[field] = delta.get(field, 0) + value
+    with transaction.atomic():
+        bulk.insert_rows(
+            Notification,
+            ["id", "recipient", "title", "body", "notif_type", "send_at", "delivered_at", "is_read",
+             "created_at", "updated_at", "is_deleted"],
+            [
+                (pk, recipient_id, intent.title, intent.body, intent.notif_type, intent.send_at,
+                 now if intent.send_at is not None and intent.send_at <= now else None, False, now, now, False)
+                for pk, (intent, recipient_id) in zip(bulk.new_ids(len(pairs)), pairs)
+            ],
+            batch_size=getattr(settings, "NOTIFICATION_BATCH_SIZE", 500),
+        )
+        adjust_counters(deltas)
+    # Rows are inserted directly, so the dashboard signal handlers do not run.
+    dashboard_cache.invalidate_users(deltas)
+    events.publish_many([
+        (intent.recipient_ids, "notification", {
+            "title": intent.title,
+            "body": intent.body,
+            "notif_type": intent.notif_type,
+        })
+        for intent in intents
+        if _due(intent, now)
+    ])
+    return len(pairs)
+
+
+def _due(intent, now):
+    return intent.send_at is None or intent.send_at <= now
+
+
+def deliver_due(now=None, batch_size=500):
+    """
+    Deliver scheduled notifications whose ``send_at`` has passed: stamp
+    ``delivered_at``, add them to their recipients' counters, refresh their
+    dashboards and publish the live event ``write()`` held back. Returns the
+    number of notifications delivered.
+    """
+    now = now or timezone.now()
+    due = Notification.objects.filter(delivered_at__isnull=True, send_at__lte=now).order_by("send_at")
+    delivered = 0
+    while True:
+        rows = list(due.values_list("pk", "recipient_id", "is_read", "notif_type", "title", "body")[:batch_size])
+        if not rows:
+            return delivered
+        pks = [row[0] for row in rows]
+        with transaction.atomic():
+            updated = Notification.objects.filter(pk__in=pks, delivered_at__isnull=True).update(delivered_at=now)
+            if updated < len(rows):
+                # Another worker got to some of these first; keep only the rows stamped here.
+                mine = set(Notification.objects.filter(pk__in=pks, delivered_at=now).values_list("pk", flat=True))
+                rows = [row for row in rows if row[0] in mine]
+            deltas = {}
+            for _, recipient_id, is_read, notif_type, _, _ in rows:
+                delta = deltas.setdefault(recipient_id, {})
+                for field, value in contribution(is_read, notif_type).items():
+                    delta[field] = delta.get(field, 0) + value
+            adjust_counters(deltas)
+        dashboard_cache.invalidate_users(deltas)
+        events.publish_many([
+            ([recipient_id], "notification", {"title": title, "body": body, "notif_type": notif_type})
+            for _, recipient_id, _, notif_type, title, body in rows
+        ])
+        delivered += len(rows)
+
+
+def mark_read(user, notification_ids=None):
+    """
+    Mark the user's unread notifications read (all of them, or only
+    ``notification_ids``) and update the unread counter. Scheduled ones not
+    yet delivered are left alone, like the counter leaves them out. Returns
+    the number of rows changed.
+    """
+    notifications = Notification.objects.filter(DELIVERED, recipient=user, is_read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(pk__in=notification_ids)
+    with transaction.atomic():
+        updated = notifications.update(is_read=True, updated_at=timezone.now())
+        if updated:
+            adjust_counters({user.pk: {"unread": -updated}})
+    dashboard_cache.invalidate_users([user.pk])
+    if updated:
+        events.publish([user.pk], "notifications_read", {"updated": updated})
+    return updated
+
+
+def visible(notifications, now=None):
+    """Restrict a Notification queryset to delivered ones (send_at unset or in the past)."""
+    now = now or timezone.now()
+    return notifications.filter(Q(send_at__isnull=True) | Q(send_at__lte=now))
+
+
+# -----------------------
+# Counters
+# -----------------------
+COUNTER_FIELDS = ("total", "unread", "info", "warning", "alert")
+
+
+def _cache():
+    return caches[getattr(settings, "DASHBOARD_CACHE_ALIAS", "default")]
+
+
+def _counts_key(user_id):
+    return f"notifications:counts:{user_id}"
+
+
+def _forget(user_ids):
+    keys = [_counts_key(user_id) for user_id in user_ids]
+    _cache().delete_many(keys)
+    # A reader may re-cache the pre-commit values in the meantime; drop them again once committed.
+    transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+# Rows included in the counters: unscheduled ones, and scheduled ones once deliver_due() has run.
+DELIVERED = Q(send_at__isnull=True) | Q(delivered_at__isnull=False)
+
+
+def contribution(is_read, notif_type, is_deleted=False, delivered=True):
+    """Counter increments contributed by one notification row."""
+    if is_deleted or not delivered:
+        return {}
+    delta = {"total": 1}
+    if not is_read:
+        delta["unread"] = 1
+    if notif_type in COUNTER_FIELDS:
+        delta[notif_type] = 1
+    return delta
+
+
+def adjust_counters(deltas, create_missing=True):
+    """
+    Apply ``deltas`` ({user_id: {field: increment}}) with F() updates, one
+    UPDATE per distinct delta, so fan-out of one notification is a single
+    query. Users without a counter row yet are reconciled from scratch
+    (which already includes the change) unless ``create_missing`` is False.
+    """
+    groups = {}
+    for user_id, delta in deltas.items():
+        delta = tuple(sorted((field, value) for field, value in delta.items() if value))
+        if user_id and delta:
+            groups.setdefault(delta, set()).add(user_id)
+    if not groups:
+        return
+
+    touched, missing = set(), set()
+    for delta, user_ids in groups.items():
+        updated = NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + value for field, value in delta},
+        )
+        touched |= user_ids
+        if create_missing and updated < len(user_ids):
+            existing = NotificationCounter.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True)
+            missing |= user_ids - set(existing)
+    if missing:
+        reconcile_counters(missing)
+    _forget(touched)
+
+
+def counts(user_id):
+    """The user's counters as a dict. Served from the cache, so usually without a query."""
+    cache = _cache()
+    key = _counts_key(user_id)
+    result = cache.get(key)
+    if result is None:
+        counter = NotificationCounter.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+        if counter is None:
+            reconcile_counters([user_id])
+            counter = NotificationCounter.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+        result = counter or dict.fromkeys(COUNTER_FIELDS, 0)
+        cache.set(key, result, None)
+    return result
+
+
+def reconcile_counters(user_ids=None, batch_size=1000):
+    """
+    Recompute counters from Notification for ``user_ids`` (every user with
+    notifications or a counter when None) and write the ones that differ.
+    Returns the number of counters written.
+    """
+    notifications = Notification.objects.filter(DELIVERED, recipient__isnull=False)
+    existing = NotificationCounter.objects.all()
+    if user_ids is not None:
+        user_ids = {NotificationCounter._meta.pk.to_python(user_id) for user_id in user_ids}
+        notifications = notifications.filter(recipient_id__in=user_ids)
+        existing = existing.filter(user_id__in=user_ids)
+
+    actual = {
+        row.pop("recipient_id"): row
+        for row in notifications.values("recipient_id").annotate(
+            total=Count("pk"),
+            unread=Count("pk", filter=Q(is_read=False)),
+            info=Count("pk", filter=Q(notif_type="info")),
+            warning=Count("pk", filter=Q(notif_type="warning")),
+            alert=Count("pk", filter=Q(notif_type="alert")),
+        ).order_by()
+    }
+    stored = {row.pop("user_id"): row for row in existing.values("user_id", *COUNTER_FIELDS)}
+    if user_ids is not None:
+        scope = user_ids
+    else:
+        scope = set(actual) | set(stored)
+
+    zero = dict.fromkeys(COUNTER_FIELDS, 0)
+    changed = [
+        NotificationCounter(user_id=user_id, **actual.get(user_id, zero))
+        for user_id in scope
+        if user_id not in stored or stored[user_id] != actual.get(user_id, zero)
+    ]
+    NotificationCounter.objects.bulk_create(
+        changed,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=[*COUNTER_FIELDS, "updated_at"],
+    )
+    _forget(scope)
+    return len(changed)
+
+
+# -----------------------
+# Dispatchers
+# -----------------------
+class SyncDispatcher:
+    """Writes in the calling thread."""
+
+    def submit(self, intents):
+        write(intents)
+
+    def flush(self, timeout=None):
+        return True
+
+
+class ThreadedDispatcher:
+    """
+    Background worker that batches queued intents into bulk inserts.
+
+    The worker waits ``flush_interval`` seconds after the first intent of a
+    batch so bursts (e.g. a shift change) collapse into a few writes. Once
+    started it also runs ``deliver_due()`` every ``delivery_interval``
+    seconds (0 disables it; ``manage.py deliver_notifications`` then has to).
+    """
+
+    def __init__(self, batch_size=500, flush_interval=0.05, delivery_interval=60):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.delivery_interval = delivery_interval
+        self._next_delivery = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, intents):
+        self._ensure_worker()
+        for intent in intents:
+            self._queue.put(intent)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written (or ``timeout`` passes)."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch, waiters = [], []
+            try:
+                item = self._queue.get(timeout=self._until_delivery())
+            except queue.Empty:
+                self._deliver()
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                close_old_connections()
+                try:
+                    write(batch)
+                except Exception:
+                    logger.exception("Failed to write %d notification intent(s)", len(batch))
+            for waiter in waiters:
+                waiter.set()
+
+    def _until_delivery(self):
+        if not self.delivery_interval:
+            return None
+        return max(0, self._next_delivery - time.monotonic())
+
+    def _deliver(self):
+        self._next_delivery = time.monotonic() + self.delivery_interval
+        close_old_connections()
+        try:
+            deliver_due()
+        except Exception:
+            logger.exception("Failed to deliver scheduled notifications")
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            if getattr(settings, "NOTIFICATION_DISPATCHER", "thread") == "sync":
+                _dispatcher = SyncDispatcher()
+            else:
+                _dispatcher = ThreadedDispatcher(
+                    batch_size=getattr(settings, "NOTIFICATION_BATCH_SIZE", 500),
+                    flush_interval=getattr(settings, "NOTIFICATION_FLUSH_INTERVAL", 0.05),
+                    delivery_interval=getattr(settings, "NOTIFICATION_DELIVERY_INTERVAL", 60),
+                )
+        return _dispatcher
+
+
+def set_dispatcher(dispatcher):
+    """Swap the dispatcher (e.g. SyncDispatcher() in tests). Returns the previous one."""
+    global _dispatcher
+    with _dispatcher_lock:
+        previous, _dispatcher = _dispatcher, dispatcher
+    return previous
+
+
+@atexit.register
+def _flush_on_exit():
+    if _dispatcher is not None:
+        _dispatcher.flush(timeout=5)
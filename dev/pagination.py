@@ -0,0 +1,211 @@
+"""
+Keyset (cursor) pagination.
+
+Django's Paginator runs COUNT(*) and OFFSET scans, which get slower the
+deeper the page. CursorPaginator instead filters on the sort key of the
+last row it returned, e.g. ``(created_at, id) < (last.created_at,
+last.id)``, so every page costs one indexed range scan of ``per_page + 1``
+rows whatever its depth.
+
+Cursors are opaque url-safe strings. The total count is optional and
+capped (``count_cap``) so it never scans more than that many rows.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.http import JsonResponse
+
+
+# Cursor value that jumps to the end of the list.
+LAST = "last"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    """One page of results; quacks enough like django.core.paginator.Page for templates."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` (field names, ``-`` for descending).
+
+    The primary key is appended as a tie-breaker if missing so the key is
+    unique. Nullable key fields sort NULLs last.
+    """
+
+    def __init__(self, queryset, per_page, ordering=("-created_at",), count_cap=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_cap = count_cap
+        model = queryset.model
+        ordering = list(ordering)
+        pk_name = model._meta.pk.name
+        if not any(name.lstrip("-") in (pk_name, "pk") for name in ordering):
+            ordering.append("-pk" if ordering and ordering[0].startswith("-") else "pk")
+        self.keys = []
+        for name in ordering:
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+            self.keys.append((field, descending))
+        self._count = None
+
+    # -----------------------
+    # Counting
+    # -----------------------
+    @property
+    def count(self):
+        """Row count, capped at ``count_cap`` (None when counting is disabled)."""
+        if self._count is None and self.count_cap:
+            self._count = self.queryset.order_by()[: self.count_cap + 1].count()
+        return min(self._count, self.count_cap) if self._count is not None else None
+
+    @property
+    def count_is_exact(self):
+        return self._count is not None and self._count <= self.count_cap
+
+    # -----------------------
+    # Cursors
+    # -----------------------
+    def _encode(self, obj, direction):
+        values = []
+        for field, _ in self.keys:
+            value = getattr(obj, field.attname)
+            values.append(value if value is None or isinstance(value, (int, float)) else str(value))
+        payload = json.dumps({"d": direction, "v": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def _decode(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            direction, raw = payload["d"], payload["v"]
+            if direction not in ("next", "prev") or len(raw) != len(self.keys):
+                raise ValueError
+            values = [None if v is None else field.to_python(v) for (field, _), v in zip(self.keys, raw)]
+        except (ValueError, TypeError, KeyError, ValidationError):
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    # -----------------------
+    # Keyset filtering
+    # -----------------------
+    def _order_by(self, reverse):
+        expressions = []
+        for field, descending in self.keys:
+            descending = descending != reverse
+            expression = F(field.name).desc if descending else F(field.name).asc
+            # NULLs last in forward order, therefore first when reversed.
+            expressions.append(expression(nulls_last=True) if not reverse else expression(nulls_first=True))
+        return expressions
+
+    def _beyond(self, field, descending, value, forward):
+        """Rows strictly past ``value`` for one key, or None if there are none."""
+        if value is None:
+            # NULLs are last: nothing is after them, every non-NULL is before them.
+            return None if forward else Q(**{f"{field.name}__isnull": False})
+        lookup = "lt" if descending == forward else "gt"
+        condition = Q(**{f"{field.name}__{lookup}": value})
+        if forward and field.null:
+            condition |= Q(**{f"{field.name}__isnull": True})
+        return condition
+
+    def _keyset_filter(self, values, forward):
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.keys, values):
+            beyond = self._beyond(field, descending, value, forward)
+            if beyond is not None:
+                condition |= equal & beyond
+            equal &= Q(**{f"{field.name}__isnull": True}) if value is None else Q(**{field.name: value})
+        return condition
+
+    # -----------------------
+    # Pages
+    # -----------------------
+    def get_page(self, cursor=None):
+        """Return the CursorPage for ``cursor`` (first page when empty or invalid, last for LAST)."""
+        direction, values = "next", None
+        if cursor == LAST:
+            direction = "prev"
+        elif cursor:
+            try:
+                direction, values = self._decode(cursor)
+            except InvalidCursor:
+                direction, values = "next", None
+
+        forward = direction == "next"
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, forward))
+        rows = list(queryset.order_by(*self._order_by(reverse=not forward))[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            next_cursor = self._encode(rows[-1], "next") if rows and has_more else None
+            previous_cursor = self._encode(rows[0], "prev") if rows and values is not None else None
+        else:
+            next_cursor = self._encode(rows[-1], "next") if rows and values is not None else None
+            previous_cursor = self._encode(rows[0], "prev") if rows and has_more else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class ListPaginator:
+    """Paginator stand-in for a precomputed, single-page result list (e.g. ranked search hits)."""
+
+    def __init__(self, object_list):
+        self.count = len(object_list)
+        self.count_is_exact = True
+
+    def get_page(self, object_list):
+        return CursorPage(list(object_list), self, None, None)
+
+
+def single_page(object_list):
+    """A CursorPage holding all of ``object_list`` with no next/previous pages."""
+    object_list = list(object_list)
+    return ListPaginator(object_list).get_page(object_list)
+
+
+def cursor_page_json(page, serialize):
+    """
+    JSON response for infinite scroll: results plus next/previous cursors.
+    The (capped) count is only computed for the first page.
+    """
+    data = {
+        "results": [serialize(obj) for obj in page.object_list],
+        "next_cursor": page.next_cursor,
+        "previous_cursor": page.previous_cursor,
+    }
+    if not page.has_previous():
+        data["count"] = page.paginator.count
+        data["count_is_exact"] = page.paginator.count_is_exact
+    return JsonResponse(data)
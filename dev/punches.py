@@ -0,0 +1,339 @@
+"""
+Batched ingestion of biometric punch events.
+
+Gateways send streams of punches as NDJSON::
+
+    {"employee_code": "E042", "timestamp": "2025-03-03T09:01:12+05:30", "type": "in"}
+
+or CSV with an ``employee_code,timestamp[,type]`` header. ``type`` is
+optional; without it the earliest punch of the day is the login and the
+latest (if different) the logout.
+
+Punches are processed in chunks: each chunk is de-duplicated and grouped
+per (employee, date). Days that already have an Attendance row are merged
+with it and upserted with one ``bulk_create(update_conflicts=True)``;
+days without one (the bulk of a shift change) skip the merge and are
+written with ``bulk.insert_rows``. Monthly summaries get one increment
+upsert per chunk and the resulting notifications are queued on the
+dispatcher (see ``dev.notifications``).
+
+Gateways post to ``/dev/api/attendance/punches/`` with an
+``Authorization: Device <token>`` header. Tokens are issued per
+PunchDevice (``manage.py add_punch_device``); requests carrying one are
+exempt from CSRF, as they come from a device rather than a browser
+session. HR users can still upload a file from a logged-in session.
+"""
+import csv
+import hashlib
+import json
+import secrets
+import uuid
+from collections import namedtuple
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import attendance as attendance_summary, bulk, dashboard_cache, notifications as notifier
+from .models import Attendance, Company, Employee, PunchDevice
+
+Punch = namedtuple("Punch", ["employee_code", "timestamp", "kind"])
+
+PUNCH_KINDS = ("in", "out")
+
+
+class PunchFormatError(ValueError):
+    """A punch line/row that cannot be parsed."""
+
+
+# -----------------------
+# Devices
+# -----------------------
+DEVICE_SCHEME = "Device"
+
+
+def find_company(value):
+    """The company named ``value``, or with id ``value``; None if there is none (for the management commands)."""
+    company = Company.objects.filter(name=value).first()
+    if company is None:
+        try:
+            company = Company.objects.filter(pk=uuid.UUID(value)).first()
+        except ValueError:
+            pass
+    return company
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_device_token(company, name):
+    """Register a gateway for ``company``. Returns (device, token); the token is not stored and cannot be shown again."""
+    token = secrets.token_urlsafe(32)
+    device = PunchDevice.objects.create(company=company, name=name, token_hash=_token_hash(token))
+    return device, token
+
+
+def authenticate_device(authorization):
+    """The active PunchDevice for an ``Authorization: Device <token>`` header value, or None."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme != DEVICE_SCHEME or not token.strip():
+        return None
+    device = PunchDevice.objects.select_related("company").filter(
+        token_hash=_token_hash(token.strip()), is_active=True
+    ).first()
+    if device is not None:
+        PunchDevice.objects.filter(pk=device.pk).update(last_seen_at=timezone.now())
+    return device
+
+
+# -----------------------
+# Parsing
+# -----------------------
+def _decode(lines):
+    for line in lines:
+        yield line.decode("utf-8") if isinstance(line, bytes) else line
+
+
+def _make_punch(employee_code, timestamp, kind):
+    employee_code = (employee_code or "").strip()
+    timestamp = parse_datetime((timestamp or "").strip())
+    kind = (kind or "").strip().lower() or None
+    if not employee_code or timestamp is None or (kind and kind not in PUNCH_KINDS):
+        raise PunchFormatError("invalid punch")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return Punch(employee_code, timestamp.replace(microsecond=0), kind)
+
+
+def parse_ndjson(lines):
+    """Yield Punch tuples (or PunchFormatError instances for bad lines)."""
+    for line in _decode(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+            yield _make_punch(row.get("employee_code"), row.get("timestamp"), row.get("type"))
+        except (ValueError, AttributeError) as exc:
+            yield PunchFormatError(str(exc))
+
+
+def parse_csv(lines):
+    """Yield Punch tuples (or PunchFormatError instances for bad rows)."""
+    for row in csv.DictReader(_decode(lines)):
+        try:
+            yield _make_punch(row.get("employee_code"), row.get("timestamp"), row.get("type"))
+        except ValueError as exc:
+            yield PunchFormatError(str(exc))
+
+
+PARSERS = {"ndjson": parse_ndjson, "csv": parse_csv}
+
+
+def parse_punches(lines, fmt="ndjson"):
+    try:
+        return PARSERS[fmt](lines)
+    except KeyError:
+        raise PunchFormatError(f"unsupported format {fmt!r}")
+
+
+# -----------------------
+# Ingestion
+# -----------------------
+def _merge_day(existing, punches):
+    """
+    Return (login_time, logout_time) after applying ``punches`` to the
+    ``existing`` times. Untyped punches may open or close the day.
+    """
+    login_time, logout_time = existing
+    ins = [p.timestamp for p in punches if p.kind != "out"]
+    outs = [p.timestamp for p in punches if p.kind != "in"]
+    if login_time:
+        ins.append(login_time)
+    if logout_time:
+        outs.append(logout_time)
+
+    login_time = min(ins) if ins else None
+    outs = [ts for ts in outs if login_time is None or ts > login_time]
+    logout_time = max(outs) if outs else None
+    return login_time, logout_time
+
+
+def _insert_fresh(days):
+    """
+    Insert Attendance rows for days that have no row yet. ``days`` are
+    (employee_id, date, login_time, logout_time, total_work_seconds) tuples.
+    Raises IntegrityError if another writer created one of them meanwhile.
+    """
+    now = timezone.now()
+    bulk.insert_rows(
+        Attendance,
+        ["id", "employee", "date", "login_time", "logout_time", "total_work_seconds", "notes",
+         "created_at", "updated_at", "is_deleted"],
+        [(pk, *day, "", now, now, False) for pk, day in zip(bulk.new_ids(len(days)), days)],
+    )
+
+
+def _ingest_chunk(company, punches, notify, insert_fresh=True):
+    """Ingest one de-duplicated chunk; returns its counters (see ``ingest_punches``)."""
+    stats = dict.fromkeys(("unknown_employee", "unchanged", "upserted", "notifications"), 0)
+    tz = timezone.get_current_timezone()
+    codes = {p.employee_code for p in punches}
+    employees = {
+        code: (pk, user_id, manager_id)
+        for code, pk, user_id, manager_id in Employee.objects.filter(
+            company=company, employee_code__in=codes
+        ).values_list("employee_code", "pk", "user_id", "manager_id")
+    }
+
+    by_day = {}
+    for punch in punches:
+        employee = employees.get(punch.employee_code)
+        if employee is None:
+            stats["unknown_employee"] += 1
+            continue
+        key = (employee[0], punch.timestamp.astimezone(tz).date())
+        by_day.setdefault(key, []).append(punch)
+    if not by_day:
+        return stats
+
+    employee_ids = {employee_id for employee_id, _ in by_day}
+    days = {day for _, day in by_day}
+    existing = {
+        (row.employee_id, row.date): row
+        for row in Attendance.all_objects.filter(
+            employee_id__in=employee_ids, date__in=days
+        ).only("id", "employee_id", "date", "login_time", "logout_time", "total_work_seconds", "is_deleted")
+    }
+
+    now = timezone.now()
+    fresh, rows, notifications = [], [], []
+    previous = {}
+    user_for = {pk: (user_id, manager_id) for pk, user_id, manager_id in employees.values()}
+    for (employee_id, day), day_punches in by_day.items():
+        current = existing.get((employee_id, day))
+        if current and not current.is_deleted:
+            before = (current.login_time, current.logout_time)
+            before_seconds = current.total_work_seconds
+        else:
+            before, before_seconds = (None, None), 0
+        login_time, logout_time = _merge_day(before, day_punches)
+        if (login_time, logout_time) == before:
+            stats["unchanged"] += 1
+            continue
+
+        if current is None and insert_fresh:
+            # A day without any row has nothing to merge and no breaks to subtract.
+            seconds = int((logout_time - login_time).total_seconds()) if login_time and logout_time else 0
+            fresh.append((employee_id, day, login_time, logout_time, seconds))
+        else:
+            row = Attendance(
+                employee_id=employee_id,
+                date=day,
+                login_time=login_time,
+                logout_time=logout_time,
+                updated_at=now,
+            )
+            if current:
+                row.id = current.id
+            rows.append(row)
+            previous[row] = (before[0], before_seconds)
+
+        if notify:
+            recipient = user_for[employee_id][0]
+            if login_time and not before[0]:
+                notifications.append(notifier.build_intent(
+                    recipient,
+                    title="Attendance Logged",
+                    body=f"You have successfully logged in at {login_time.astimezone(tz).strftime('%I:%M %p')}",
+                ))
+            if logout_time and logout_time != before[1]:
+                notifications.append(notifier.build_intent(
+                    recipient,
+                    title="Attendance Logged Out",
+                    body=f"You have logged out at {logout_time.astimezone(tz).strftime('%I:%M %p')}",
+                ))
+
+    if not rows and not fresh:
+        return stats
+
+    attendance_summary.compute_totals(rows, save=False)
+    # (employee_id, date, login before, seconds before, login after, seconds after) per changed day.
+    changes = [(employee_id, day, None, 0, login_time, seconds) for employee_id, day, login_time, _, seconds in fresh]
+    changes += [(row.employee_id, row.date, *previous[row], row.login_time, row.total_work_seconds) for row in rows]
+
+    with transaction.atomic():
+        if fresh:
+            _insert_fresh(fresh)
+        if rows:
+            Attendance.all_objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["employee", "date"],
+                update_fields=["login_time", "logout_time", "total_work_seconds", "is_deleted", "updated_at"],
+            )
+        notifier.enqueue(notifications)
+
+        deltas = {}
+        for employee_id, day, login_before, seconds_before, login_time, seconds in changes:
+            newly_present = login_time is not None and login_before is None
+            key = (employee_id, day.year, day.month)
+            present_days, work_seconds, late_count = deltas.get(key, (0, 0, 0))
+            deltas[key] = (
+                present_days + int(newly_present),
+                work_seconds + seconds - seconds_before,
+                late_count + int(newly_present and attendance_summary.is_late(login_time, tz)),
+            )
+        attendance_summary.apply_deltas(deltas)
+
+    stats["upserted"] += len(changes)
+    stats["notifications"] += len(notifications)
+    touched = {user_for[employee_id] for employee_id, *_ in changes}
+    dashboard_cache.invalidate_users({uid for pair in touched for uid in pair})
+    return stats
+
+
+def ingest_punches(company, punches, notify=True, batch_size=5000):
+    """
+    Ingest an iterable of Punch tuples for ``company``.
+
+    PunchFormatError items (from the parsers) are counted as invalid.
+    Duplicates are dropped per chunk; repeats across chunks are harmless
+    because merging is idempotent. Returns a dict of counters.
+    """
+    stats = {
+        "received": 0,
+        "invalid": 0,
+        "duplicates": 0,
+        "unknown_employee": 0,
+        "unchanged": 0,
+        "upserted": 0,
+        "notifications": 0,
+    }
+    iterator = iter(punches)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        seen, chunk = set(), []
+        for punch in batch:
+            stats["received"] += 1
+            if isinstance(punch, Exception):
+                stats["invalid"] += 1
+            elif punch in seen:
+                stats["duplicates"] += 1
+            else:
+                seen.add(punch)
+                chunk.append(punch)
+        if not chunk:
+            continue
+        try:
+            counts = _ingest_chunk(company, chunk, notify)
+        except IntegrityError:
+            # Another writer created some of the chunk's days after they were read; merge into them instead.
+            counts = _ingest_chunk(company, chunk, notify, insert_fresh=False)
+        for key, value in counts.items():
+            stats[key] += value
+    return stats
@@ -0,0 +1,362 @@
+"""
+Full-text search over KBArticle and Document.
+
+Each indexed object is one row of ``search_document`` (kind, object id,
+company id) plus its title/body text in a full-text index:
+
+* SQLite: an FTS5 table ``search_index`` whose rowid is
+  ``search_document.id``; ranked with bm25().
+* PostgreSQL: a weighted ``tsvector`` column on ``search_document`` with a
+  GIN index; ranked with ts_rank().
+
+Other databases fall back to ``icontains``. The tables are created on
+``post_migrate`` (the app has no migrations for them) and on first use.
+Rows are updated from the save/delete signals in ``dev.signals``; bulk
+changes need ``manage.py rebuild_search_index``.
+
+Queries are split into words that must all match; the last word is
+matched as a prefix so results follow typing: ``"onboarding pol"`` finds
+"Onboarding policy". Text is not stemmed, so prefixes stay predictable.
+
+Bulk loads leave the planner without statistics for the new rows, which
+makes SQLite pick the low-selectivity ``is_deleted`` index when fetching
+the matched rows; ``rebuild()`` therefore finishes with ANALYZE.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Document, KBArticle
+from .search_backends import BackendRegistry
+
+# Title matches count ten times as much as body matches.
+TITLE_WEIGHT = 10.0
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _document_text(document):
+    return document.title, " ".join(str(tag) for tag in document.tags or ())
+
+
+def _article_text(article):
+    return article.title, article.body
+
+
+# model -> function returning (title, body) for an instance
+INDEXED = {
+    KBArticle: _article_text,
+    Document: _document_text,
+}
+
+
+def kind_of(model):
+    return model._meta.model_name
+
+
+def terms(query):
+    """Lower-cased words of a user query."""
+    return [word.lower() for word in _WORD.findall(query or "")]
+
+
+# -----------------------
+# Backends
+# -----------------------
+class SQLiteBackend:
+    vendor = "sqlite"
+
+    def create_tables(self, cursor):
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS search_document ("
+            " id INTEGER PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " object_id TEXT NOT NULL,"
+            " company_id TEXT,"
+            " UNIQUE (kind, object_id))"
+        )
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            " title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def drop_tables(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS search_index")
+        cursor.execute("DROP TABLE IF EXISTS search_document")
+
+    @staticmethod
+    def object_id(pk):
+        # Django stores UUIDs as 32 hex characters on SQLite.
+        return pk.hex
+
+    @staticmethod
+    def _rowids(cursor, kind, object_ids):
+        rowids = {}
+        object_ids = list(object_ids)
+        for start in range(0, len(object_ids), 500):
+            chunk = object_ids[start:start + 500]
+            cursor.execute(
+                "SELECT object_id, id FROM search_document WHERE kind = %s AND object_id IN ({})".format(
+                    ", ".join(["%s"] * len(chunk))
+                ),
+                [kind, *chunk],
+            )
+            rowids.update(cursor.fetchall())
+        return rowids
+
+    def upsert(self, cursor, kind, rows):
+        """rows: (object_id, company_id, title, body) tuples."""
+        if not rows:
+            return
+        cursor.executemany(
+            "INSERT INTO search_document (kind, object_id, company_id) VALUES (%s, %s, %s)"
+            " ON CONFLICT (kind, object_id) DO UPDATE SET company_id = excluded.company_id",
+            [(kind, object_id, company_id) for object_id, company_id, _, _ in rows],
+        )
+        rowids = self._rowids(cursor, kind, [row[0] for row in rows])
+        cursor.executemany("DELETE FROM search_index WHERE rowid = %s", [(rowid,) for rowid in rowids.values()])
+        cursor.executemany(
+            "INSERT INTO search_index (rowid, title, body) VALUES (%s, %s, %s)",
+            [(rowids[object_id], title, body) for object_id, _, title, body in rows],
+        )
+
+    def delete(self, cursor, kind, object_ids):
+        rowids = [(rowid,) for rowid in self._rowids(cursor, kind, object_ids).values()]
+        cursor.executemany("DELETE FROM search_index WHERE rowid = %s", rowids)
+        cursor.executemany("DELETE FROM search_document WHERE id = %s", rowids)
+
+    def analyze(self, cursor, table):
+        cursor.execute(f"ANALYZE {table}")
+        cursor.execute("ANALYZE search_document")
+
+    def clear(self, cursor, kind):
+        cursor.execute(
+            "DELETE FROM search_index WHERE rowid IN (SELECT id FROM search_document WHERE kind = %s)",
+            [kind],
+        )
+        cursor.execute("DELETE FROM search_document WHERE kind = %s", [kind])
+
+    @staticmethod
+    def _match(words):
+        return " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+    def match_sql(self, kind, words, company_id, within=None):
+        sql = (
+            "SELECT d.object_id FROM search_index"
+            " JOIN search_document d ON d.id = search_index.rowid"
+            " WHERE search_index MATCH %s AND d.kind = %s"
+        )
+        params = [self._match(words), kind]
+        if company_id is not None:
+            sql += " AND d.company_id = %s"
+            params.append(self.object_id(company_id))
+        if within is not None:
+            sql += f" AND d.object_id IN ({within[0]})"
+            params.extend(within[1])
+        return sql, params
+
+    def ranked_sql(self, kind, words, company_id, limit, within=None):
+        sql, params = self.match_sql(kind, words, company_id, within)
+        sql += f" ORDER BY bm25(search_index, {TITLE_WEIGHT}, 1.0) LIMIT %s"
+        return sql, params + [limit]
+
+
+class PostgresBackend:
+    vendor = "postgresql"
+
+    def create_tables(self, cursor):
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS search_document ("
+            " id bigserial PRIMARY KEY,"
+            " kind text NOT NULL,"
+            " object_id uuid NOT NULL,"
+            " company_id uuid,"
+            " title text NOT NULL DEFAULT '',"
+            " body text NOT NULL DEFAULT '',"
+            " vector tsvector GENERATED ALWAYS AS ("
+            "  setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+            " ) STORED,"
+            " UNIQUE (kind, object_id))"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS search_document_vector ON search_document USING gin (vector)")
+
+    def drop_tables(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS search_document")
+
+    @staticmethod
+    def object_id(pk):
+        return str(pk)
+
+    def upsert(self, cursor, kind, rows):
+        cursor.executemany(
+            "INSERT INTO search_document (kind, object_id, company_id, title, body) VALUES (%s, %s, %s, %s, %s)"
+            " ON CONFLICT (kind, object_id) DO UPDATE SET"
+            " company_id = excluded.company_id, title = excluded.title, body = excluded.body",
+            [(kind, *row) for row in rows],
+        )
+
+    def delete(self, cursor, kind, object_ids):
+        cursor.execute(
+            "DELETE FROM search_document WHERE kind = %s AND object_id = ANY(%s::uuid[])",
+            [kind, list(object_ids)],
+        )
+
+    def analyze(self, cursor, table):
+        cursor.execute(f"ANALYZE {table}")
+        cursor.execute("ANALYZE search_document")
+
+    def clear(self, cursor, kind):
+        cursor.execute("DELETE FROM search_document WHERE kind = %s", [kind])
+
+    @staticmethod
+    def _tsquery(words):
+        return " & ".join([*words[:-1], f"{words[-1]}:*"])
+
+    def match_sql(self, kind, words, company_id, within=None):
+        sql = (
+            "SELECT object_id FROM search_document"
+            " WHERE vector @@ to_tsquery('simple', %s) AND kind = %s"
+        )
+        params = [self._tsquery(words), kind]
+        if company_id is not None:
+            sql += " AND company_id = %s"
+            params.append(self.object_id(company_id))
+        if within is not None:
+            sql += f" AND object_id IN ({within[0]})"
+            params.extend(within[1])
+        return sql, params
+
+    def ranked_sql(self, kind, words, company_id, limit, within=None):
+        sql, params = self.match_sql(kind, words, company_id, within)
+        sql += " ORDER BY ts_rank(vector, to_tsquery('simple', %s)) DESC LIMIT %s"
+        return sql, params + [self._tsquery(words), limit]
+
+
+backends = BackendRegistry(SQLiteBackend(), PostgresBackend())
+get_backend = backends.get_backend
+create_tables = backends.create_tables  # post_migrate hook
+recreate_tables = backends.recreate_tables
+
+
+def _connection(model):
+    return connections[router.db_for_write(model)]
+
+
+# -----------------------
+# Indexing
+# -----------------------
+def _is_live(instance):
+    return not getattr(instance, "is_deleted", False)
+
+
+def index_objects(objects):
+    """Add or refresh the index rows of ``objects`` (all of one model); deleted ones are removed."""
+    objects = list(objects)
+    if not objects:
+        return
+    model = type(objects[0])
+    connection = _connection(model)
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    text = INDEXED[model]
+    live = [obj for obj in objects if _is_live(obj)]
+    rows = []
+    for obj in live:
+        title, body = text(obj)
+        rows.append((backend.object_id(obj.pk), backend.object_id(obj.company_id), title or "", body or ""))
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        backend.upsert(cursor, kind_of(model), rows)
+        gone = [backend.object_id(obj.pk) for obj in objects if not _is_live(obj)]
+        if gone:
+            backend.delete(cursor, kind_of(model), gone)
+
+
+def remove_objects(model, pks):
+    connection = _connection(model)
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        backend.delete(cursor, kind_of(model), [backend.object_id(pk) for pk in pks])
+
+
+def rebuild(model, batch_size=1000):
+    """
+    Re-index every live row of ``model`` in one transaction and refresh the
+    planner statistics. Returns the number of rows indexed.
+    """
+    connection = _connection(model)
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+    indexed, batch = 0, []
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            backend.clear(cursor, kind_of(model))
+        for obj in model.objects.order_by().iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                index_objects(batch)
+                indexed += len(batch)
+                batch = []
+        index_objects(batch)
+        indexed += len(batch)
+    with connection.cursor() as cursor:
+        backend.analyze(cursor, model._meta.db_table)
+    return indexed
+
+
+# -----------------------
+# Querying
+# -----------------------
+def matching(queryset, query, company_id=None):
+    """Restrict ``queryset`` to rows matching ``query`` (keeps the queryset's ordering)."""
+    words = terms(query)
+    if not words:
+        return queryset.none()
+    model = queryset.model
+    backend = get_backend(_connection(model))
+    if backend is None:
+        return queryset.filter(_fallback_q(model, words))
+    sql, params = backend.match_sql(kind_of(model), words, company_id)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def ranked(queryset, query, company_id=None, limit=200):
+    """
+    The best ``limit`` rows of ``queryset`` matching ``query``, as a list in
+    rank order. The queryset's filters run inside the ranked query (as a
+    primary key subquery), so rows it excludes never take up the limit.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    model = queryset.model
+    connection = _connection(model)
+    backend = get_backend(connection)
+    if backend is None:
+        return list(queryset.filter(_fallback_q(model, words))[:limit])
+    try:
+        within = queryset.order_by().values("pk").query.get_compiler(connection=connection).as_sql()
+    except EmptyResultSet:
+        return []
+    sql, params = backend.ranked_sql(kind_of(model), words, company_id, limit, within)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [model._meta.pk.to_python(row[0]) for row in cursor.fetchall()]
+    found = queryset.order_by().in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+def _fallback_q(model, words):
+    fields = ["title", "body"] if model is KBArticle else ["title"]
+    condition = Q()
+    for word in words:
+        any_field = Q()
+        for field in fields:
+            any_field |= Q(**{f"{field}__icontains": word})
+        condition &= any_field
+    return condition
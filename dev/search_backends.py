@@ -0,0 +1,49 @@
+"""
+Per-vendor backends for the search modules' own tables.
+
+``dev.search`` and ``dev.employee_search`` keep their indexes in tables
+the app has no migrations for, with one backend class per database
+vendor (each with ``vendor``, ``create_tables(cursor)`` and
+``drop_tables(cursor)``). A BackendRegistry picks the backend for a
+connection and creates its tables the first time that connection alias
+is used in the process, or from ``post_migrate``.
+"""
+import threading
+
+from django.db import connections
+
+
+class BackendRegistry:
+    """Backends by database vendor; tables are created once per connection alias."""
+
+    def __init__(self, *backends):
+        self.backends = {backend.vendor: backend for backend in backends}
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def get_backend(self, connection):
+        """The backend for ``connection``, creating its tables once per process; None if unsupported."""
+        backend = self.backends.get(connection.vendor)
+        if backend is not None and connection.alias not in self._ready:
+            with self._lock:
+                if connection.alias not in self._ready:
+                    with connection.cursor() as cursor:
+                        backend.create_tables(cursor)
+                    self._ready.add(connection.alias)
+        return backend
+
+    def create_tables(self, using="default", **kwargs):
+        """post_migrate hook: make sure the tables exist."""
+        self.get_backend(connections[using])
+
+    def recreate_tables(self, using="default"):
+        """Drop and recreate the tables (empty)."""
+        connection = connections[using]
+        backend = self.backends.get(connection.vendor)
+        if backend is None:
+            return
+        with self._lock:
+            with connection.cursor() as cursor:
+                backend.drop_tables(cursor)
+                backend.create_tables(cursor)
+            self._ready.add(connection.alias)
@@ -0,0 +1,380 @@
+"""
+Model signal handlers.
+
+Connected from ``DevConfig.ready()``.
+"""
+import functools
+
+from django.core.exceptions import ValidationError
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import (
+    attendance as attendance_summary,
+    dashboard_cache,
+    employee_search,
+    events,
+    fragment_cache,
+    hierarchy,
+    images,
+    notifications as notifier,
+    search,
+    tags,
+)
+from .models import (
+    Announcement,
+    Attendance,
+    CalendarEvent,
+    Company,
+    DailyReport,
+    Department,
+    Designation,
+    Document,
+    Employee,
+    KBArticle,
+    LeaveRequest,
+    Notification,
+    PolicyDocument,
+    Task,
+    User,
+)
+
+
+# -----------------------
+# Dashboard cache invalidation
+# -----------------------
+def _invalidate_employees(employee_ids, include_company=False):
+    """Invalidate the employees' own dashboards and those of everyone above them."""
+    rows = Employee.all_objects.filter(pk__in=[pk for pk in employee_ids if pk]).values_list(
+        "user_id", "manager_id", "company_id"
+    )
+    user_ids, company_ids = set(), set()
+    for user_id, manager_id, company_id in rows:
+        user_ids.update((user_id, manager_id))
+        company_ids.add(company_id)
+    dashboard_cache.invalidate_users(user_ids | hierarchy.ancestor_ids(user_ids))
+    if include_company:
+        dashboard_cache.invalidate_companies(company_ids)
+
+
+def _invalidate_users_and_managers(user_ids):
+    user_ids = {uid for uid in user_ids if uid}
+    if not user_ids:
+        return
+    manager_ids = Employee.all_objects.filter(user_id__in=user_ids).values_list("manager_id", flat=True)
+    dashboard_cache.invalidate_users(user_ids | set(manager_ids) | hierarchy.ancestor_ids(user_ids))
+
+
+@receiver(post_init, sender=Task)
+def remember_task_assignee(sender, instance, **kwargs):
+    # A reassigned task must also refresh the previous assignee's dashboard.
+    instance._loaded_assignee_id = instance.__dict__.get("assignee_id")
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_dashboards(sender, instance, **kwargs):
+    _invalidate_users_and_managers(
+        {instance.assignee_id, instance.reporter_id, getattr(instance, "_loaded_assignee_id", None)}
+    )
+    instance._loaded_assignee_id = instance.__dict__.get("assignee_id")
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def invalidate_attendance_dashboards(sender, instance, **kwargs):
+    _invalidate_employees([instance.employee_id])
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_delete, sender=LeaveRequest)
+def invalidate_leave_dashboards(sender, instance, **kwargs):
+    _invalidate_employees([instance.employee_id], include_company=True)
+
+
+@receiver(post_save, sender=DailyReport)
+@receiver(post_delete, sender=DailyReport)
+def invalidate_daily_report_dashboards(sender, instance, **kwargs):
+    # The dashboard and the sidebar's "!" badge show whether today's report is in.
+    _invalidate_employees([instance.employee_id])
+
+
+@receiver(post_init, sender=Employee)
+def remember_employee_manager(sender, instance, **kwargs):
+    instance._loaded_manager_id = instance.__dict__.get("manager_id")
+
+
+@receiver(pre_save, sender=Employee)
+def check_reporting_line(sender, instance, **kwargs):
+    instance._manager_changed = instance.manager_id != getattr(instance, "_loaded_manager_id", None)
+    if instance._manager_changed and hierarchy.would_cycle(instance.user_id, instance.manager_id):
+        raise ValidationError("An employee cannot report to themselves or to someone who reports to them.")
+
+
+@receiver(post_save, sender=Employee)
+def update_reporting_lines(sender, instance, created, **kwargs):
+    # Runs before invalidate_employee_dashboards resets _loaded_manager_id.
+    if created:
+        hierarchy.ensure_nodes([instance.user_id])
+    if created or getattr(instance, "_manager_changed", True):
+        dashboard_cache.invalidate_users(hierarchy.move(instance.user_id, instance.manager_id))
+
+
+@receiver(post_delete, sender=Employee)
+def detach_reporting_lines(sender, instance, **kwargs):
+    dashboard_cache.invalidate_users(hierarchy.move(instance.user_id, None))
+
+
+@receiver(pre_delete, sender=User)
+def detach_reportees(sender, instance, **kwargs):
+    # Employee.manager is SET_NULL by a plain UPDATE, which sends no signals.
+    for user_id in Employee.all_objects.filter(manager=instance).values_list("user_id", flat=True):
+        hierarchy.move(user_id, None)
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_employee_dashboards(sender, instance, **kwargs):
+    dashboard_cache.invalidate_users(
+        {instance.user_id, instance.manager_id, getattr(instance, "_loaded_manager_id", None)}
+    )
+    dashboard_cache.invalidate_companies({instance.company_id})
+    instance._loaded_manager_id = instance.__dict__.get("manager_id")
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_dashboards(sender, instance, **kwargs):
+    dashboard_cache.invalidate_users({instance.recipient_id})
+
+
+# -----------------------
+# Notification counters
+# -----------------------
+def _counted_state(instance):
+    fields = instance.__dict__
+    if any(
+        name not in fields
+        for name in ("recipient_id", "is_read", "notif_type", "is_deleted", "send_at", "delivered_at")
+    ):
+        return None
+    delivered = fields["send_at"] is None or fields["delivered_at"] is not None
+    return fields["recipient_id"], fields["is_read"], fields["notif_type"], fields["is_deleted"], delivered
+
+
+@receiver(post_init, sender=Notification)
+def remember_notification_state(sender, instance, **kwargs):
+    # post_init runs before from_db() clears _state.adding, so loaded rows cannot be told apart
+    # here; a new instance's state is ignored by update_notification_counters (created=True).
+    instance._loaded_counted_state = _counted_state(instance)
+    instance._loaded_recipient_id = instance.__dict__.get("recipient_id")
+
+
+@receiver(post_save, sender=Notification)
+def update_notification_counters(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, "_loaded_counted_state", None)
+    after = _counted_state(instance)
+    if (not created and before is None) or after is None:
+        # Deferred fields: the old state is unknown, recount the old and new recipient.
+        notifier.reconcile_counters({instance.recipient_id, getattr(instance, "_loaded_recipient_id", None)} - {None})
+    elif before != after:
+        deltas = {}
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None or state[0] is None:
+                continue
+            delta = deltas.setdefault(state[0], {})
+            for field, value in notifier.contribution(*state[1:]).items():
+                delta[field] = delta.get(field, 0) + sign * value
+        notifier.adjust_counters(deltas)
+    instance._loaded_counted_state = after
+    instance._loaded_recipient_id = instance.recipient_id
+
+
+@receiver(post_delete, sender=Notification)
+def remove_notification_from_counters(sender, instance, **kwargs):
+    state = getattr(instance, "_loaded_counted_state", None) or _counted_state(instance)
+    if state and state[0]:
+        # No counter row means nothing to decrement (and the user may be going away too).
+        notifier.adjust_counters(
+            {state[0]: {field: -value for field, value in notifier.contribution(*state[1:]).items()}},
+            create_missing=False,
+        )
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def invalidate_announcement_dashboards(sender, instance, **kwargs):
+    dashboard_cache.invalidate_companies({instance.company_id})
+
+
+@receiver(post_save, sender=CalendarEvent)
+@receiver(pre_delete, sender=CalendarEvent)
+def invalidate_event_dashboards(sender, instance, **kwargs):
+    user_ids = {instance.organizer_id}
+    if instance.pk:
+        user_ids.update(instance.attendees.values_list("pk", flat=True))
+    dashboard_cache.invalidate_users(user_ids)
+
+
+@receiver(m2m_changed, sender=CalendarEvent.attendees.through)
+def invalidate_event_attendee_dashboards(sender, instance, action, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if isinstance(instance, CalendarEvent):
+        user_ids = set(pk_set or ()) | {instance.organizer_id}
+        if action == "pre_clear":
+            user_ids.update(instance.attendees.values_list("pk", flat=True))
+    else:
+        user_ids = {instance.pk}
+    dashboard_cache.invalidate_users(user_ids)
+
+
+# -----------------------
+# Template fragment cache
+# -----------------------
+@receiver(post_save, sender=User)
+def invalidate_user_fragments(sender, instance, created, update_fields=None, **kwargs):
+    # The user menu and sidebar show the name, avatar and role; not last_login.
+    if created or update_fields == frozenset({"last_login"}):
+        return
+    fragment_cache.invalidate_users({instance.pk})
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_employee_fragments(sender, instance, **kwargs):
+    fragment_cache.invalidate_users({instance.user_id})
+
+
+@receiver(post_save, sender=Designation)
+def invalidate_designation_fragments(sender, instance, created, **kwargs):
+    if not created:
+        fragment_cache.invalidate_users(instance.employees.values_list("user_id", flat=True))
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def invalidate_announcement_fragments(sender, instance, **kwargs):
+    fragment_cache.invalidate_companies({instance.company_id})
+
+
+@receiver(post_save, sender=KBArticle)
+@receiver(post_delete, sender=KBArticle)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+@receiver(post_save, sender=PolicyDocument)
+@receiver(post_delete, sender=PolicyDocument)
+def invalidate_help_center_fragment(sender, instance, **kwargs):
+    fragment_cache.invalidate_fragment("help_center")
+
+
+# -----------------------
+# Image derivatives
+# -----------------------
+@receiver(post_save, sender=User)
+def build_avatar_derivatives(sender, instance, update_fields=None, **kwargs):
+    if instance.avatar and (update_fields is None or "avatar" in update_fields):
+        # The cached user menu shows the avatar; re-render it once the derivatives exist.
+        images.ensure(instance.avatar.name, "avatar", on_done=functools.partial(fragment_cache.invalidate_users, {instance.pk}))
+
+
+@receiver(post_save, sender=Company)
+def build_company_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    for field, kind in (("logo", "logo"), ("cover_image", "cover")):
+        image = getattr(instance, field)
+        if image and (update_fields is None or field in update_fields):
+            images.ensure(image.name, kind)
+
+
+# -----------------------
+# Search index
+# -----------------------
+@receiver(post_save, sender=KBArticle)
+@receiver(post_save, sender=Document)
+def update_search_index(sender, instance, **kwargs):
+    search.index_objects([instance])
+
+
+@receiver(post_delete, sender=KBArticle)
+@receiver(post_delete, sender=Document)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_objects(sender, [instance.pk])
+
+
+# -----------------------
+# Document tag index
+# -----------------------
+@receiver(post_save, sender=Document)
+def sync_document_tags(sender, instance, **kwargs):
+    # Hard deletes cascade to DocumentTag.
+    tags.sync_documents([instance])
+
+
+# -----------------------
+# Employee directory search
+# -----------------------
+@receiver(post_save, sender=Employee)
+def index_employee(sender, instance, **kwargs):
+    employee_search.reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Employee)
+def unindex_employee(sender, instance, **kwargs):
+    employee_search.remove_employees([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def reindex_user_employee(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login only; a new user has no employee profile yet.
+    if created or (update_fields is not None and not employee_search.USER_FIELDS & set(update_fields)):
+        return
+    employee_search.reindex(Employee.all_objects.filter(user=instance).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Designation)
+def reindex_department_employees(sender, instance, created, **kwargs):
+    if not created:
+        employee_search.reindex(instance.employees.values_list("pk", flat=True))
+
+
+# -----------------------
+# Live dashboard events
+# -----------------------
+def _user_and_managers(employee_id, employee=None):
+    user_id = employee.user_id if employee is not None else (
+        Employee.all_objects.filter(pk=employee_id).values_list("user_id", flat=True).first()
+    )
+    return {user_id} | hierarchy.ancestor_ids({user_id}) if user_id else set()
+
+
+def _cached_employee(instance):
+    field = instance._meta.get_field("employee")
+    return field.get_cached_value(instance) if field.is_cached(instance) else None
+
+
+@receiver(post_save, sender=Attendance)
+def publish_attendance(sender, instance, **kwargs):
+    events.publish(
+        _user_and_managers(instance.employee_id, _cached_employee(instance)),
+        "attendance",
+        attendance_summary.event_payload(instance),
+    )
+
+
+@receiver(post_init, sender=LeaveRequest)
+def remember_leave_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=LeaveRequest)
+def publish_leave(sender, instance, created, **kwargs):
+    if created or instance.status != getattr(instance, "_loaded_status", None):
+        events.publish(_user_and_managers(instance.employee_id, _cached_employee(instance)), "leave", {
+            "id": instance.pk,
+            "employee_id": instance.employee_id,
+            "status": instance.status,
+            "start_date": instance.start_date,
+            "end_date": instance.end_date,
+        })
+    instance._loaded_status = instance.status
@@ -0,0 +1,95 @@
+/* ============================================
+   BThinkX Live Dashboard Events
+   Subscribes to the server-sent event stream (dev/events.py) and keeps
+   the page current without reloading it. Pages react to specific events
+   by listening for `live:<event>` on document. Pages served over WSGI
+   get no stream; they refetch the notification counters periodically
+   and receive `live:counts` instead.
+   ============================================ */
+
+(function() {
+    const script = document.currentScript;
+    if (!script) {
+        return;
+    }
+    const url = script.dataset.eventsUrl;
+    const countsUrl = script.dataset.countsUrl;
+
+    function setBadge(unread) {
+        const button = document.querySelector('.nav-button[aria-label="Notifications"]');
+        if (!button) {
+            return;
+        }
+        let badge = button.querySelector('.badge');
+        if (unread > 0) {
+            if (!badge) {
+                badge = document.createElement('span');
+                badge.className = 'badge';
+                button.appendChild(badge);
+            }
+            badge.textContent = unread;
+        } else if (badge) {
+            badge.remove();
+        }
+    }
+
+    function currentUnread() {
+        const badge = document.querySelector('.nav-button[aria-label="Notifications"] .badge');
+        return badge ? parseInt(badge.textContent, 10) || 0 : 0;
+    }
+
+    function forward(type, data) {
+        document.dispatchEvent(new CustomEvent('live:' + type, { detail: data }));
+    }
+
+    if (!url || !window.EventSource) {
+        if (countsUrl) {
+            pollCounts(countsUrl, (parseInt(script.dataset.pollSeconds, 10) || 60) * 1000);
+        }
+        return;
+    }
+
+    function pollCounts(countsUrl, interval) {
+        function refresh() {
+            if (document.hidden) {
+                return;
+            }
+            fetch(countsUrl, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+                .then((response) => response.ok ? response.json() : null)
+                .then((data) => {
+                    if (data && data.success) {
+                        setBadge(data.unread);
+                        forward('counts', data);
+                    }
+                })
+                .catch(() => {});
+        }
+        setInterval(refresh, interval);
+        document.addEventListener('visibilitychange', refresh);
+    }
+
+    const source = new EventSource(url);
+
+    source.addEventListener('hello', (e) => {
+        const data = JSON.parse(e.data);
+        setBadge(data.notifications.unread);
+        forward('hello', data);
+    });
+
+    source.addEventListener('notification', (e) => {
+        setBadge(currentUnread() + 1);
+        forward('notification', JSON.parse(e.data));
+    });
+
+    source.addEventListener('notifications_read', (e) => {
+        const data = JSON.parse(e.data);
+        setBadge(Math.max(currentUnread() - data.updated, 0));
+        forward('notifications_read', data);
+    });
+
+    ['attendance', 'leave'].forEach((type) => {
+        source.addEventListener(type, (e) => forward(type, JSON.parse(e.data)));
+    });
+
+    window.addEventListener('beforeunload', () => source.close());
+})();
@@ -0,0 +1,83 @@
+"""
+Document tag index.
+
+Document.tags is a JSON list, which SQLite cannot filter on with an index
+and which had to be loaded row by row to list a company's tags. Every tag
+of every live document is mirrored into DocumentTag, kept in step by the
+Document signals in ``dev.signals`` (soft-deleted documents have no rows),
+so tag filters and per-tag counts are indexed queries.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Document, DocumentTag
+
+MAX_TAG_LENGTH = DocumentTag._meta.get_field("tag").max_length
+
+
+def normalize_tags(tags):
+    """Distinct, stripped, non-empty tags in their original order."""
+    if isinstance(tags, str):
+        tags = [tags]
+    cleaned = (str(tag).strip()[:MAX_TAG_LENGTH] for tag in tags or ())
+    return list(dict.fromkeys(tag for tag in cleaned if tag))
+
+
+def sync_documents(documents):
+    """Bring the DocumentTag rows of ``documents`` in line with their tags."""
+    documents = list(documents)
+    if not documents:
+        return
+    wanted = {
+        (document.pk, document.company_id, tag)
+        for document in documents
+        if not document.is_deleted
+        for tag in normalize_tags(document.tags)
+    }
+    existing = {
+        (document_id, company_id, tag): pk
+        for pk, document_id, company_id, tag in DocumentTag.objects.filter(
+            document_id__in=[document.pk for document in documents]
+        ).values_list("pk", "document_id", "company_id", "tag")
+    }
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    missing = [
+        DocumentTag(document_id=document_id, company_id=company_id, tag=tag)
+        for document_id, company_id, tag in wanted
+        if (document_id, company_id, tag) not in existing
+    ]
+    with transaction.atomic():
+        if stale:
+            DocumentTag.objects.filter(pk__in=stale).delete()
+        DocumentTag.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+def backfill(company_id=None, batch_size=1000):
+    """Sync every document (of one company, or all). Returns the number of documents processed."""
+    documents = Document.all_objects.order_by()
+    if company_id is not None:
+        documents = documents.filter(company_id=company_id)
+    processed, batch = 0, []
+    for document in documents.only("id", "company_id", "tags", "is_deleted").iterator(chunk_size=batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            sync_documents(batch)
+            processed += len(batch)
+            batch = []
+    sync_documents(batch)
+    return processed + len(batch)
+
+
+def tag_counts(company_id):
+    """[{"tag": ..., "count": ...}] for the company's live documents, most used first."""
+    return list(
+        DocumentTag.objects.filter(company_id=company_id)
+        .values("tag")
+        .annotate(count=Count("pk"))
+        .order_by("-count", "tag")
+    )
+
+
+def filter_by_tag(documents, tag):
+    """Restrict a Document queryset to documents carrying ``tag``."""
+    return documents.filter(tag_index__tag=tag.strip())
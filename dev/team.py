@@ -0,0 +1,169 @@
+"""
+Batched loading of team-scoped data for the manager views.
+
+A TeamLoader wraps the queryset of team members. Each kind of data (the
+members themselves, attendance for a day, pending leaves, task counts) is
+fetched for the whole team with one query the first time it is asked for
+and memoised on the loader, DataLoader-style. Results come back as lists
+and dicts keyed by employee / user id, with the relations the templates
+follow already loaded, so rendering never goes back to the database per
+member. Queries filter on the members queryset as a subquery, so their
+number does not grow with the team and no id lists are sent to the
+database.
+"""
+from collections import defaultdict
+
+from django.db.models import Count
+
+from . import aggregates, hierarchy
+from .models import Attendance, Employee, LeaveRequest, Task
+
+TASK_STATUSES = ("todo", "in_progress", "done")
+
+
+def team_members(user, employee=None, max_depth=None):
+    """
+    Active employees ``user`` oversees: everyone below a manager in the
+    reporting hierarchy (down to ``max_depth`` levels), the whole company
+    for HR/admin.
+    """
+    if user.role == "manager":
+        return hierarchy.reports(user, max_depth).filter(is_active_employee=True)
+    employee = employee or user.employee_profile
+    return Employee.objects.filter(company_id=employee.company_id, is_active_employee=True)
+
+
+class TeamLoader:
+    """Loads data for every member of ``members`` (an Employee queryset) in one query per kind."""
+
+    def __init__(self, members):
+        self.queryset = members
+        self._loaded = {}
+
+    @classmethod
+    def for_user(cls, user, employee=None, max_depth=None):
+        return cls(team_members(user, employee, max_depth))
+
+    def _memo(self, key, load):
+        if key not in self._loaded:
+            self._loaded[key] = load()
+        return self._loaded[key]
+
+    # -----------------------
+    # Members
+    # -----------------------
+    @property
+    def members(self):
+        """Members with user, department and designation loaded, by name."""
+        return self._memo("members", lambda: list(
+            self.queryset
+            .select_related("user", "department", "designation")
+            .order_by("user__first_name", "user__last_name", "pk")
+        ))
+
+    @property
+    def members_by_id(self):
+        return self._memo("members_by_id", lambda: {member.pk: member for member in self.members})
+
+    def _member_ids(self):
+        return self.queryset.values("pk")
+
+    def _user_ids(self):
+        return self.queryset.values("user_id")
+
+    # -----------------------
+    # Team data
+    # -----------------------
+    def attendance_on(self, day):
+        """{employee_id: Attendance} for ``day``; each row's ``employee`` is the loaded member."""
+        def load():
+            records = {}
+            for record in Attendance.objects.filter(employee__in=self._member_ids(), date=day):
+                member = self.members_by_id.get(record.employee_id)
+                if member is not None:
+                    record.employee = member
+                records[record.employee_id] = record
+            return records
+
+        return self._memo(("attendance", day), load)
+
+    def leaves(self, status=None):
+        """LeaveRequest queryset for the team (for pagination), with employee, user and type joined."""
+        leaves = LeaveRequest.objects.filter(employee__in=self._member_ids()).select_related(
+            "employee", "employee__user", "leave_type", "approver"
+        )
+        return leaves.filter(status=status) if status else leaves
+
+    @property
+    def pending_leaves(self):
+        """The team's pending leave requests, newest first."""
+        return self._memo("pending_leaves", lambda: list(self.leaves("pending").order_by("-created_at")))
+
+    @property
+    def pending_leaves_by_employee(self):
+        def group():
+            grouped = defaultdict(list)
+            for leave in self.pending_leaves:
+                grouped[leave.employee_id].append(leave)
+            return dict(grouped)
+
+        return self._memo("pending_leaves_by_employee", group)
+
+    @property
+    def leave_stats(self):
+        """pending/approved/rejected counters over all of the team's leave requests."""
+        return self._memo("leave_stats", lambda: aggregates.leave_status_stats(
+            LeaveRequest.objects.filter(employee__in=self._member_ids())
+        ))
+
+    @property
+    def task_counts(self):
+        """{user_id: {"todo", "in_progress", "done", "total"}} for tasks assigned to members."""
+        def load():
+            counts = defaultdict(lambda: dict.fromkeys(TASK_STATUSES + ("total",), 0))
+            rows = (
+                Task.objects.filter(assignee__in=self._user_ids())
+                .values("assignee_id", "status")
+                .annotate(n=Count("pk"))
+                .order_by()
+            )
+            for row in rows:
+                member_counts = counts[row["assignee_id"]]
+                member_counts[row["status"]] = member_counts.get(row["status"], 0) + row["n"]
+                member_counts["total"] += row["n"]
+            return dict(counts)
+
+        return self._memo("task_counts", load)
+
+    @property
+    def report_counts(self):
+        """{user_id: number of active employees below that member} (managers only)."""
+        return self._memo("report_counts", lambda: hierarchy.subtree_counts(self._user_ids()))
+
+    # -----------------------
+    # Per-member rows
+    # -----------------------
+    def attendance_rows(self, day):
+        """One dict per member: employee, attendance, status, hours_worked."""
+        attendance = self.attendance_on(day)
+        rows = []
+        for member in self.members:
+            record = attendance.get(member.pk)
+            rows.append({
+                "employee": member,
+                "attendance": record,
+                "status": "present" if (record and record.login_time) else "absent",
+                "hours_worked": (record.total_work_seconds / 3600) if (record and record.total_work_seconds) else 0,
+            })
+        return rows
+
+    def member_rows(self, day):
+        """attendance_rows plus each member's pending leaves, task counts and number of reports."""
+        empty_counts = dict.fromkeys(TASK_STATUSES + ("total",), 0)
+        rows = self.attendance_rows(day)
+        for row in rows:
+            member = row["employee"]
+            row["pending_leaves"] = self.pending_leaves_by_employee.get(member.pk, [])
+            row["task_counts"] = self.task_counts.get(member.user_id, empty_counts)
+            row["reports"] = self.report_counts.get(member.user_id, 0)
+        return rows
@@ -0,0 +1,31 @@
+"""
+``{% bundle %}``: load a settings.STATIC_BUNDLES bundle (see dev/assets.py).
+
+    {% load assets %}
+    {% bundle "dev/js/profile.bundle.js" %}
+
+Renders one ``<script>`` / ``<link>`` for the built bundle, or one per
+file of the bundle in DEBUG and before ``manage.py build_assets`` ran.
+"""
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from dev import assets
+
+register = template.Library()
+
+TAGS = {
+    ".css": '<link rel="stylesheet" href="{}">',
+    ".js": '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def bundle(name):
+    parts = assets.bundles().get(name)
+    if parts is None:
+        raise template.TemplateSyntaxError(f"Unknown static bundle {name!r}; add it to settings.STATIC_BUNDLES.")
+    tag = TAGS[name[name.rindex("."):]]
+    names = [name] if assets.built_bundle(name) else parts
+    return format_html_join("\n", tag, ((static(part),) for part in names))
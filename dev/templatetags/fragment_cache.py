@@ -0,0 +1,58 @@
+"""
+``{% fragment %}``: cache a block of template output (see dev/fragment_cache.py).
+
+    {% load fragment_cache %}
+    {% fragment "nav" user.role request.path %} ... {% endfragment %}
+    {% fragment "user_menu" user=user.pk %} ... {% endfragment %}
+    {% fragment "announcements" company=employee.company_id %} ... {% endfragment %}
+
+The first argument names the fragment; ``user=`` / ``company=`` scope it
+to that user's or company's version stamp; every other argument is varied
+on, like the arguments of Django's ``{% cache %}``.
+"""
+from django import template
+from django.utils.safestring import mark_safe
+
+from dev import fragment_cache
+
+register = template.Library()
+
+SCOPES = ("user", "company")
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, scopes):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.scopes = scopes
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        scopes = {scope: value.resolve(context) for scope, value in self.scopes.items()}
+        key = fragment_cache.make_key(name, [value.resolve(context) for value in self.vary_on], **scopes)
+
+        def render():
+            # Tags inside that finish work later (``{% picture %}``) use this to refresh the fragment.
+            with context.push(fragment_invalidator=fragment_cache.invalidator(name, **scopes)):
+                return self.nodelist.render(context)
+
+        return mark_safe(fragment_cache.get_or_render(key, render))
+
+
+@register.tag("fragment")
+def do_fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+
+    vary_on, scopes = [], {}
+    for bit in bits[2:]:
+        scope, eq, value = bit.partition("=")
+        if eq and scope in SCOPES:
+            scopes[scope] = parser.compile_filter(value)
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), vary_on, scopes)
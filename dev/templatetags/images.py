@@ -0,0 +1,77 @@
+"""
+Responsive image helpers (see dev/images.py).
+
+    {% load images %}
+    {% picture user.avatar "avatar" sizes="40px" alt=user.get_full_name class="avatar" %}
+    <img src="..." srcset="{% srcset company.cover_image "webp" %}" sizes="100vw">
+    {% picture "main/images/ceo.jpg" "static" sizes="(max-width: 600px) 100vw, 480px" alt="CEO" %}
+
+The first argument is an ImageField file or a static path. ``picture``
+renders a ``<picture>`` with a WebP source and a JPEG fallback (lazy
+loaded unless ``loading`` is given). For an upload without derivatives it
+renders the original and queues them; inside a ``{% fragment %}`` the
+fragment is invalidated once they exist, so the cached HTML picks them up.
+"""
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from dev import images
+
+register = template.Library()
+
+
+def _lookup(image):
+    """(index entry or None, url of a stored name, url of the original) for ``image``."""
+    if isinstance(image, str):
+        return images.variants(image, storage=staticfiles_storage, prefix=""), static, static(image)
+    if not image:
+        return None, None, ""
+    return images.variants(image.name, storage=image.storage), image.storage.url, image.url
+
+
+def _srcset(entry, url, fmt):
+    chosen = sorted((v for v in entry["variants"] if v["format"] == fmt), key=lambda v: v["width"])
+    return ", ".join(f"{url(v['name'])} {v['width']}w" for v in chosen), chosen
+
+
+@register.simple_tag
+def srcset(image, fmt="webp"):
+    """The ``srcset`` value for ``image``'s ``fmt`` derivatives ("" while there are none)."""
+    entry, url, _ = _lookup(image)
+    return _srcset(entry, url, fmt)[0] if entry else ""
+
+
+@register.simple_tag(takes_context=True)
+def picture(context, image, kind, sizes="100vw", **attrs):
+    entry, url, original = _lookup(image)
+    attrs.setdefault("alt", "")
+    attrs.setdefault("loading", "lazy")
+    attrs.setdefault("decoding", "async")
+    attributes = format_html_join("", ' {}="{}"', attrs.items())
+
+    if not entry:
+        if image and not isinstance(image, str):
+            images.ensure(image.name, kind, on_done=context.get("fragment_invalidator"))
+        return format_html('<img src="{}"{}>', original, attributes)
+
+    sources, fallback_srcset, src = [], "", original
+    for fmt in images.formats():
+        value, chosen = _srcset(entry, url, fmt)
+        if not chosen:
+            continue
+        if fmt == "jpeg":
+            fallback_srcset, src = value, url(chosen[-1]["name"])
+        else:
+            sources.append((images.content_type(fmt), value, sizes))
+
+    if fallback_srcset:
+        img = format_html('<img src="{}" srcset="{}" sizes="{}"{}>', src, fallback_srcset, sizes, attributes)
+    else:
+        img = format_html('<img src="{}"{}>', src, attributes)
+    return format_html(
+        "<picture>{}{}</picture>",
+        format_html_join("", '<source type="{}" srcset="{}" sizes="{}">', sources),
+        img,
+    )
@@ -0,0 +1,822 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import aggregates, attendance, bench, database, employee_search, exports, fragment_cache, images, instrumentation, notifications as notifier, search, tags, views
+from .instrumentation import QueryBudgetExceeded
+from .models import (
+    Attendance, AttendanceMonthlySummary, Break, Company, Department, Document, DocumentTag, Employee, Holiday,
+    KBArticle, LeaveRequest, LeaveType, Notification, Task, Ticket, User,
+)
+from .pagination import LAST, CursorPaginator, cursor_page_json
+
+
+# Page templates some views render but that this tree does not ship (or that extend
+# one it does not ship, like app/templates/manager_dashboard.html).
+MISSING_TEMPLATES = {
+    "manager_dashboard.html": (
+        "{{ task_counts }} {{ org_levels }}"
+        "{% for member in team_members %}{{ member.user.get_full_name }}{% endfor %}"
+        "{% for row in team_rows %}{{ row }}{% endfor %}{% for leave in pending_leaves %}{{ leave }}{% endfor %}"
+    ),
+    "employees/approve_leaves.html": (
+        "{% extends 'base.html' %}{% block content %}{{ stats }}"
+        "{% for leave in page_obj %}{{ leave.employee.user.get_full_name }} {{ leave.leave_type.name }}{% endfor %}"
+        "{% endblock %}"
+    ),
+    "employees/documents.html": (
+        "{% extends 'base.html' %}{% block content %}{{ unique_tags }}"
+        "{% for document in page_obj %}{{ document.title }} {{ document.tags }}{% endfor %}"
+        "{% endblock %}"
+    ),
+    "employees/tickets.html": (
+        "{% extends 'base.html' %}{% block content %}{{ stats }}"
+        "{% for ticket in page_obj %}{{ ticket.title }} {{ ticket.status }}{% endfor %}"
+        "{% endblock %}"
+    ),
+    "employees/knowledgebase.html": (
+        "{% extends 'base.html' %}{% block content %}"
+        "{% for article in page_obj %}{{ article.title }}{% endfor %}"
+        "{% for article in popular_articles %}{{ article.title }}{% endfor %}"
+        "{% endblock %}"
+    ),
+}
+PAGE_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    "APP_DIRS": False,
+    "OPTIONS": {
+        **settings.TEMPLATES[0]["OPTIONS"],
+        "loaders": [
+            ("django.template.loaders.locmem.Loader", MISSING_TEMPLATES),
+            "django.template.loaders.app_directories.Loader",
+        ],
+    },
+}]
+
+
+class NotificationCounterSignalTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pw")
+        self.bob = User.objects.create_user(username="bob", password="pw")
+
+    def counts(self, user):
+        return {field: notifier.counts(user.pk)[field] for field in ("total", "unread", "info")}
+
+    def test_saving_a_loaded_notification_does_not_recount(self):
+        Notification.objects.create(recipient=self.alice, title="Hello")
+        notification = Notification.objects.get()
+        with mock.patch.object(notifier, "reconcile_counters") as reconcile:
+            notification.is_read = True
+            notification.save()
+        reconcile.assert_not_called()
+        self.assertEqual(self.counts(self.alice), {"total": 1, "unread": 0, "info": 1})
+
+    def test_reassigning_the_recipient_moves_the_counts(self):
+        Notification.objects.create(recipient=self.alice, title="Hello")
+        self.assertEqual(self.counts(self.alice), {"total": 1, "unread": 1, "info": 1})
+
+        notification = Notification.objects.get()
+        notification.recipient = self.bob
+        notification.save()
+
+        self.assertEqual(self.counts(self.alice), {"total": 0, "unread": 0, "info": 0})
+        self.assertEqual(self.counts(self.bob), {"total": 1, "unread": 1, "info": 1})
+        self.assertEqual(notifier.reconcile_counters(), 0)
+
+    def test_reassigning_a_partially_loaded_notification_recounts_both_recipients(self):
+        Notification.objects.create(recipient=self.alice, title="Hello")
+        self.counts(self.alice)
+
+        notification = Notification.objects.only("recipient").get()
+        notification.recipient = self.bob
+        notification.save()
+
+        self.assertEqual(self.counts(self.alice)["total"], 0)
+        self.assertEqual(self.counts(self.bob)["total"], 1)
+
+
+class ScheduledNotificationCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pw")
+        self.send_at = timezone.now() + timedelta(hours=1)
+
+    def test_scheduled_notifications_are_counted_once_delivered(self):
+        notifier.write([
+            notifier.build_intent(self.alice, "Now"),
+            notifier.build_intent(self.alice, "Later", send_at=self.send_at),
+        ])
+        Notification.objects.create(recipient=self.alice, title="Later too", send_at=self.send_at)
+        self.assertEqual(notifier.counts(self.alice.pk)["total"], 1)
+        self.assertEqual(notifier.reconcile_counters(), 0)
+
+        self.assertEqual(notifier.deliver_due(), 0)
+        self.assertEqual(notifier.deliver_due(now=self.send_at), 2)
+        self.assertEqual(notifier.deliver_due(now=self.send_at), 0)
+
+        self.assertEqual(notifier.counts(self.alice.pk)["total"], 3)
+        self.assertEqual(notifier.counts(self.alice.pk)["unread"], 3)
+        self.assertEqual(notifier.reconcile_counters(), 0)
+
+    def test_delivery_publishes_the_event_and_refreshes_the_dashboard(self):
+        notifier.write([notifier.build_intent(self.alice, "Later", "Soon", send_at=self.send_at)])
+        with (
+            mock.patch.object(notifier.events, "publish_many") as publish,
+            mock.patch.object(notifier.dashboard_cache, "invalidate_users") as invalidate,
+        ):
+            notifier.deliver_due(now=self.send_at)
+        invalidate.assert_called_once()
+        self.assertEqual(set(invalidate.call_args.args[0]), {self.alice.pk})
+        publish.assert_called_once_with(
+            [([self.alice.pk], "notification", {"title": "Later", "body": "Soon", "notif_type": "info"})]
+        )
+
+    def test_reading_or_deleting_an_undelivered_notification_leaves_counters_alone(self):
+        notification = Notification.objects.create(recipient=self.alice, title="Later", send_at=self.send_at)
+        notification.is_read = True
+        notification.save()
+        self.assertEqual(notifier.counts(self.alice.pk)["total"], 0)
+        notification.delete()
+        self.assertEqual(notifier.counts(self.alice.pk)["total"], 0)
+        self.assertEqual(notifier.reconcile_counters(), 0)
+
+    def test_mark_read_skips_undelivered_notifications(self):
+        notifier.write([
+            notifier.build_intent(self.alice, "Now"),
+            notifier.build_intent(self.alice, "Later", send_at=self.send_at),
+        ])
+        self.assertEqual(notifier.mark_read(self.alice), 1)
+        self.assertEqual(notifier.counts(self.alice.pk)["unread"], 0)
+
+        notifier.deliver_due(now=self.send_at)
+        self.assertEqual(notifier.counts(self.alice.pk)["unread"], 1)
+        self.assertEqual(notifier.reconcile_counters(), 0)
+
+
+class LeaveStatsTests(TestCase):
+    def test_approved_this_month_ignores_earlier_years(self):
+        company = Company.objects.create(name="Leave Co")
+        employee = Employee.objects.create(user=User.objects.create(username="lena"), company=company)
+        leave_type = LeaveType.objects.create(company=company, name="Casual")
+        today = timezone.localdate()
+        for start in (today, today.replace(year=today.year - 1, day=1)):
+            LeaveRequest.objects.create(
+                employee=employee, leave_type=leave_type, start_date=start, end_date=start, days=1, status="approved"
+            )
+        self.assertEqual(aggregates.leave_stats(employee, today)["approved_this_month"], 1)
+
+
+class AttendanceSummaryTests(TestCase):
+    def setUp(self):
+        previous = notifier.set_dispatcher(notifier.SyncDispatcher())
+        self.addCleanup(notifier.set_dispatcher, previous)
+        self.company = Company.objects.create(name="Punch Co")
+        self.employee = Employee.objects.create(user=User.objects.create(username="paul"), company=self.company)
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime(2025, 3, day, hour, minute))
+
+    def test_working_days_skip_weekday_holidays(self):
+        self.assertEqual(attendance.working_days(self.company.pk, 2025, 3), 21)
+        Holiday.objects.create(company=self.company, title="Monday off", date=date(2025, 3, 3))
+        Holiday.objects.create(company=self.company, title="Saturday off", date=date(2025, 3, 8))
+        Holiday.objects.create(company=Company.objects.create(name="Other Co"), title="Elsewhere", date=date(2025, 3, 4))
+        self.assertEqual(attendance.working_days(self.company.pk, 2025, 3), 20)
+
+    def test_punches_keep_the_summary_in_step_with_a_rebuild(self):
+        for day, login_hour in ((3, 9), (4, 10), (5, 9)):
+            async_to_sync(attendance.apunch_in)(self.employee, at=self.at(day, login_hour))
+            async_to_sync(attendance.apunch_out)(self.employee, at=self.at(day, 17))
+        # A repeated logout is not counted again.
+        async_to_sync(attendance.apunch_out)(self.employee, at=self.at(5, 18))
+
+        summary = attendance.get_summary(self.employee, 2025, 3)
+        self.assertEqual(
+            (summary.present_days, summary.late_count, summary.total_work_seconds),
+            (3, 1, (8 + 7 + 8) * 3600),
+        )
+        incremental = AttendanceMonthlySummary.objects.values_list(
+            "employee_id", "year", "month", "present_days", "total_work_seconds", "late_count"
+        )
+        expected = list(incremental)
+        self.assertEqual(attendance.rebuild_summaries(), 1)
+        self.assertEqual(list(incremental), expected)
+        self.assertEqual(attendance.attendance_rate(self.employee, 2025, 3), 3 / 21 * 100)
+
+    def test_overlapping_breaks_are_counted_once(self):
+        day = Attendance.objects.create(
+            employee=self.employee, date=date(2025, 3, 3), login_time=self.at(3, 9), logout_time=self.at(3, 17),
+        )
+        for start, end, duration in [
+            (self.at(3, 12), self.at(3, 13), 0),
+            (self.at(3, 12, 30), self.at(3, 13, 30), 0),  # overlaps the lunch break
+            (self.at(3, 15), None, 15 * 60),  # open, with a recorded duration
+            (self.at(3, 8), self.at(3, 9, 10), 0),  # starts before login
+            (self.at(3, 16, 50), None, 0),  # open until logout
+        ]:
+            Break.objects.create(attendance=day, start_time=start, end_time=end, duration_seconds=duration)
+        other = Attendance.objects.create(
+            employee=Employee.objects.create(user=User.objects.create(username="petra"), company=self.company),
+            date=date(2025, 3, 3), login_time=self.at(3, 9), logout_time=self.at(3, 10),
+        )
+
+        with self.assertNumQueries(2):
+            changed = attendance.compute_totals([day, other])
+        self.assertEqual(changed, [day, other])
+        day.refresh_from_db()
+        self.assertEqual(day.total_work_seconds, 8 * 3600 - (90 + 15 + 10 + 10) * 60)
+        self.assertEqual(day.compute_total(), day.total_work_seconds)
+        with self.assertNumQueries(1):
+            self.assertEqual(attendance.compute_totals([day, other]), [])
+
+
+class PunchCommandTests(TestCase):
+    def test_company_is_found_by_name_or_id(self):
+        company = Company.objects.create(name="Gate Co")
+        for value in ("Gate Co", str(company.pk)):
+            with self.subTest(value=value):
+                out = io.StringIO()
+                call_command("add_punch_device", "Gate 2", company=value, stdout=out)
+                self.assertIn("Authorization: Device ", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "not found"):
+            call_command("add_punch_device", "Gate 3", company="no-such-company")
+
+
+class DocumentTagTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Tag Co")
+        self.document = Document.objects.create(
+            company=self.company, title="Handbook", file="documents/handbook.pdf", tags=["policy", " hr ", "policy", ""],
+        )
+
+    def indexed(self):
+        return sorted(DocumentTag.objects.filter(document=self.document).values_list("tag", flat=True))
+
+    def test_index_follows_tag_edits(self):
+        self.assertEqual(self.indexed(), ["hr", "policy"])
+        self.document.tags = ["hr", "onboarding"]
+        self.document.save()
+        self.assertEqual(self.indexed(), ["hr", "onboarding"])
+        self.assertEqual(
+            list(tags.filter_by_tag(Document.objects.all(), "onboarding")), [self.document],
+        )
+        self.assertFalse(tags.filter_by_tag(Document.objects.all(), "policy").exists())
+
+    def test_soft_deleted_documents_leave_the_index(self):
+        Document.objects.create(company=self.company, title="Policy", file="documents/policy.pdf", tags=["policy"])
+        self.assertEqual(tags.tag_counts(self.company.pk), [
+            {"tag": "policy", "count": 2}, {"tag": "hr", "count": 1},
+        ])
+        self.document.delete()
+        self.assertEqual(self.indexed(), [])
+        self.assertEqual(tags.tag_counts(self.company.pk), [{"tag": "policy", "count": 1}])
+
+    def test_backfill_repairs_a_stale_index(self):
+        DocumentTag.objects.all().delete()
+        Document.objects.filter(pk=self.document.pk).update(tags=["legal"])
+        self.assertEqual(tags.backfill(self.company.pk), 1)
+        self.assertEqual(self.indexed(), ["legal"])
+
+
+class BundleTagTests(SimpleTestCase):
+    template = Template('{% load assets %}{% bundle "dev/js/profile.bundle.js" %}')
+
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        source = os.path.join(scratch.name, "source")
+        os.makedirs(os.path.join(source, "dev", "js"))
+        for name, code in [("main.js", "/* main */\nvar main = 1;\n"), ("profile.js", "// profile\nvar profile = 2;\n")]:
+            with open(os.path.join(source, "dev", "js", name), "w") as handle:
+                handle.write(code)
+        self.static_root = os.path.join(scratch.name, "static")
+        self.enterContext(override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.static_root, IMAGE_DERIVATIVE_STATIC_PREFIXES=[],
+            STATIC_BUNDLES={"dev/js/profile.bundle.js": ["dev/js/main.js", "dev/js/profile.js"]},
+        ))
+
+    def render(self, debug):
+        with override_settings(DEBUG=debug):
+            return self.template.render(Context())
+
+    def test_parts_are_loaded_one_by_one_in_debug_and_before_a_build(self):
+        parts = '<script src="/static/dev/js/main.js"></script>\n<script src="/static/dev/js/profile.js"></script>'
+        self.assertEqual(self.render(debug=False), parts)
+        call_command("build_assets", stdout=io.StringIO())
+        self.assertEqual(self.render(debug=True), parts)
+
+    def test_built_bundle_is_one_hashed_file(self):
+        call_command("build_assets", stdout=io.StringIO())
+        html = self.render(debug=False)
+        self.assertRegex(html, r'^<script src="/static/dev/js/profile\.bundle\.[0-9a-f]{12}\.js"></script>$')
+        with open(os.path.join(self.static_root, html.split('"')[1].removeprefix("/static/"))) as handle:
+            built = handle.read()
+        self.assertIn("main=1", built.replace(" ", ""))
+        self.assertIn("profile=2", built.replace(" ", ""))
+        self.assertNotIn("/* main */", built)
+
+
+class CsvExportTests(SimpleTestCase):
+    def test_formula_like_text_is_escaped(self):
+        values = [("=HYPERLINK(\"http://x\")", "+1", "-2", "@SUM(A1)", "\tx", "\rx", "a=b", -3, 4.5, None)]
+        data = b"".join(exports.csv_chunks("employees", values)).decode("utf-8-sig")
+        self.assertEqual(
+            list(csv.reader(io.StringIO(data)))[1],
+            ["'=HYPERLINK(\"http://x\")", "'+1", "'-2", "'@SUM(A1)", "'\tx", "'\rx", "a=b", "-3", "4.5", ""],
+        )
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        for i in range(11):
+            Task.objects.create(
+                title=f"Task {i}", priority=["low", "high"][i % 2],
+                due_date=None if i % 3 == 0 else today + timedelta(days=i % 4),
+            )
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Task.objects.all(), 3, ordering=("-priority", "due_date"), count_cap=5)
+        self.expected = list(
+            Task.objects.order_by(F("priority").desc(), F("due_date").asc(nulls_last=True), "-pk")
+            .values_list("pk", flat=True)
+        )
+
+    def pks(self, page):
+        return [task.pk for task in page]
+
+    def test_walking_forward_and_back_visits_every_row_once(self):
+        page, seen = self.paginator.get_page(), []
+        while True:
+            seen += self.pks(page)
+            if not page.has_next():
+                break
+            # The cursor survives the round trip through a URL.
+            page = self.paginator.get_page(page.next_cursor)
+        self.assertEqual(seen, self.expected)
+
+        page, seen = self.paginator.get_page(LAST), []
+        self.assertFalse(page.has_next())
+        while True:
+            seen = self.pks(page) + seen
+            if not page.has_previous():
+                break
+            page = self.paginator.get_page(page.previous_cursor)
+        self.assertEqual(seen, self.expected)
+
+    def test_last_page_links_back_to_the_rows_before_it(self):
+        last = self.paginator.get_page(LAST)
+        self.assertEqual(self.pks(last), self.expected[-3:])
+        before = self.paginator.get_page(last.previous_cursor)
+        self.assertEqual(self.pks(before), self.expected[-6:-3])
+        self.assertEqual(self.pks(self.paginator.get_page(before.next_cursor)), self.expected[-3:])
+
+    def test_invalid_cursor_falls_back_to_the_first_page(self):
+        self.assertEqual(self.pks(self.paginator.get_page("not-a-cursor")), self.expected[:3])
+
+    def test_json_counts_only_on_the_first_page(self):
+        first = json.loads(cursor_page_json(self.paginator.get_page(), lambda task: task.title).content)
+        self.assertEqual((first["count"], first["count_is_exact"]), (5, False))
+        second = json.loads(cursor_page_json(self.paginator.get_page(first["next_cursor"]), str).content)
+        self.assertNotIn("count", second)
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATES)
+class BenchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(
+            employees=40, years=1, tasks_per_employee=2, notifications_per_employee=2,
+            leaves_per_employee=1, articles=20, batch_size=1000, log=lambda message: None,
+        )
+
+    def test_every_benchmark_runs_on_a_small_seed(self):
+        results = bench.run(iterations=1, warmup=0)
+        self.assertEqual(sorted(results), sorted(bench.BENCHMARKS))
+        self.assertEqual(bench.errors(results), [])
+        self.assertEqual(bench.compare(results, {}), [])
+
+    def test_run_bench_fails_on_an_errored_benchmark_without_a_baseline(self):
+        with mock.patch.object(bench, "BENCHMARKS", {**bench.BENCHMARKS, "missing": ("bench_hr", "/dev/no-such-page/")}):
+            with self.assertRaisesMessage(CommandError, "missing: HTTP 404"):
+                call_command(
+                    "run_bench", only=["missing"], iterations=1, warmup=0,
+                    baseline="/nonexistent/bench_baseline.json", stdout=io.StringIO(),
+                )
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATES, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    # (user, url) for every view declaring a @query_budget.
+    BUDGETED = [
+        ("bench_employee", "/dev/tasks/"),
+        ("bench_manager", "/dev/manager/dashboard/"),
+        ("bench_hr", "/dev/hr/dashboard/"),
+        ("bench_hr", "/dev/hr/employees/"),
+        ("bench_hr", "/dev/hr/employees/?search=priya+nair"),
+        ("bench_employee", "/dev/api/employees/autocomplete/?q=pri"),
+        ("bench_employee", "/dev/documents/"),
+        ("bench_employee", "/dev/documents/?tag=policy"),
+        ("bench_employee", "/dev/tickets/"),
+        ("bench_hr", "/dev/tickets/"),
+        ("bench_employee", "/dev/notifications/"),
+        ("bench_manager", "/dev/manager/team-attendance/"),
+        ("bench_manager", "/dev/manager/approve-leaves/?status=all"),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(
+            employees=40, years=1, tasks_per_employee=4, notifications_per_employee=5,
+            leaves_per_employee=2, articles=20, batch_size=1000, log=lambda message: None,
+        )
+        employee = Employee.objects.select_related("company").get(user__username="bench_employee")
+        for i in range(20):
+            Document.objects.create(
+                company=employee.company, title=f"Document {i}", file=f"documents/{i}.pdf",
+                tags=["policy", "hr"] if i % 2 else ["handbook"],
+            )
+            Ticket.objects.create(
+                company=employee.company, title=f"Ticket {i}", reporter=employee.user,
+                status="open" if i % 3 else "resolved",
+            )
+
+    def get(self, username, url):
+        self.client.force_login(User.objects.get(username=username))
+        return self.client.get(url)
+
+    def test_budgeted_views_stay_within_budget(self):
+        for username, url in self.BUDGETED:
+            with self.subTest(url=url, user=username):
+                self.assertEqual(self.get(username, url).status_code, 200)
+
+    def test_exceeding_a_budget_fails_the_request(self):
+        with mock.patch.dict(views.my_tasks.query_budget, queries=1):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "my_tasks exceeded its query budget: queries"):
+                self.get("bench_employee", "/dev/tasks/")
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_exceeding_a_budget_only_warns_when_not_strict(self):
+        with mock.patch.dict(views.my_tasks.query_budget, queries=1):
+            with self.assertLogs("dev.instrumentation", "WARNING"):
+                self.assertEqual(self.get("bench_employee", "/dev/tasks/").status_code, 200)
+
+    def test_budgets_cover_get_and_head_only(self):
+        manager = Employee.objects.get(user__username="bench_manager")
+        leave = LeaveRequest.objects.filter(employee__manager=manager.user, status="pending").first()
+        self.client.force_login(manager.user)
+        with mock.patch.dict(views.approve_leaves.query_budget, queries=1):
+            response = self.client.post("/dev/manager/approve-leaves/", {"leave_id": leave.pk, "action": "approve"})
+        self.assertEqual(response.status_code, 302)
+
+    async def test_async_views_are_counted(self):
+        instrumentation.stats.reset()
+        await self.async_client.aforce_login(await User.objects.aget(username="bench_employee"))
+        self.assertEqual((await self.async_client.get("/dev/api/attendance/today/")).status_code, 200)
+        self.assertGreater(instrumentation.stats.snapshot()["attendance_today"]["queries"]["max"], 0)
+
+
+class EmployeeDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(
+            employees=5, years=1, tasks_per_employee=1, notifications_per_employee=1,
+            leaves_per_employee=1, articles=1, batch_size=1000, log=lambda message: None,
+        )
+        cls.user = User.objects.get(username="bench_employee")
+
+    def test_submitting_the_daily_report_refreshes_the_cached_dashboard(self):
+        self.client.force_login(self.user)
+        before = self.client.get("/dev/dashboard/")
+        self.assertFalse(before.context["daily_report_submitted"])
+        self.assertContains(before, "badge-mini danger")
+
+        self.client.post("/dev/daily-report/", {"tasks_done": "Reviewed the rota"})
+        after = self.client.get("/dev/dashboard/")
+        self.assertTrue(after.context["daily_report_submitted"])
+        self.assertNotContains(after, "badge-mini danger")
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATES)
+class ManagerDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(
+            employees=40, years=1, tasks_per_employee=1, notifications_per_employee=1,
+            leaves_per_employee=1, articles=5, batch_size=1000, log=lambda message: None,
+        )
+        cls.manager = User.objects.get(username="bench_manager")
+        cls.reports = list(
+            Employee.objects.filter(manager=cls.manager).select_related("user").order_by("employee_code")
+        )
+        # A second reporting level below the manager, and an inactive direct report.
+        cls.grandchild = Employee.objects.exclude(manager=cls.manager).filter(user__role="employee").first()
+        cls.grandchild.manager = cls.reports[0].user
+        cls.grandchild.save()
+        cls.inactive = cls.reports[1]
+        Employee.objects.filter(pk=cls.inactive.pk).update(is_active_employee=False)
+
+    def team(self, url):
+        self.client.force_login(self.manager)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {member.pk for member in response.context["team_members"]}
+
+    def test_team_is_active_reports_at_every_level(self):
+        team = self.team("/dev/manager/dashboard/")
+        self.assertIn(self.grandchild.pk, team)
+        self.assertNotIn(self.inactive.pk, team)
+        self.assertEqual(team, {report.pk for report in self.reports if report != self.inactive} | {self.grandchild.pk})
+
+    def test_depth_limits_the_team(self):
+        self.assertIn(self.grandchild.pk, self.team("/dev/manager/dashboard/"))
+        self.assertNotIn(self.grandchild.pk, self.team("/dev/manager/dashboard/?depth=1"))
+
+
+class RankedSearchTests(TestCase):
+    LIMIT = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Search Co")
+        # Private articles have the words in their title, so they outrank every public one.
+        for i in range(cls.LIMIT * 2):
+            KBArticle.objects.create(
+                company=cls.company, title=f"Leave policy {i}", slug=f"private-{i}", body="Internal.", is_public=False
+            )
+        for i in range(5):
+            KBArticle.objects.create(
+                company=cls.company, title=f"Handbook {i}", slug=f"public-{i}", body="See the leave policy.", is_public=True
+            )
+
+    def test_queryset_filters_apply_before_the_limit(self):
+        public = KBArticle.objects.filter(company=self.company, is_public=True)
+        found = search.ranked(public, "leave policy", company_id=self.company.pk, limit=self.LIMIT)
+        self.assertEqual(sorted(article.slug for article in found), [f"public-{i}" for i in range(5)])
+
+    def test_results_are_in_rank_order(self):
+        articles = KBArticle.objects.filter(company=self.company)
+        found = search.ranked(articles, "leave policy", company_id=self.company.pk, limit=self.LIMIT)
+        self.assertEqual(len(found), self.LIMIT)
+        self.assertTrue(all(article.slug.startswith("private-") for article in found))
+
+    def test_empty_queryset(self):
+        self.assertEqual(search.ranked(KBArticle.objects.none(), "leave policy"), [])
+
+
+class EmployeeSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Directory Co")
+        cls.sales, cls.support = (
+            Department.objects.create(company=cls.company, name=name) for name in ("Sales", "Support")
+        )
+        # More namesakes in Sales than the search takes candidates.
+        for i, department in enumerate([cls.sales] * 60 + [cls.support]):
+            user = User.objects.create(username=f"priya{i}", first_name="Priya", last_name="Nair")
+            Employee.objects.create(user=user, company=cls.company, department=department, employee_code=f"E{i:03d}")
+        employee_search.rebuild(cls.company.pk)
+
+    def test_queryset_filters_apply_before_the_candidate_limit(self):
+        support = Employee.objects.filter(company=self.company, department=self.support)
+        found = employee_search.search(support, "priya nair", self.company.pk)
+        self.assertEqual([employee.department_id for employee in found], [self.support.pk])
+
+    def test_empty_queryset(self):
+        self.assertEqual(employee_search.search(Employee.objects.none(), "priya nair", self.company.pk), [])
+
+
+class LiveUpdatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(
+            employees=5, years=1, tasks_per_employee=1, notifications_per_employee=1,
+            leaves_per_employee=1, articles=1, batch_size=1000, log=lambda message: None,
+        )
+        cls.user = User.objects.get(username="bench_employee")
+
+    def test_wsgi_pages_poll_counts_instead_of_streaming(self):
+        self.client.force_login(self.user)
+        page = self.client.get("/dev/tasks/")
+        self.assertContains(page, 'data-counts-url="/dev/api/notifications/counts/"')
+        self.assertNotContains(page, "data-events-url")
+        self.assertEqual(self.client.get("/dev/api/events/").status_code, 204)
+
+    async def test_asgi_pages_open_the_stream(self):
+        await self.async_client.aforce_login(self.user)
+        page = await self.async_client.get("/dev/tasks/")
+        self.assertContains(page, 'data-events-url="/dev/api/events/"')
+        self.assertNotContains(page, "data-counts-url")
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        bench.seed(
+            employees=5, years=1, tasks_per_employee=1, notifications_per_employee=1,
+            leaves_per_employee=1, articles=1, batch_size=1000, log=lambda message: None,
+        )
+        cls.user = User.objects.get(username="bench_employee")
+
+    def setUp(self):
+        fragment_cache._cache().clear()
+        self.client.force_login(self.user)
+
+    def user_menu(self):
+        html = self.client.get("/dev/tasks/").content.decode()
+        return html[html.index('class="user-name"'):].split("</span>", 1)[0]
+
+    def test_profile_save_refreshes_the_user_menu(self):
+        self.assertIn(self.user.get_full_name(), self.user_menu())
+        # Neither a write that skips the signals nor a login (last_login only) bumps the stamp.
+        User.objects.filter(pk=self.user.pk).update(first_name="Unseen")
+        self.client.force_login(self.user)
+        self.assertNotIn("Unseen", self.user_menu())
+
+        response = self.client.post("/dev/profile/", {"first_name": "Renamed", "last_name": "Person"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("Renamed Person", self.user_menu())
+
+    def test_fragments_of_other_users_stay_cached(self):
+        other = User.objects.get(username="bench_manager")
+        mine, theirs = (fragment_cache.make_key("user_menu", user=user.pk) for user in (self.user, other))
+        other.first_name = "Changed"
+        other.save()
+        self.assertEqual(fragment_cache.make_key("user_menu", user=self.user.pk), mine)
+        self.assertNotEqual(fragment_cache.make_key("user_menu", user=other.pk), theirs)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        previous = images.set_worker(images.SyncWorker())
+        self.addCleanup(images.set_worker, previous)
+        images._cache().clear()
+        fragment_cache._cache().clear()
+
+    def upload(self, name="users/avatars/a.png"):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 400), (200, 40, 40)).save(buffer, "PNG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_missing_index_is_cached(self):
+        with mock.patch.object(images, "_load_index", side_effect=OSError) as load:
+            self.assertIsNone(images.variants("users/avatars/a.png"))
+            self.assertIsNone(images.variants("users/avatars/a.png"))
+        self.assertEqual(load.call_count, 1)
+
+    def test_failed_job_is_not_queued_again(self):
+        name = self.upload()
+        with mock.patch.object(images, "generate", side_effect=ValueError("corrupt")) as generate:
+            with self.assertLogs("dev.images", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+                images.ensure(name, "avatar")
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                images.ensure(name, "avatar")
+        self.assertEqual(callbacks, [])
+        self.assertEqual(generate.call_count, 1)
+
+    def test_picture_in_a_cached_fragment_refreshes_it(self):
+        avatar = User(avatar=self.upload()).avatar
+        template = Template(
+            '{% load fragment_cache images %}'
+            '{% fragment "user_menu" user=7 %}{% picture avatar "avatar" sizes="32px" %}{% endfragment %}'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            first = template.render(Context({"avatar": avatar}))
+        self.assertNotIn("<picture>", first)
+        self.assertIn("<picture>", template.render(Context({"avatar": avatar})))
+
+
+class ReadConnectionRouterTests(SimpleTestCase):
+    reader = {**connections.settings[DEFAULT_DB_ALIAS], "NAME": "file:db.sqlite3?mode=ro"}
+
+    def setUp(self):
+        self.router = database.ReadConnectionRouter()
+
+    def test_reads_use_the_reader_outside_transactions(self):
+        self.assertIsNone(self.router.db_for_read(Employee), "no reader configured")
+        with mock.patch.dict(connections.settings, {database.READ_ALIAS: self.reader}):
+            self.assertEqual(self.router.db_for_read(Employee), database.READ_ALIAS)
+            with mock.patch.object(connections[DEFAULT_DB_ALIAS], "in_atomic_block", True):
+                self.assertIsNone(self.router.db_for_read(Employee), "reads inside a transaction see its writes")
+            self.assertEqual(self.router.db_for_write(Employee), DEFAULT_DB_ALIAS)
+            self.assertFalse(self.router.allow_migrate(database.READ_ALIAS, "dev"))
+            self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, "dev"))
+
+    def test_read_only_connections_skip_file_pragmas(self):
+        cursor = mock.Mock()
+        database.apply_pragmas(cursor, {"journal_mode": "WAL", "busy_timeout": 5000}, read_only=True)
+        cursor.execute.assert_called_once_with("PRAGMA busy_timeout=5000")
+
+
+@override_settings(TEMPLATES=PAGE_TEMPLATES, REPLICA_STICKY_SECONDS=0.5)
+class ReplicaRoutingTests(TransactionTestCase):
+    """The primary (the test database) and a replica in a second SQLite file, synced with sync_replica."""
+
+    # The replica alias exists only while this class runs (settings configure it from
+    # DB_REPLICA_NAME), so the runner creates no test database for it.
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings[database.REPLICA_ALIAS] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "NAME": os.path.join(cls.replica_dir.name, "replica.sqlite3"),
+        }
+        cls.databases = {DEFAULT_DB_ALIAS, database.REPLICA_ALIAS}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[database.REPLICA_ALIAS].close()
+        del connections[database.REPLICA_ALIAS]
+        del connections.settings[database.REPLICA_ALIAS]
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        previous = notifier.set_dispatcher(notifier.SyncDispatcher())
+        self.addCleanup(notifier.set_dispatcher, previous)
+        bench.seed(
+            employees=10, years=1, tasks_per_employee=1, notifications_per_employee=1,
+            leaves_per_employee=1, articles=1, batch_size=1000, log=lambda message: None,
+        )
+        database.sync_replica()
+        # Logged in after the sync: the sessions exist only on the primary.
+        self.manager, self.hr = self.client_class(), self.client_class()
+        self.manager.force_login(User.objects.get(username="bench_manager"))
+        self.hr.force_login(User.objects.get(username="bench_hr"))
+
+    def served_by(self, client, method, url, data=None):
+        """(response, queries on the primary, queries on the replica)."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[database.REPLICA_ALIAS]) as replica:
+            response = getattr(client, method)(url, data)
+        return response, primary.captured_queries, replica.captured_queries
+
+    def test_reporting_views_read_from_the_replica(self):
+        for client, url in [
+            (self.hr, "/dev/hr/dashboard/"),
+            (self.hr, "/dev/hr/employees/"),
+            (self.manager, "/dev/manager/approve-leaves/"),
+        ]:
+            with self.subTest(url=url):
+                response, _, replica = self.served_by(client, "get", url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(replica)
+                self.assertFalse([query for query in replica if "django_session" in query["sql"]])
+
+    def test_sessions_are_never_read_from_the_replica(self):
+        store = SessionStore(self.hr.session.session_key)
+        with CaptureQueriesContext(connections[database.REPLICA_ALIAS]) as replica, database.replica_reads():
+            self.assertEqual(store.get("_auth_user_id"), str(User.objects.get(username="bench_hr").pk))
+        self.assertFalse([query for query in replica if "django_session" in query["sql"]])
+
+    def test_post_stays_on_the_primary(self):
+        manager = Employee.objects.get(user__username="bench_manager")
+        report = Employee.objects.filter(manager=manager.user).first()
+        leave = LeaveRequest.objects.create(
+            employee=report, leave_type=LeaveType.objects.filter(company=manager.company).first(),
+            start_date=timezone.localdate(), end_date=timezone.localdate(), days=1,
+        )
+        response, primary, replica = self.served_by(
+            self.manager, "post", "/dev/manager/approve-leaves/", {"leave_id": leave.pk, "action": "approve"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(replica, [])
+        leave.refresh_from_db()
+        self.assertEqual(leave.status, "approved")
+
+    def test_writer_reads_its_writes_until_the_pin_expires(self):
+        url = "/dev/manager/approve-leaves/"
+        self.served_by(self.hr, "post", "/dev/notifications/", {"action": "mark_all_read"})
+
+        _, _, replica = self.served_by(self.hr, "get", "/dev/hr/employees/")
+        self.assertEqual(replica, [])
+        _, _, replica = self.served_by(self.manager, "get", url)
+        self.assertTrue(replica, "users who did not write stay on the replica")
+
+        time.sleep(0.6)
+        _, _, replica = self.served_by(self.hr, "get", "/dev/hr/employees/")
+        self.assertTrue(replica)
@@ -20,6 +20,7 @@ urlpatterns = [
     # HR URLs
     path('hr/dashboard/', views.hr_dashboard, name='hr_dashboard'),
     path('hr/employees/', views.all_employees, name='all_employees'),
+    path('hr/export/<str:dataset>.<str:fmt>', views.export_records, name='export_records'),
     
     # Profile & Settings
     path('profile/', views.profile, name='profile'),
@@ -40,4 +41,10 @@ urlpatterns = [
     # API Endpoints
     path('api/attendance/login/', views.attendance_login, name='attendance_login'),
     path('api/attendance/logout/', views.attendance_logout, name='attendance_logout'),
+    path('api/attendance/punches/', views.attendance_punches, name='attendance_punches'),
+    path('api/employees/autocomplete/', views.employee_autocomplete, name='employee_autocomplete'),
+    path('api/metrics/queries/', views.query_stats, name='query_stats'),
+    path('api/events/', views.event_stream, name='event_stream'),
+    path('api/notifications/counts/', views.notification_counts, name='notification_counts'),
+    path('api/attendance/today/', views.attendance_today, name='attendance_today'),
 ]
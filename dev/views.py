@@ -1,12 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponseForbidden
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.db.models import Q
 from django.core.paginator import Paginator
 from django.utils import timezone
 from .models import *
+from . import aggregates, attendance as attendance_summary, dashboard_cache, employee_search, events, exports, hierarchy, instrumentation, notifications as notifier, search, tags
+from .database import replica_view
+from .idempotency import idempotent
+from .instrumentation import query_budget
+from .pagination import LAST, CursorPaginator, cursor_page_json, single_page
+from .punches import PunchFormatError, authenticate_device, ingest_punches, parse_punches
+from .team import TeamLoader
 from datetime import datetime, timedelta
 
 
@@ -36,71 +46,26 @@ def employee_logout(request):
     logout(request)
     return redirect("employee_login")
 
-@login_required
-def employee_dashboard(request):
-    """Main dashboard view for employees"""
-    user = request.user
-    
-    try:
-        employee = user.employee_profile
-    except:
-        return redirect('employee_login')
-    
-
-    today = timezone.now().date()
-    current_month = today.month
-    current_year = today.year
-    
-
-    attendance_today = Attendance.objects.filter(
-        employee=employee,
-        date=today
-    ).first()
-    
-    monthly_attendance = Attendance.objects.filter(
-        employee=employee,
-        date__month=current_month,
-        date__year=current_year
-    )
-    
-    attendance_stats = {
-        'present_days': monthly_attendance.filter(login_time__isnull=False).count(),
-        'total_working_days': 22, 
-        'logged_in_today': attendance_today and attendance_today.login_time,
-        'today_login_time': attendance_today.login_time if attendance_today else None,
-        'today_logout_time': attendance_today.logout_time if attendance_today else None,
-    }
+def _employee_dashboard_context(user, employee, today):
+    """Build the (cacheable) context for employee_dashboard"""
+    attendance_stats = aggregates.attendance_stats(employee, today)
+    attendance_stats.update({
+        'total_working_days': attendance_summary.working_days(employee.company_id, today.year, today.month),
+        'logged_in_today': attendance_stats['today_login_time'] is not None,
+    })
 
-    leave_stats = {
-        'pending': LeaveRequest.objects.filter(employee=employee, status='pending').count(),
-        'approved_this_month': LeaveRequest.objects.filter(
-            employee=employee,
-            status='approved',
-            start_date__month=current_month
-        ).count(),
-        'total_available': 20, 
-    }
+    leave_stats = aggregates.leave_stats(employee, today)
+    leave_stats['total_available'] = 20
 
-    my_tasks = Task.objects.filter(assignee=user)
-    task_stats = {
-        'todo': my_tasks.filter(status='todo').count(),
-        'in_progress': my_tasks.filter(status='in_progress').count(),
-        'completed_this_week': my_tasks.filter(
-            status='done',
-            updated_at__gte=today - timedelta(days=7)
-        ).count(),
-        'overdue': my_tasks.filter(
-            due_date__lt=today,
-            status__in=['todo', 'in_progress']
-        ).count(),
-    }
+    task_stats = aggregates.task_stats(user, today)
 
+    my_tasks = Task.objects.filter(assignee=user).select_related('project')
     recent_tasks = my_tasks.order_by('-updated_at')[:5]
 
-    notifications = Notification.objects.filter(
+    notifications = notifier.visible(Notification.objects.filter(
         recipient=user,
         is_read=False
-    ).order_by('-created_at')[:5]
+    )).order_by('-created_at')[:5]
     
     upcoming_events = CalendarEvent.objects.filter(
         Q(organizer=user) | Q(attendees=user),
@@ -132,11 +97,33 @@ def employee_dashboard(request):
         'recent_announcements': recent_announcements,
         'today': today,
     }
+
+    return context
+
+
+@login_required
+def employee_dashboard(request):
+    """Main dashboard view for employees"""
+    user = request.user
+    
+    try:
+        employee = user.employee_profile
+    except:
+        return redirect('employee_login')
+    
+
+    today = timezone.now().date()
+    context = dashboard_cache.get_or_build(
+        'employee', user.pk, employee.company_id,
+        lambda: _employee_dashboard_context(user, employee, today),
+        today.isoformat(),
+    )
     
     return render(request, 'dashboard.html', context)
 
 
 @login_required
+@query_budget(queries=8, repeated=3)
 def my_tasks(request):
     """Tasks list view"""
     user = request.user
@@ -144,7 +131,7 @@ def my_tasks(request):
     status_filter = request.GET.get('status', 'all')
     priority_filter = request.GET.get('priority', 'all')
     
-    tasks = Task.objects.filter(assignee=user)
+    tasks = Task.objects.filter(assignee=user).select_related('project', 'assignee')
     
     if status_filter != 'all':
         tasks = tasks.filter(status=status_filter)
@@ -152,14 +139,21 @@ def my_tasks(request):
     if priority_filter != 'all':
         tasks = tasks.filter(priority=priority_filter)
     
-    tasks = tasks.order_by('-priority', 'due_date')
+    paginator = CursorPaginator(tasks, 20, ordering=('-priority', 'due_date'), count_cap=1000)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
-    paginator = Paginator(tasks, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if request.GET.get('format') == 'json':
+        return cursor_page_json(page_obj, lambda task: {
+            'id': str(task.id),
+            'title': task.title,
+            'status': task.status,
+            'priority': task.priority,
+            'due_date': task.due_date,
+        })
     
     context = {
         'page_obj': page_obj,
+        'last_cursor': LAST,
         'status_filter': status_filter,
         'priority_filter': priority_filter,
     }
@@ -172,19 +166,26 @@ def my_attendance(request):
     """Attendance history view"""
     employee = request.user.employee_profile
     
-    month = request.GET.get('month', timezone.now().month)
-    year = request.GET.get('year', timezone.now().year)
+    try:
+        month = int(request.GET.get('month', timezone.now().month))
+        year = int(request.GET.get('year', timezone.now().year))
+        first_day, last_day = attendance_summary.month_bounds(year, month)
+    except ValueError:
+        month, year = timezone.now().month, timezone.now().year
+        first_day, last_day = attendance_summary.month_bounds(year, month)
     
     attendances = Attendance.objects.filter(
         employee=employee,
-        date__month=month,
-        date__year=year
+        date__gte=first_day,
+        date__lte=last_day
     ).order_by('-date')
     
     context = {
         'attendances': attendances,
         'month': month,
         'year': year,
+        'summary': attendance_summary.get_summary(employee, year, month),
+        'total_working_days': attendance_summary.working_days(employee.company_id, year, month),
     }
     
     return render(request, 'attendance.html', context)
@@ -245,7 +246,34 @@ def submit_daily_report(request):
     
     return render(request, 'daily_report.html')
 
+def _max_depth(request):
+    """Optional ?depth= limit on how many reporting levels a manager view covers"""
+    try:
+        depth = int(request.GET.get('depth', ''))
+    except ValueError:
+        return None
+    return depth if depth > 0 else None
+
+
+def _manager_dashboard_context(user, employee, max_depth):
+    """Build the (cacheable) context for manager_dashboard"""
+    team = TeamLoader.for_user(user, employee, max_depth)
+    today = timezone.now().date()
+    
+    context = {
+        'team_members': team.members,
+        'team_attendance': list(team.attendance_on(today).values()),
+        'pending_leaves': team.pending_leaves,
+        'task_counts': team.task_counts,
+        'team_rows': team.member_rows(today),
+        'org_levels': hierarchy.level_counts(user, max_depth),
+    }
+
+    return context
+
+
 @login_required
+@query_budget(queries=10, repeated=3)
 def manager_dashboard(request):
     """Dashboard for managers"""
     user = request.user
@@ -253,58 +281,82 @@ def manager_dashboard(request):
     if user.role not in ['manager', 'admin', 'hr']:
         return redirect('employee_dashboard')
     
-    team_members = Employee.objects.filter(manager=user)
-    today = timezone.now().date()
-    team_attendance = Attendance.objects.filter(
-        employee__in=team_members,
-        date=today
-    )
-    pending_leaves = LeaveRequest.objects.filter(
-        employee__in=team_members,
-        status='pending'
-    )
-    team_tasks = Task.objects.filter(assignee__in=[tm.user for tm in team_members])
+    try:
+        employee = user.employee_profile
+    except:
+        return redirect('employee_dashboard')
     
-    context = {
-        'team_members': team_members,
-        'team_attendance': team_attendance,
-        'pending_leaves': pending_leaves,
-        'team_tasks': team_tasks,
-    }
+    max_depth = _max_depth(request)
+    # HR and admin see the whole company, so company-wide changes must expire their entry too.
+    context = dashboard_cache.get_or_build(
+        'manager', user.pk, None if user.role == 'manager' else employee.company_id,
+        lambda: _manager_dashboard_context(user, employee, max_depth),
+        timezone.now().date().isoformat(), max_depth,
+    )
     
     return render(request, 'manager_dashboard.html', context)
 
-@login_required
-def hr_dashboard(request):
-    """Dashboard for HR"""
-    user = request.user
-    
-    if user.role not in ['hr', 'admin']:
-        return redirect('employee_dashboard')
-    
-    company = user.employee_profile.company
-    
+def _hr_dashboard_context(company):
+    """Build the (cacheable) context for hr_dashboard"""
     total_employees = Employee.objects.filter(company=company, is_active_employee=True).count()
     
     recent_hires = Employee.objects.filter(
         company=company,
         date_of_joining__gte=timezone.now().date() - timedelta(days=30)
-    )
+    ).select_related('user', 'designation')
     
     all_leave_requests = LeaveRequest.objects.filter(
         employee__company=company
-    ).order_by('-created_at')[:10]
+    ).select_related('employee__user', 'leave_type').order_by('-created_at')[:10]
     
     context = {
         'total_employees': total_employees,
         'recent_hires': recent_hires,
         'all_leave_requests': all_leave_requests,
     }
+
+    return context
+
+
+@login_required
+@query_budget(queries=10, repeated=3)
+@replica_view
+def hr_dashboard(request):
+    """Dashboard for HR"""
+    user = request.user
+    
+    if user.role not in ['hr', 'admin']:
+        return redirect('employee_dashboard')
+    
+    company = user.employee_profile.company
+    
+    context = dashboard_cache.get_or_build(
+        'hr', user.pk, company.pk,
+        lambda: _hr_dashboard_context(company),
+        timezone.now().date().isoformat(),
+    )
     
     return render(request, 'hr_dashboard.html', context)
 
 
+def _employee_json(employee):
+    """Directory entry for JSON responses"""
+    data = {
+        'id': str(employee.id),
+        'employee_code': employee.employee_code,
+        'name': employee.user.get_full_name(),
+        'email': employee.user.email,
+        'department': employee.department.name if employee.department else None,
+        'designation': employee.designation.title if employee.designation else None,
+    }
+    if hasattr(employee, 'search_score'):
+        data['score'] = round(employee.search_score, 3)
+    return data
+
+
 @login_required
+@query_budget(queries=16, repeated=3)
+@replica_view
 def all_employees(request):
     """Complete employee directory with filters and search"""
     user = request.user
@@ -334,38 +386,37 @@ def all_employees(request):
         employees = employees.filter(is_active_employee=False)
     
     if search_query:
-        employees = employees.filter(
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(user__email__icontains=search_query) |
-            Q(employee_code__icontains=search_query)
-        )
-
-    employees = employees.order_by('-created_at')
+        # Ranked fuzzy matches fit on one page.
+        page_obj = single_page(employee_search.search(employees, search_query, company.pk, limit=50))
+    else:
+        paginator = CursorPaginator(employees, 20, ordering=('-created_at',))
+        page_obj = paginator.get_page(request.GET.get('cursor'))
     
-    paginator = Paginator(employees, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if request.GET.get('format') == 'json':
+        return cursor_page_json(page_obj, _employee_json)
     
     departments = Department.objects.filter(company=company)
     
-    stats = {
-        'total_employees': Employee.objects.filter(company=company, is_active_employee=True).count(),
-        'new_this_month': Employee.objects.filter(
-            company=company,
+    stats = aggregates.aggregate_counts(
+        Employee.objects.filter(company=company),
+        total_employees=Q(is_active_employee=True),
+        new_this_month=Q(
             date_of_joining__month=timezone.now().month,
             date_of_joining__year=timezone.now().year
-        ).count(),
+        ),
+    )
+    stats.update({
         'on_leave_today': LeaveRequest.objects.filter(
             employee__company=company,
             status='approved',
             start_date__lte=timezone.now().date(),
             end_date__gte=timezone.now().date()
         ).count(),
-    }
+    })
     
     context = {
         'page_obj': page_obj,
+        'last_cursor': LAST,
         'departments': departments,
         'department_filter': department_filter,
         'status_filter': status_filter,
@@ -376,6 +427,65 @@ def all_employees(request):
     return render(request, 'all_employees.html', context)
 
 
+@login_required
+@replica_view
+def export_records(request, dataset, fmt):
+    """Streamed CSV/XLSX download of the company's employees, attendance or leave requests"""
+    user = request.user
+    if user.role not in ['hr', 'admin']:
+        return HttpResponseForbidden("You don't have permission to access this page.")
+    
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        return JsonResponse({'success': False, 'error': 'Unknown export'}, status=404)
+    
+    try:
+        company = user.employee_profile.company
+    except:
+        return redirect('employee_dashboard')
+    
+    try:
+        start = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if request.GET.get('from') else None
+        end = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    
+    records = exports.queryset(dataset, company.pk, start, end)
+    status_filter = request.GET.get('status', '')
+    if dataset == 'leaves' and status_filter:
+        records = records.filter(status=status_filter)
+    elif dataset == 'employees' and status_filter in ('active', 'inactive'):
+        records = records.filter(is_active_employee=status_filter == 'active')
+    
+    return exports.response(dataset, records, fmt, asynchronous=isinstance(request, ASGIRequest))
+
+
+@login_required
+@query_budget(queries=12, repeated=3)
+def employee_autocomplete(request):
+    """Ranked fuzzy employee lookup for autocomplete widgets"""
+    user = request.user
+    
+    try:
+        company = user.employee_profile.company
+    except:
+        return JsonResponse({'success': False, 'error': 'Employee profile not found'})
+    
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    
+    employees = Employee.objects.filter(
+        company=company,
+        is_active_employee=True
+    ).select_related('user', 'department', 'designation')
+    
+    results = employee_search.search(employees, query, company.pk, limit=limit)
+    
+    return JsonResponse({'success': True, 'results': [_employee_json(employee) for employee in results]})
+
+
 
 
 @login_required
@@ -477,6 +587,7 @@ def settings(request):
 
 
 @login_required
+@query_budget(queries=10, repeated=3)
 def documents(request):
     """Company documents and employee documents"""
     user = request.user
@@ -490,31 +601,33 @@ def documents(request):
     company_documents = Document.objects.filter(
         company=company,
         is_deleted=False
-    ).order_by('-created_at')
+    )
     
     tag_filter = request.GET.get('tag', '')
     if tag_filter:
-        company_documents = company_documents.filter(tags__contains=[tag_filter])
+        company_documents = tags.filter_by_tag(company_documents, tag_filter)
 
     search_query = request.GET.get('search', '')
     if search_query:
-        company_documents = company_documents.filter(
-            Q(title__icontains=search_query)
-        )
+        company_documents = search.matching(company_documents, search_query, company_id=company.pk)
 
-    paginator = Paginator(company_documents, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(company_documents, 15, ordering=('-created_at',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
-    all_tags = []
-    for doc in Document.objects.filter(company=company):
-        if doc.tags:
-            all_tags.extend(doc.tags)
-    unique_tags = list(set(all_tags))
+    if request.GET.get('format') == 'json':
+        return cursor_page_json(page_obj, lambda doc: {
+            'id': str(doc.id),
+            'title': doc.title,
+            'tags': doc.tags,
+            'created_at': doc.created_at,
+        })
+
+    tag_facets = tags.tag_counts(company.pk)
     
     context = {
         'page_obj': page_obj,
-        'unique_tags': unique_tags,
+        'tag_facets': tag_facets,
+        'unique_tags': [facet['tag'] for facet in tag_facets],
         'tag_filter': tag_filter,
         'search_query': search_query,
     }
@@ -543,12 +656,9 @@ def knowledgebase(request):
     
     search_query = request.GET.get('search', '')
     if search_query:
-        articles = articles.filter(
-            Q(title__icontains=search_query) |
-            Q(body__icontains=search_query)
-        )
-    
-    articles = articles.order_by('-created_at')
+        articles = search.ranked(articles, search_query, company_id=company.pk)
+    else:
+        articles = articles.order_by('-created_at')
 
     paginator = Paginator(articles, 12)
     page_number = request.GET.get('page')
@@ -588,12 +698,13 @@ def training(request):
     enrolled_course_ids = my_enrollments.values_list('course_id', flat=True)
     available_courses = all_courses.exclude(id__in=enrolled_course_ids)
     
-    stats = {
-        'total_courses': all_courses.count(),
-        'enrolled': my_enrollments.count(),
-        'completed': my_enrollments.filter(status='completed').count(),
-        'in_progress': my_enrollments.filter(status='enrolled').count(),
-    }
+    stats = aggregates.aggregate_counts(
+        my_enrollments,
+        enrolled=Q(),
+        completed=Q(status='completed'),
+        in_progress=Q(status='enrolled'),
+    )
+    stats['total_courses'] = all_courses.count()
     
     context = {
         'my_enrollments': my_enrollments,
@@ -605,6 +716,7 @@ def training(request):
 
 
 @login_required
+@query_budget(queries=10, repeated=3)
 def tickets(request):
     """Support tickets system"""
     user = request.user
@@ -645,22 +757,22 @@ def tickets(request):
     if status_filter != 'all':
         tickets_list = tickets_list.filter(status=status_filter)
     
-    tickets_list = tickets_list.order_by('-created_at')
+    paginator = CursorPaginator(tickets_list, 15, ordering=('-created_at',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
-    paginator = Paginator(tickets_list, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    stats = {
-        'open': Ticket.objects.filter(reporter=user, status='open').count(),
-        'in_progress': Ticket.objects.filter(reporter=user, status='in_progress').count(),
-        'resolved': Ticket.objects.filter(reporter=user, status='resolved').count(),
-    }
+    if request.GET.get('format') == 'json':
+        return cursor_page_json(page_obj, lambda ticket: {
+            'id': str(ticket.id),
+            'title': ticket.title,
+            'status': ticket.status,
+            'priority': ticket.priority,
+            'created_at': ticket.created_at,
+        })
     
     context = {
         'page_obj': page_obj,
         'status_filter': status_filter,
-        'stats': stats,
+        'stats': aggregates.ticket_stats(user),
     }
     
     return render(request, 'employees/tickets.html', context)
@@ -710,6 +822,7 @@ def help_center(request):
 
 
 @login_required
+@query_budget(queries=8, repeated=3)
 def all_notifications(request):
     """All notifications page"""
     user = request.user
@@ -717,146 +830,210 @@ def all_notifications(request):
     if request.method == 'POST':
         action = request.POST.get('action')
         if action == 'mark_all_read':
-            Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+            notifier.mark_read(user)
             messages.success(request, 'All notifications marked as read!')
             return redirect('all_notifications')
         elif action == 'mark_read':
             notif_id = request.POST.get('notification_id')
-            Notification.objects.filter(id=notif_id, recipient=user).update(is_read=True)
+            notifier.mark_read(user, [notif_id])
             return JsonResponse({'success': True})
     
     filter_type = request.GET.get('type', 'all')
     
-    notifications = Notification.objects.filter(recipient=user)
+    notifications = notifier.visible(Notification.objects.filter(recipient=user))
     
     if filter_type == 'unread':
         notifications = notifications.filter(is_read=False)
     elif filter_type != 'all':
         notifications = notifications.filter(notif_type=filter_type)
     
-    notifications = notifications.order_by('-created_at')
-
-    paginator = Paginator(notifications, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    stats = {
-        'total': Notification.objects.filter(recipient=user).count(),
-        'unread': Notification.objects.filter(recipient=user, is_read=False).count(),
-        'info': Notification.objects.filter(recipient=user, notif_type='info').count(),
-        'alert': Notification.objects.filter(recipient=user, notif_type='alert').count(),
-    }
+    paginator = CursorPaginator(notifications, 20, ordering=('-created_at',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    if request.GET.get('format') == 'json':
+        return cursor_page_json(page_obj, lambda notif: {
+            'id': str(notif.id),
+            'title': notif.title,
+            'body': notif.body,
+            'notif_type': notif.notif_type,
+            'is_read': notif.is_read,
+            'created_at': notif.created_at,
+        })
     
     context = {
         'page_obj': page_obj,
         'filter_type': filter_type,
-        'stats': stats,
+        'stats': notifier.counts(user.pk),
     }
     
     return render(request, 'notifications.html', context)
 
 
 @login_required
-def attendance_login(request):
+@idempotent
+async def attendance_login(request):
     """API endpoint for attendance login"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Invalid method'})
     
-    user = request.user
-    
-    try:
-        employee = user.employee_profile
-    except:
+    user = await request.auser()
+    employee = await Employee.objects.filter(user=user).only('pk', 'user_id').afirst()
+    if employee is None:
         return JsonResponse({'success': False, 'error': 'Employee profile not found'})
     
-    today = timezone.now().date()
-
-    attendance = Attendance.objects.filter(employee=employee, date=today).first()
+    attendance, recorded = await attendance_summary.apunch_in(employee, created_by=user)
     
-    if attendance and attendance.login_time:
+    if not recorded:
         return JsonResponse({
             'success': False,
             'error': 'Already logged in today',
-            'login_time': attendance.login_time.strftime('%I:%M %p')
+            'login_time': timezone.localtime(attendance.login_time).strftime('%I:%M %p')
         })
-
-    if not attendance:
-        attendance = Attendance.objects.create(
-            employee=employee,
-            date=today,
-            login_time=timezone.now(),
-            created_by=user
-        )
-    else:
-        attendance.login_time = timezone.now()
-        attendance.save()
-
-    Notification.objects.create(
-        recipient=user,
-        title='Attendance Logged',
-        body=f'You have successfully logged in at {timezone.now().strftime("%I:%M %p")}',
-        notif_type='info'
-    )
     
     return JsonResponse({
         'success': True,
         'message': 'Login recorded successfully',
-        'login_time': attendance.login_time.strftime('%I:%M %p')
+        'login_time': timezone.localtime(attendance.login_time).strftime('%I:%M %p')
     })
 
 
 @login_required
-def attendance_logout(request):
+@idempotent
+async def attendance_logout(request):
     """API endpoint for attendance logout"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Invalid method'})
     
-    user = request.user
-    
-    try:
-        employee = user.employee_profile
-    except:
+    user = await request.auser()
+    employee = await Employee.objects.filter(user=user).only('pk', 'user_id').afirst()
+    if employee is None:
         return JsonResponse({'success': False, 'error': 'Employee profile not found'})
     
-    today = timezone.now().date()
-
-    attendance = Attendance.objects.filter(employee=employee, date=today).first()
+    attendance, recorded = await attendance_summary.apunch_out(employee)
     
-    if not attendance or not attendance.login_time:
+    if attendance is None or not attendance.login_time:
         return JsonResponse({
             'success': False,
             'error': 'You must login first'
         })
     
-    if attendance.logout_time:
+    if not recorded:
         return JsonResponse({
             'success': False,
             'error': 'Already logged out today',
-            'logout_time': attendance.logout_time.strftime('%I:%M %p')
+            'logout_time': timezone.localtime(attendance.logout_time).strftime('%I:%M %p')
         })
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Logout recorded successfully',
+        'logout_time': timezone.localtime(attendance.logout_time).strftime('%I:%M %p'),
+        'total_hours': f'{attendance.total_work_seconds / 3600:.2f}'
+    })
+
+@csrf_exempt
+def attendance_punches(request):
+    """API endpoint for batched biometric punches (NDJSON or CSV body)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'})
+    
+    # Gateways authenticate with a device token; browser uploads go through the session (and CSRF).
+    if 'Authorization' not in request.headers:
+        return _session_punches(request)
+    
+    device = authenticate_device(request.headers['Authorization'])
+    if device is None:
+        return JsonResponse({'success': False, 'error': 'Invalid device token'}, status=401)
+    
+    return _ingest_punch_request(request, device.company)
 
-    attendance.logout_time = timezone.now()
 
-    time_diff = attendance.logout_time - attendance.login_time
-    attendance.total_work_seconds = int(time_diff.total_seconds())
-    attendance.save()
+@csrf_protect
+@login_required
+def _session_punches(request):
+    user = request.user
     
-    work_hours = attendance.total_work_seconds / 3600
-    Notification.objects.create(
-        recipient=user,
-        title='Attendance Logged Out',
-        body=f'You have logged out at {timezone.now().strftime("%I:%M %p")}. Total work time: {work_hours:.2f} hours',
-        notif_type='info'
-    )
+    if user.role not in ['hr', 'admin'] and not user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    try:
+        company = user.employee_profile.company
+    except:
+        return JsonResponse({'success': False, 'error': 'Employee profile not found'})
+    
+    return _ingest_punch_request(request, company)
+
+
+def _ingest_punch_request(request, company):
+    fmt = request.GET.get('format') or ('csv' if request.content_type == 'text/csv' else 'ndjson')
+    
+    try:
+        stats = ingest_punches(
+            company,
+            parse_punches(request, fmt),
+            notify=request.GET.get('notify', '1') != '0',
+        )
+    except PunchFormatError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    
+    return JsonResponse({'success': True, **stats})
+
+
+@login_required
+async def event_stream(request):
+    """Server-sent events (notifications, attendance, leave decisions) for the current user"""
+    if not isinstance(request, ASGIRequest):
+        # A stream would hold a WSGI worker thread open; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    hello = {'notifications': await sync_to_async(notifier.counts)(user.pk)}
+    
+    response = StreamingHttpResponse(events.stream(user.pk, hello), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+async def notification_counts(request):
+    """API endpoint for the notification badge counters"""
+    user = await request.auser()
+    counts = await sync_to_async(notifier.counts)(user.pk)
+    return JsonResponse({'success': True, **counts})
+
+@login_required
+async def attendance_today(request):
+    """API endpoint for the current user's attendance today"""
+    user = await request.auser()
+    today = timezone.now().date()
+    record = await Attendance.objects.filter(employee__user=user, date=today).values(
+        'login_time', 'logout_time', 'total_work_seconds'
+    ).afirst()
     
     return JsonResponse({
         'success': True,
-        'message': 'Logout recorded successfully',
-        'logout_time': attendance.logout_time.strftime('%I:%M %p'),
-        'total_hours': f'{work_hours:.2f}'
+        'date': today,
+        'logged_in': bool(record and record['login_time']),
+        'login_time': record['login_time'] if record else None,
+        'logout_time': record['logout_time'] if record else None,
+        'total_work_seconds': record['total_work_seconds'] if record else 0,
     })
 
+
+@login_required
+def query_stats(request):
+    """Staff-only per-view query counts and latency (POST clears them)"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    if request.method == 'POST':
+        instrumentation.stats.reset()
+    
+    return JsonResponse({'success': True, 'views': instrumentation.stats.snapshot()})
+
 @login_required
+@query_budget(queries=10, repeated=3)
+@replica_view
 def team_attendance(request):
     """Manager view for team attendance"""
     user = request.user
@@ -869,10 +1046,7 @@ def team_attendance(request):
     except:
         return redirect('employee_dashboard')
     
-    if user.role == 'manager':
-        team_members = Employee.objects.filter(manager=user, is_active_employee=True)
-    else:
-        team_members = Employee.objects.filter(company=employee.company, is_active_employee=True)
+    team = TeamLoader.for_user(user, employee, _max_depth(request))
     
     date_str = request.GET.get('date', timezone.now().date().isoformat())
     try:
@@ -880,25 +1054,10 @@ def team_attendance(request):
     except:
         selected_date = timezone.now().date()
     
-    attendance_records = Attendance.objects.filter(
-        employee__in=team_members,
-        date=selected_date
-    ).select_related('employee', 'employee__user')
-
-    attendance_map = {att.employee.id: att for att in attendance_records}
-    
-    team_data = []
-    for member in team_members:
-        att = attendance_map.get(member.id)
-        team_data.append({
-            'employee': member,
-            'attendance': att,
-            'status': 'present' if (att and att.login_time) else 'absent',
-            'hours_worked': (att.total_work_seconds / 3600) if (att and att.total_work_seconds) else 0,
-        })
+    team_data = team.attendance_rows(selected_date)
     
     stats = {
-        'total_team': team_members.count(),
+        'total_team': len(team_data),
         'present': sum(1 for d in team_data if d['status'] == 'present'),
         'absent': sum(1 for d in team_data if d['status'] == 'absent'),
         'avg_hours': sum(d['hours_worked'] for d in team_data) / len(team_data) if team_data else 0,
@@ -914,6 +1073,8 @@ def team_attendance(request):
 
 
 @login_required
+@query_budget(queries=10, repeated=3)
+@replica_view
 def approve_leaves(request):
     """Manager view to approve/reject leave requests"""
     user = request.user
@@ -937,8 +1098,8 @@ def approve_leaves(request):
             leave_request.approver = user
             leave_request.save()
             
-            Notification.objects.create(
-                recipient=leave_request.employee.user,
+            notifier.notify(
+                leave_request.employee.user_id,
                 title='Leave Request Approved',
                 body=f'Your leave request from {leave_request.start_date} to {leave_request.end_date} has been approved.',
                 notif_type='info'
@@ -951,8 +1112,8 @@ def approve_leaves(request):
             leave_request.approver = user
             leave_request.save()
             
-            Notification.objects.create(
-                recipient=leave_request.employee.user,
+            notifier.notify(
+                leave_request.employee.user_id,
                 title='Leave Request Rejected',
                 body=f'Your leave request from {leave_request.start_date} to {leave_request.end_date} has been rejected.',
                 notif_type='warning'
@@ -962,53 +1123,37 @@ def approve_leaves(request):
         
         return redirect('approve_leaves')
     
-    if user.role == 'manager':
-        team_members = Employee.objects.filter(manager=user, is_active_employee=True)
-    else:
-        team_members = Employee.objects.filter(company=employee.company, is_active_employee=True)
+    team = TeamLoader.for_user(user, employee, _max_depth(request))
     
     status_filter = request.GET.get('status', 'pending')
     
-    leave_requests = LeaveRequest.objects.filter(
-        employee__in=team_members
-    ).select_related('employee', 'employee__user', 'leave_type', 'approver')
-    
-    if status_filter != 'all':
-        leave_requests = leave_requests.filter(status=status_filter)
+    leave_requests = team.leaves(None if status_filter == 'all' else status_filter)
     
-    leave_requests = leave_requests.order_by('-created_at')
-    paginator = Paginator(leave_requests, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(leave_requests, 15, ordering=('-created_at',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
-    stats = {
-        'pending': LeaveRequest.objects.filter(employee__in=team_members, status='pending').count(),
-        'approved': LeaveRequest.objects.filter(employee__in=team_members, status='approved').count(),
-        'rejected': LeaveRequest.objects.filter(employee__in=team_members, status='rejected').count(),
-    }
+    if request.GET.get('format') == 'json':
+        return cursor_page_json(page_obj, lambda leave: {
+            'id': str(leave.id),
+            'employee': leave.employee.user.get_full_name(),
+            'leave_type': leave.leave_type.name,
+            'start_date': leave.start_date,
+            'end_date': leave.end_date,
+            'status': leave.status,
+        })
     
     context = {
         'page_obj': page_obj,
         'status_filter': status_filter,
-        'stats': stats,
+        'stats': team.leave_stats,
     }
     
     return render(request, 'employees/approve_leaves.html', context)
 
 def calculate_attendance_rate(employee):
     """Calculate attendance percentage"""
-    current_month = timezone.now().month
-    current_year = timezone.now().year
-    
-    total_working_days = 22 
-    present_days = Attendance.objects.filter(
-        employee=employee,
-        date__month=current_month,
-        date__year=current_year,
-        login_time__isnull=False
-    ).count()
-    
-    return (present_days / total_working_days * 100) if total_working_days > 0 else 0
+    today = timezone.now().date()
+    return attendance_summary.attendance_rate(employee, today.year, today.month)
 
 
 def calculate_avg_task_time(user):